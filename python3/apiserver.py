@@ -0,0 +1,267 @@
+"""
+HTTP read API over the market indexer.
+Frontends and bots query the index store through this service instead of the
+chain node. Responses are cached in a bounded LRU that is dropped whenever the
+indexer commits an update, and carry ETags so unchanged pages cost nothing.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from indexer import ChainReader, MarketIndexer, Market, Position, load_market_entries
+from indexstore import IndexStore
+
+class ResponseCache:
+    """
+    Bounded LRU of encoded responses, valid for a single version of the index store.
+
+    Attributes:
+        max_entries: Maximum number of cached responses
+        version: Store version the cached responses were computed from
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """Return the cached (status, etag, body) of a key, or None if missing or computed from another version."""
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            response = self.entries.get(key)
+            if response is not None:
+                self.entries.move_to_end(key)
+            return response
+
+    def put(self, key, version, response):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+def encode_cursor(value):
+    """Encode the sort key of the last returned item as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, kind):
+    """
+    Decode a cursor made by encode_cursor.
+
+    Args:
+        cursor: Cursor string from the query
+        kind: Type of the sort key, str or int
+
+    Raises:
+        ValueError: If the cursor does not decode to a sort key of that type
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    return value
+
+def to_json(value):
+    if is_dataclass(value):
+        return asdict(value)
+    return value
+
+def page(items, limit, key):
+    """Build a page of items with the cursor of the next page, if there may be one."""
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(key(items[-1]))
+    return {"items": [to_json(item) for item in items], "next_cursor": next_cursor}
+
+def order_book(orders, auction):
+    """Split the open orders of an auction into bids (best first) and asks (best first)."""
+    bids = sorted((o for o in orders if o["auction"] == auction and o["is_bid"]), key=lambda o: (-o["price_per_token"], o["order_id"]))
+    asks = sorted((o for o in orders if o["auction"] == auction and not o["is_bid"]), key=lambda o: (o["price_per_token"], o["order_id"]))
+    return {"auction": auction, "bids": bids, "asks": asks}
+
+class IndexerApi:
+    """
+    Read-only queries over a MarketIndexer, returning JSON-serializable results.
+
+    Endpoints:
+        /markets?status=&cursor=&limit=: Markets ordered by id
+        /markets/{id}: A single market
+        /markets/{id}/stats: Market statistics
+        /markets/{id}/positions?cursor=&limit=: Positions ordered by trader
+        /markets/{id}/orderbook: Open orders of the YES and NO auctions
+        /markets/{id}/trades?cursor=&limit=: Trades in log order
+
+    Attributes:
+        indexer: MarketIndexer to query
+        page_size: Default number of items per page
+        max_page_size: Upper bound on the requested page size
+    """
+
+    def __init__(self, indexer, page_size=100, max_page_size=1000):
+        self.indexer = indexer
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def query(self, path, params):
+        """
+        Answer a request.
+
+        Args:
+            path: Request path
+            params: Query parameters as a dictionary of single values
+
+        Returns:
+            Tuple of (HTTP status, JSON-serializable body)
+        """
+        parts = [part for part in path.split("/") if part]
+        if not parts or parts[0] != "markets" or len(parts) > 3:
+            return 404, {"error": "Unknown endpoint"}
+        if len(parts) == 1:
+            return 200, self.markets(params)
+
+        market_id = parts[1]
+        market = self.indexer.get_market(market_id)
+        if market is None:
+            return 404, {"error": f"Unknown market {market_id}"}
+        if len(parts) == 2:
+            return 200, to_json(market)
+        if parts[2] == "stats":
+            return 200, self.indexer.get_market_stats(market_id)
+        if parts[2] == "positions":
+            return 200, self.positions(market_id, params)
+        if parts[2] == "orderbook":
+            orders = self.indexer.get_orders(market_id)
+            return 200, {"yes": order_book(orders, market.true_auction), "no": order_book(orders, market.false_auction)}
+        if parts[2] == "trades":
+            return 200, self.trades(market_id, params)
+        return 404, {"error": "Unknown endpoint"}
+
+    def limit(self, params):
+        limit = int(params.get("limit", self.page_size))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        return min(limit, self.max_page_size)
+
+    def markets(self, params):
+        limit = self.limit(params)
+        after = decode_cursor(params["cursor"], str) if "cursor" in params else None
+        markets = self.indexer.get_markets(params.get("status"), after, limit)
+        return page(markets, limit, lambda market: market.id)
+
+    def positions(self, market_id, params):
+        limit = self.limit(params)
+        after = decode_cursor(params["cursor"], str) if "cursor" in params else None
+        positions = self.indexer.get_positions(market_id, after, limit)
+        return page(positions, limit, lambda position: position.trader)
+
+    def trades(self, market_id, params):
+        limit = self.limit(params)
+        after = decode_cursor(params["cursor"], int) if "cursor" in params else None
+        trades = self.indexer.get_trades(market_id, after, limit)
+        return page(trades, limit, lambda trade: trade["id"])
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Serves an IndexerApi over HTTP with response caching and ETags."""
+
+    api = None
+    cache = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        version = self.api.indexer.store.data_version()
+        response = self.cache.get(self.path, version)
+        if response is None:
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                status, result = self.api.query(url.path, params)
+            except ValueError as e:
+                status, result = 400, {"error": str(e)}
+            body = json.dumps(result).encode("utf-8")
+            response = (status, '"' + hashlib.sha1(body).hexdigest() + '"', body)
+            if status == 200:
+                self.cache.put(self.path, version, response)
+        status, etag, body = response
+
+        if status == 200 and etag in self._if_none_match():
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _if_none_match(self):
+        header = self.headers.get("If-None-Match", "")
+        tags = [tag.strip() for tag in header.split(",")]
+        return [tag[2:] if tag.startswith("W/") else tag for tag in tags if tag]
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(indexer, host="127.0.0.1", port=8080, cache_entries=1024):
+    """
+    Serve the read API of an indexer on a local port in a background thread.
+
+    Args:
+        indexer: MarketIndexer to serve
+        host: Interface to bind to
+        port: Port to listen on
+        cache_entries: Maximum number of cached responses
+
+    Returns:
+        The running ThreadingHTTPServer
+    """
+    handler = type("BoundApiRequestHandler", (ApiRequestHandler,), {
+        "api": IndexerApi(indexer),
+        "cache": ResponseCache(cache_entries),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Read API listening on http://{host}:{port}/markets")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the market index over HTTP")
+    parser.add_argument("--db", default="indexer.db", help="index store written by indexer.py")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind to")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--cache-entries", type=int, default=1024, help="maximum number of cached responses")
+    options = parser.parse_args()
+
+    # Only reads the store, indexer.py keeps it up to date from another process
+    store = IndexStore(options.db, market_type=Market, position_type=Position)
+    indexer = MarketIndexer(ChainReader(load_market_entries()), store)
+    server = start_server(indexer, options.host, options.port, options.cache_entries)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
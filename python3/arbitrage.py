@@ -0,0 +1,295 @@
+"""
+Split/join parity arbitrage scanner.
+One currency unit splits into one YES and one NO token and join reverses it, so
+YES ask + NO ask < 1 (buy both, join) and YES bid + NO bid > 1 (split, sell both)
+are riskless. The scanner checks every registered market's books in one pass
+and emits executable bundles sized to the depth that stays profitable.
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from serializedstate import SerializedState, fetch_avl_entries, decode_limit_order
+from matching import total_price
+from marketregistry import load_entries
+
+BIDS_TREE = 2
+ASKS_TREE = 3
+
+# Lowest cancelation id given to bundle orders
+CANCEL_ID_BASE = 7000
+
+def read_book(address, depth):
+    """
+    Read price scaling and the best `depth` orders per side of an auction.
+    The order trees are keyed by priority, so the first entries are the best prices.
+    """
+    fields = SerializedState(address=address).deserialize(["u64", "u64"])
+    return {
+        "address": address,
+        "scaling": (fields[0], fields[1]),
+        "bids": [decode_limit_order(value) for _, value in fetch_avl_entries(address, BIDS_TREE, limit=depth)],
+        "asks": [decode_limit_order(value) for _, value in fetch_avl_entries(address, ASKS_TREE, limit=depth)],
+    }
+
+def probability(price, scaling):
+    """Currency per token of an auction price, where one YES plus one NO token is worth 1."""
+    numerator, denominator = scaling
+    return price * numerator / denominator
+
+def walk_pairs(yes_orders, no_orders, yes_scaling, no_scaling, profitable):
+    """
+    Walk two sides in priority order, pairing YES and NO amounts level by level
+    for as long as the pair of current prices is profitable.
+
+    Returns:
+        List of (amount, yes_order, no_order) slices
+    """
+    slices = []
+    yes_left = [order["token_amount"] for order in yes_orders]
+    no_left = [order["token_amount"] for order in no_orders]
+    i = j = 0
+    while i < len(yes_orders) and j < len(no_orders):
+        if not profitable(probability(yes_orders[i]["price_per_token"], yes_scaling),
+                          probability(no_orders[j]["price_per_token"], no_scaling)):
+            break
+        amount = min(yes_left[i], no_left[j])
+        slices.append((amount, yes_orders[i], no_orders[j]))
+        yes_left[i] -= amount
+        no_left[j] -= amount
+        if yes_left[i] == 0:
+            i += 1
+        if no_left[j] == 0:
+            j += 1
+    return slices
+
+def fill_currency(slices, index, scaling):
+    """Currency moved by the fills of one side of a walk, rounded per maker order as the contract does."""
+    per_order = {}
+    for piece in slices:
+        order = piece[index]
+        per_order.setdefault(order["id"], [order, 0])[1] += piece[0]
+    return sum(total_price(amount, order["price_per_token"], *scaling) for order, amount in per_order.values())
+
+def best_prefix(slices, profit_of):
+    """Cut the walk at the most profitable prefix, since rounding may make the last slices unprofitable."""
+    best, best_profit = 0, 0
+    for n in range(1, len(slices) + 1):
+        profit = profit_of(slices[:n])
+        if profit > best_profit:
+            best, best_profit = n, profit
+    return slices[:best], best_profit
+
+def buy_join_bundle(entry, yes_book, no_book):
+    """
+    Bundle for YES ask + NO ask < 1: buy both outcomes, join the pairs and keep the spare currency.
+
+    Returns:
+        Bundle dictionary, or None if there is no profitable depth
+    """
+    slices = walk_pairs(yes_book["asks"], no_book["asks"], yes_book["scaling"], no_book["scaling"],
+                        lambda yes, no: yes + no < 1)
+
+    def profit_of(prefix):
+        amount = sum(piece[0] for piece in prefix)
+        return amount - fill_currency(prefix, 1, yes_book["scaling"]) - fill_currency(prefix, 2, no_book["scaling"])
+
+    slices, profit = best_prefix(slices, profit_of)
+    if not slices:
+        return None
+    amount = sum(piece[0] for piece in slices)
+    yes_cost = fill_currency(slices, 1, yes_book["scaling"])
+    no_cost = fill_currency(slices, 2, no_book["scaling"])
+    yes_limit = slices[-1][1]["price_per_token"]
+    no_limit = slices[-1][2]["price_per_token"]
+    currency = entry["currency"]
+    steps = [
+        step("token", currency, "approve_relative", [yes_book["address"], yes_cost]),
+        step("auction", yes_book["address"], "deposit", [currency, yes_cost]),
+        step("token", currency, "approve_relative", [no_book["address"], no_cost]),
+        step("auction", no_book["address"], "deposit", [currency, no_cost]),
+        step("auction", yes_book["address"], "submit_bid", [yes_limit, amount]),
+        step("auction", no_book["address"], "submit_bid", [no_limit, amount]),
+        step("auction", yes_book["address"], "withdraw", [entry["true_token"], amount, "true"]),
+        step("auction", no_book["address"], "withdraw", [entry["false_token"], amount, "true"]),
+        step("token", entry["true_token"], "approve_relative", [entry["splitter"], amount]),
+        step("splitter", entry["splitter"], "deposit", [entry["true_token"], amount]),
+        step("token", entry["false_token"], "approve_relative", [entry["splitter"], amount]),
+        step("splitter", entry["splitter"], "deposit", [entry["false_token"], amount]),
+        step("splitter", entry["splitter"], "join", [amount]),
+        step("splitter", entry["splitter"], "withdraw", [currency, amount, "true"]),
+    ]
+    return bundle(entry, "buy_join", amount, yes_cost + no_cost, amount, profit, steps)
+
+def split_sell_bundle(entry, yes_book, no_book):
+    """
+    Bundle for YES bid + NO bid > 1: split currency into pairs and sell both outcomes.
+
+    Returns:
+        Bundle dictionary, or None if there is no profitable depth
+    """
+    slices = walk_pairs(yes_book["bids"], no_book["bids"], yes_book["scaling"], no_book["scaling"],
+                        lambda yes, no: yes + no > 1)
+
+    def profit_of(prefix):
+        amount = sum(piece[0] for piece in prefix)
+        return fill_currency(prefix, 1, yes_book["scaling"]) + fill_currency(prefix, 2, no_book["scaling"]) - amount
+
+    slices, profit = best_prefix(slices, profit_of)
+    if not slices:
+        return None
+    amount = sum(piece[0] for piece in slices)
+    proceeds = fill_currency(slices, 1, yes_book["scaling"]) + fill_currency(slices, 2, no_book["scaling"])
+    yes_limit = slices[-1][1]["price_per_token"]
+    no_limit = slices[-1][2]["price_per_token"]
+    currency = entry["currency"]
+    steps = [
+        step("token", currency, "approve_relative", [entry["splitter"], amount]),
+        step("splitter", entry["splitter"], "deposit", [currency, amount]),
+        step("splitter", entry["splitter"], "split", [amount]),
+        step("splitter", entry["splitter"], "withdraw", [entry["true_token"], amount, "true"]),
+        step("splitter", entry["splitter"], "withdraw", [entry["false_token"], amount, "true"]),
+        step("token", entry["true_token"], "approve_relative", [yes_book["address"], amount]),
+        step("auction", yes_book["address"], "deposit", [entry["true_token"], amount]),
+        step("token", entry["false_token"], "approve_relative", [no_book["address"], amount]),
+        step("auction", no_book["address"], "deposit", [entry["false_token"], amount]),
+        step("auction", yes_book["address"], "submit_ask", [yes_limit, amount]),
+        step("auction", no_book["address"], "submit_ask", [no_limit, amount]),
+    ]
+    return bundle(entry, "split_sell", amount, amount, proceeds, profit, steps)
+
+def step(kind, address, action, params):
+    """A contract action of a bundle; submit_bid/submit_ask get their cancelation id when the bundle is executed."""
+    return {"kind": kind, "address": address, "action": action, "params": params}
+
+def bundle(entry, strategy, pairs, currency_in, currency_out, profit, steps):
+    return {
+        "market": entry["splitter"],
+        "event": entry.get("event"),
+        "strategy": strategy,
+        "pairs": pairs,
+        "currency_in": currency_in,
+        "currency_out": currency_out,
+        "profit": profit,
+        "steps": steps,
+    }
+
+class ArbitrageScanner:
+    """
+    Scans every registered market for split/join parity violations.
+    The books of all auctions are read concurrently, then all markets are evaluated in one pass.
+
+    Attributes:
+        entries: Market registry entries
+        depth: Orders read per side of each auction
+        concurrency: Maximum number of concurrent book reads
+        min_profit: Minimum profit in currency units for a bundle to be emitted
+    """
+
+    def __init__(self, entries, depth=20, concurrency=8, min_profit=1):
+        self.entries = entries
+        self.depth = depth
+        self.concurrency = concurrency
+        self.min_profit = min_profit
+
+    def read_books(self):
+        """Read the books of both auctions of every market concurrently, skipping unreadable ones."""
+        addresses = [entry[side] for entry in self.entries for side in ("true_auction", "false_auction")]
+        books = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {address: executor.submit(read_book, address, self.depth) for address in addresses}
+        for address, future in futures.items():
+            try:
+                books[address] = future.result()
+            except Exception as e:
+                print(f"Error reading book of {address}: {e}")
+        return books
+
+    def evaluate(self, books):
+        """
+        Evaluate all markets against already read books.
+
+        Returns:
+            Profitable bundles, most profitable first
+        """
+        bundles = []
+        for entry in self.entries:
+            yes_book = books.get(entry["true_auction"])
+            no_book = books.get(entry["false_auction"])
+            if yes_book is None or no_book is None:
+                continue
+            for build in (buy_join_bundle, split_sell_bundle):
+                found = build(entry, yes_book, no_book)
+                if found is not None and found["profit"] >= self.min_profit:
+                    bundles.append(found)
+        return sorted(bundles, key=lambda found: -found["profit"])
+
+    def scan(self):
+        return self.evaluate(self.read_books())
+
+def allocate_cancel_id(auctions, owner):
+    """
+    Cancelation id for the orders of a bundle that none of our resting orders in its auctions uses,
+    so an unfilled remainder can be cancelled without touching orders of earlier bundles.
+    Without a known owner address a random id is used.
+    """
+    if owner is None:
+        return random.randrange(CANCEL_ID_BASE, 2 ** 32)
+    used = {order["cancelation_id"] for auction in auctions for order in auction.open_orders(owner)}
+    cancel_id = CANCEL_ID_BASE
+    while cancel_id in used:
+        cancel_id += 1
+    return cancel_id
+
+def execute_bundle(bundle):
+    """
+    Execute the steps of a bundle in order, as one nonce-gated sequence of the current key.
+    Each step is sent once the one before it is included, and the rest of the bundle is
+    not sent after a failed step, see PBCContract.execute_sequence.
+
+    Returns:
+        List of transaction hashes, None where a step failed or was not sent
+    """
+    from pbccontract import PBCContract, account_address
+    from tokenv2 import TokenV2
+    from tokensplitter import TokenSplitter
+    from doubleauction import DoubleAuction
+
+    classes = {"token": TokenV2, "splitter": TokenSplitter, "auction": DoubleAuction}
+    contracts = {}
+    for item in bundle["steps"]:
+        if item["address"] not in contracts:
+            contracts[item["address"]] = classes[item["kind"]](address=item["address"])
+    auctions = [contracts[item["address"]] for item in bundle["steps"] if item["kind"] == "auction"]
+    cancel_id = allocate_cancel_id({auction.address: auction for auction in auctions}.values(), account_address())
+
+    commands = []
+    for item in bundle["steps"]:
+        params = item["params"] + [cancel_id] if item["action"] in ("submit_bid", "submit_ask") else item["params"]
+        commands.append(contracts[item["address"]].command(item["action"], params))
+    print(f"Executing {bundle['strategy']} on {bundle['market']}: {bundle['pairs']} pairs for {bundle['profit']} profit, cancelation id {cancel_id}")
+    return PBCContract.execute_sequence(commands)
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan registered markets for split/join arbitrage")
+    parser.add_argument("--depth", type=int, default=20, help="orders read per side of each auction")
+    parser.add_argument("--min-profit", type=int, default=1, help="minimum profit in currency units")
+    parser.add_argument("--interval", type=float, default=0, help="rescan every this many seconds (0 scans once)")
+    parser.add_argument("--execute", action="store_true", help="execute the most profitable bundle of each scan")
+    options = parser.parse_args()
+
+    scanner = ArbitrageScanner(load_entries(), depth=options.depth, min_profit=options.min_profit)
+    while True:
+        bundles = scanner.scan()
+        for found in bundles:
+            print(f"{found['strategy']} {found['event']}: {found['pairs']} pairs, in {found['currency_in']}, out {found['currency_out']}, profit {found['profit']}")
+        if options.execute and bundles:
+            execute_bundle(bundles[0])
+        if not options.interval:
+            break
+        time.sleep(options.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Block-scanning ingest for the market indexer.
+Walks each shard's blocks in order, keeps only the transactions that target one
+of our splitter, auction or token contracts, decodes their action and routes
+them to the indexer, so work scales with activity instead of markets x polls.
+"""
+
+import asyncio
+import base64
+import struct
+import threading
+import time
+import chainclient
+
+SHARDS = ["Shard0", "Shard1", "Shard2"]
+
+LATEST_BLOCK_PATH = "/chain/shards/{shard}/blocks"
+BLOCK_PATH = "/chain/shards/{shard}/blocks?blockTime={block_time}"
+TRANSACTION_PATH = "/chain/shards/{shard}/transactions/{trans_id}"
+
+# Action shortnames of our contracts, see the #[action] attributes in rust/
+ACTIONS = {
+    "splitter": {0x01: "deposit", 0x03: "withdraw", 0x04: "prepare", 0x05: "split", 0x06: "join", 0x07: "settle", 0x08: "redeem"},
+    "auction": {0x01: "deposit", 0x03: "withdraw", 0x04: "submit_bid", 0x05: "submit_ask", 0x06: "cancel_limit_order"},
+    "token": {0x01: "transfer", 0x02: "bulk_transfer", 0x03: "transfer_from", 0x04: "bulk_transfer_from", 0x05: "approve", 0x07: "approve_relative"},
+}
+
+# Invocations of public WASM contracts may be wrapped in this binder byte before the shortname
+WASM_INVOCATION_PREFIX = 0x09
+
+SIGNATURE_LENGTH = 65
+
+def decode_signed_transaction(content):
+    """
+    Decode a signed transaction: signature, nonce, valid-to time, gas cost,
+    target address and length-prefixed RPC, all big endian.
+
+    Args:
+        content: Raw transaction bytes
+
+    Returns:
+        Dictionary with nonce, valid_to_time, gas_cost, address and rpc
+    """
+    body = content[SIGNATURE_LENGTH:]
+    if len(body) < 49:
+        raise ValueError(f"Transaction too short ({len(content)} bytes)")
+    nonce, valid_to_time, gas_cost = struct.unpack('>QqQ', body[:24])
+    address = body[24:45].hex()
+    (length,) = struct.unpack('>I', body[45:49])
+    return {
+        "nonce": nonce,
+        "valid_to_time": valid_to_time,
+        "gas_cost": gas_cost,
+        "address": address,
+        "rpc": body[49:49 + length],
+    }
+
+def action_rpc(rpc, kind):
+    """Strip an optional WASM invocation prefix, so the RPC starts with a shortname of the contract kind."""
+    if len(rpc) > 1 and rpc[0] == WASM_INVOCATION_PREFIX and rpc[1] in ACTIONS[kind]:
+        return rpc[1:]
+    return rpc
+
+def build_routes(entries):
+    """
+    Map every contract of the registered markets to (kind, market id).
+    The shared currency token is left out, since transfers of it do not change any market.
+    """
+    routes = {}
+    for entry in entries:
+        market_id = entry["splitter"]
+        routes[entry["splitter"]] = ("splitter", market_id)
+        routes[entry["true_auction"]] = ("auction", market_id)
+        routes[entry["false_auction"]] = ("auction", market_id)
+        routes[entry["true_token"]] = ("token", market_id)
+        routes[entry["false_token"]] = ("token", market_id)
+    return routes
+
+def shard_heads(shards=None):
+    """Return shard -> block time of the latest block of every shard."""
+    return {shard: chainclient.get_json(LATEST_BLOCK_PATH.format(shard=shard))["blockTime"] for shard in shards or SHARDS}
+
+def fetch_signed_transaction(shard, trans_id):
+    """
+    Fetch and decode a signed transaction of a block.
+
+    Returns:
+        Tuple of (transaction JSON, decoded transaction), or None for events and undecodable transactions
+    """
+    data = chainclient.get_json(TRANSACTION_PATH.format(shard=shard, trans_id=trans_id))
+    if data.get("isEvent"):
+        return None
+    try:
+        return data, decode_signed_transaction(base64.b64decode(data["content"]))
+    except (KeyError, ValueError) as e:
+        print(f"Could not decode transaction {trans_id}: {e}")
+        return None
+
+class ContractActivity:
+    """
+    Shard heads, and the contracts touched by the blocks between two sets of heads.
+
+    Derived state is checkpointed with the shard heads it is current to. After a
+    restart, the blocks produced since those heads are scanned once to find the
+    contracts that changed, so the restart cost depends on the downtime; a downtime
+    longer than the catch-up window jumps straight to the current heads.
+
+    Attributes:
+        shards: Shards to read, e.g. only those of a worker's markets
+        min_interval: Seconds the current heads are reused before reading them again
+        heads: Shard -> last read block time
+    """
+
+    def __init__(self, shards=None, min_interval=1):
+        self.shards = shards or SHARDS
+        self.min_interval = min_interval
+        self.heads = {}
+        self.read = None
+        self.lock = threading.Lock()
+
+    def _latest(self, shard):
+        return chainclient.get_json(LATEST_BLOCK_PATH.format(shard=shard))["blockTime"]
+
+    def _touched(self, shard, start, end):
+        # Yield (block time, contract address) of the signed transactions in blocks start..end
+        for block_time in range(start, end + 1):
+            block = chainclient.get_json(BLOCK_PATH.format(shard=shard, block_time=block_time))
+            for trans_id in block.get("transactions", []):
+                fetched = fetch_signed_transaction(shard, trans_id)
+                if fetched is not None:
+                    yield block_time, fetched[1]["address"]
+
+    def current_heads(self):
+        """Return shard -> latest block time, read at most once per min_interval"""
+        with self.lock:
+            if self.read is None or time.monotonic() - self.read >= self.min_interval:
+                self.heads = {shard: self._latest(shard) for shard in self.shards}
+                self.read = time.monotonic()
+            return dict(self.heads)
+
+    def catch_up(self, heads=None, max_blocks=2000):
+        """
+        Start from persisted shard heads instead of the current blocks, scanning the blocks in between once.
+
+        Args:
+            heads: Shard -> block time some derived state is current to, or None to start from the current blocks
+            max_blocks: Maximum number of blocks per shard worth scanning instead of refetching everything
+
+        Returns:
+            Dictionary of contract address -> {shard: last block time the contract may have changed in},
+            or None if a shard is missing from heads or more than max_blocks behind
+        """
+        with self.lock:
+            latest = {shard: self._latest(shard) for shard in self.shards}
+            touched = {}
+            if heads is not None:
+                if any(shard not in heads or latest[shard] - heads[shard] > max_blocks for shard in self.shards):
+                    touched = None
+                else:
+                    for shard in self.shards:
+                        for block_time, address in self._touched(shard, heads[shard] + 1, latest[shard]):
+                            # Callbacks of the transaction land in the next block
+                            touched.setdefault(address, {})[shard] = block_time + 1
+            self.heads = latest
+            self.read = time.monotonic()
+            return touched
+
+class BlockScanner:
+    """
+    Scans shard blocks from a persisted high-water mark and yields our transactions.
+
+    Attributes:
+        store: IndexStore holding the per-shard checkpoints
+        routes: Contract address -> (kind, market id)
+        shards: Shards to scan
+        max_blocks: Maximum number of blocks scanned per shard per call
+    """
+
+    def __init__(self, store, routes, shards=None, max_blocks=100):
+        self.store = store
+        self.routes = routes
+        self.shards = shards or SHARDS
+        self.max_blocks = max_blocks
+
+    def latest_block_time(self, shard):
+        return chainclient.get_json(LATEST_BLOCK_PATH.format(shard=shard))["blockTime"]
+
+    def scan_shard(self, shard):
+        """
+        Scan the next blocks of a shard after its checkpoint.
+        Starts at the current head the first time a shard is seen.
+
+        Returns:
+            Tuple of (routed transactions in block order, last scanned block time)
+        """
+        checkpoint = self.store.get_checkpoint("shard", shard)
+        latest = self.latest_block_time(shard)
+        if checkpoint is None:
+            return [], latest
+        start = checkpoint["block_time"] + 1
+        end = min(latest, start + self.max_blocks - 1)
+        routed = []
+        for block_time in range(start, end + 1):
+            block = chainclient.get_json(BLOCK_PATH.format(shard=shard, block_time=block_time))
+            for index, trans_id in enumerate(block.get("transactions", [])):
+                transaction = self.route_transaction(shard, trans_id, block)
+                if transaction is not None:
+                    transaction["index"] = index
+                    routed.append(transaction)
+        return routed, max(end, start - 1)
+
+    def route_transaction(self, shard, trans_id, block):
+        """Fetch and decode a transaction, returning it only if it targets one of our contracts."""
+        fetched = fetch_signed_transaction(shard, trans_id)
+        if fetched is None:
+            return None
+        data, decoded = fetched
+        route = self.routes.get(decoded["address"])
+        if route is None:
+            return None
+        kind, market_id = route
+        rpc = action_rpc(decoded["rpc"], kind)
+        return {
+            "trans_id": trans_id,
+            "shard": shard,
+            "block_time": block.get("blockTime"),
+            "timestamp": block.get("productionTime", 0) / 1000,
+            "address": decoded["address"],
+            "kind": kind,
+            "market": market_id,
+            "action": ACTIONS[kind].get(rpc[0]) if rpc else None,
+            "rpc": rpc,
+            "sender": data.get("sender"),
+            "success": data.get("executionStatus", {}).get("success") is True,
+        }
+
+async def ingest(indexer, scanner, interval=1):
+    """
+    Drive an indexer from shard blocks instead of polling every contract.
+    Executed submit_bid/submit_ask transactions become fills when the stored book is
+    known to match their block, and executed cancelations are removed from the stored
+    book so the next snapshot diff does not count them as fills; every routed
+    transaction marks its market for a refresh, and markets without activity are
+    never refetched.
+
+    Args:
+        indexer: MarketIndexer to feed
+        scanner: BlockScanner over the indexer's markets
+        interval: Seconds to wait when every shard is caught up
+    """
+    loop = asyncio.get_running_loop()
+    indexer.track_books = True
+    indexer.poller.sync(entry["splitter"] for entry in indexer.client.entries)
+    await loop.run_in_executor(None, indexer.restore_checkpoints, False)
+    while True:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, scanner.scan_shard, shard) for shard in scanner.shards),
+            return_exceptions=True,
+        )
+        caught_up = True
+        for shard, result in zip(scanner.shards, results):
+            if isinstance(result, Exception):
+                print(f"Error scanning {shard}: {result}")
+                continue
+            transactions, last_block_time = result
+            for transaction in transactions:
+                print(f"{transaction['shard']} block {transaction['block_time']}: {transaction['action']} on {transaction['kind']} {transaction['address']}")
+                position = (transaction["block_time"], transaction["index"])
+                try:
+                    if transaction["success"] and transaction["action"] in ("submit_bid", "submit_ask"):
+                        await indexer.record_transaction(
+                            transaction["market"], transaction["address"], transaction["rpc"],
+                            transaction["sender"], transaction["trans_id"], transaction["timestamp"],
+                            transaction["shard"], position,
+                        )
+                    elif transaction["success"] and transaction["action"] == "cancel_limit_order":
+                        await indexer.record_cancel(
+                            transaction["address"], transaction["rpc"], transaction["sender"], transaction["shard"], position,
+                        )
+                except Exception as e:
+                    print(f"Error recording transaction {transaction['trans_id']}: {e}")
+                indexer.poller.invalidate(transaction["market"])
+            checkpoint = scanner.store.get_checkpoint("shard", shard)
+            if checkpoint is None or checkpoint["block_time"] != last_block_time:
+                await loop.run_in_executor(None, scanner.store.set_checkpoint, "shard", shard, {"block_time": last_block_time})
+                caught_up = False
+        await indexer.update_markets()
+        if caught_up:
+            await asyncio.sleep(interval)
@@ -0,0 +1,360 @@
+"""
+Shared HTTP client for the Partisia node REST API.
+Spreads reads over the nodes in config.nodes, preferring healthy, fast nodes,
+fails over to the next node on errors and probes the nodes in the background,
+so one slow or down node no longer stalls every script.
+
+Nodes are configured as URLs or as {"url": ..., "weight": ...} entries:
+    nodes = [
+        "https://node1.testnet.partisiablockchain.com",
+        {"url": "https://node2.testnet.partisiablockchain.com", "weight": 2},
+    ]
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import config
+from lazy import lazy_import
+from ratelimit import RateLimiter, SUBMIT, configured_rates, make_limiter, request_class
+
+requests = lazy_import("requests")
+
+DEFAULT_NODES = ["https://node1.testnet.partisiablockchain.com"]
+
+# Cheap request answered by every node, used to probe health and latency
+PROBE_PATH = "/chain/shards/Shard0/blocks"
+
+# Assumed latency of a node that has not answered yet, in seconds
+INITIAL_LATENCY = 0.5
+
+# Recent response times kept to learn the hedging delay, and how many are needed first
+LATENCY_SAMPLES = 200
+MIN_HEDGE_SAMPLES = 20
+
+class Endpoint:
+    """
+    A node and what is known about it.
+
+    Attributes:
+        url: Base URL of the node, without a trailing slash
+        weight: Relative share of requests the node gets at equal latency
+        latency: Moving average of response times in seconds
+        healthy: False after a failed request or probe, until the next success
+        failures: Consecutive failures
+        session: Keep-alive HTTP session to the node
+        limiter: Request budget of the node
+    """
+
+    def __init__(self, url, weight=1, limiter=None):
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.latency = INITIAL_LATENCY
+        self.healthy = True
+        self.failures = 0
+        self.session = requests.Session()
+        self.limiter = limiter or RateLimiter()
+
+    def score(self):
+        """Share of requests routed to the node: higher weight and lower latency get more"""
+        return self.weight / max(self.latency, 0.001)
+
+    def record_success(self, seconds):
+        self.latency = 0.8 * self.latency + 0.2 * seconds
+        self.healthy = True
+        self.failures = 0
+
+    def record_failure(self):
+        self.healthy = False
+        self.failures += 1
+
+def rate_limit_file():
+    """File the request budgets are shared through if config.rate_limit_file is set, otherwise None: each process limits itself"""
+    return getattr(config, "rate_limit_file", None)
+
+def parse_endpoints(nodes, node_rate=None, class_rates=None):
+    """
+    Build endpoints from config-style entries: URL strings or dictionaries with url,
+    weight and an optional per-node rate (requests per second, burst).
+    """
+    node_rate, class_rates = (node_rate, class_rates) if node_rate else configured_rates(config)
+    endpoints = []
+    for node in nodes:
+        if isinstance(node, str):
+            node = {"url": node}
+        limiter = make_limiter(node["url"].rstrip("/"), node.get("rate", node_rate), class_rates, rate_limit_file())
+        endpoints.append(Endpoint(node["url"], node.get("weight", 1), limiter))
+    return endpoints
+
+def is_node_failure(response):
+    """Server errors and throttling are the node's fault; other statuses are answers about the request."""
+    return response.status_code >= 500 or response.status_code == 429
+
+class EndpointPool:
+    """
+    Routes requests over several nodes.
+
+    Each request goes to a node picked at random in proportion to weight / latency
+    among the healthy nodes, so reads spread over all nodes while fast nodes get
+    most of them. On a connection error, timeout, server error or throttling the
+    node is marked unhealthy and the request fails over to the next best node.
+    A background thread probes every node so unhealthy nodes come back and
+    latencies stay current.
+
+    Hedged requests send a duplicate to the next node when the first has not
+    answered within a percentile of recent response times, and use whichever
+    answer arrives first.
+
+    Every request waits for the budget of its node and request class first, shared
+    with the other processes if rate_limit_file() is set, see ratelimit.
+
+    Attributes:
+        endpoints: Configured nodes
+        probe_interval: Seconds between background probes
+        hedge_percentile: Percentile of recent response times after which a request is hedged
+        samples: Recent response times in seconds, over all nodes
+        submissions: Budget of transactions sent through the CLI, whose node is configured in the CLI
+    """
+
+    def __init__(self, endpoints, probe_interval=30, hedge_percentile=95):
+        if not endpoints:
+            raise ValueError("At least one node endpoint is required")
+        self.endpoints = endpoints
+        self.probe_interval = probe_interval
+        self.hedge_percentile = hedge_percentile
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.lock = threading.Lock()
+        self.prober = None
+        self.hedger = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedged-read")
+        self.submissions = make_limiter("submissions", *configured_rates(config), rate_limit_file())
+
+    def start_probing(self):
+        """Start the background health probes, unless there is only one node to choose from"""
+        with self.lock:
+            if self.prober is not None or len(self.endpoints) < 2:
+                return
+            self.prober = threading.Thread(target=self._probe_forever, name="node-probes", daemon=True)
+            self.prober.start()
+
+    def _probe_forever(self):
+        while True:
+            for endpoint in self.endpoints:
+                self.probe(endpoint)
+            time.sleep(self.probe_interval)
+
+    def probe(self, endpoint):
+        """Probe one node and update its health and latency"""
+        started = time.monotonic()
+        try:
+            response = endpoint.session.get(endpoint.url + PROBE_PATH, timeout=5)
+            if is_node_failure(response):
+                raise requests.HTTPError(f"status {response.status_code}")
+        except requests.RequestException as e:
+            if endpoint.healthy:
+                print(f"Node {endpoint.url} failed its health probe: {e}")
+            with self.lock:
+                endpoint.record_failure()
+            return False
+        with self.lock:
+            if not endpoint.healthy:
+                print(f"Node {endpoint.url} is healthy again")
+            endpoint.record_success(time.monotonic() - started)
+        return True
+
+    def ranked(self):
+        """
+        Nodes in the order a request tries them: one healthy node picked in proportion
+        to its score, then the other healthy nodes and finally the unhealthy ones, best score first.
+        """
+        with self.lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            unhealthy = [e for e in self.endpoints if not e.healthy]
+            if not healthy:
+                return sorted(unhealthy, key=lambda e: (e.failures, -e.score()))
+            first = random.choices(healthy, weights=[e.score() for e in healthy])[0]
+            rest = sorted((e for e in healthy if e is not first), key=lambda e: -e.score())
+            return [first] + rest + sorted(unhealthy, key=lambda e: (e.failures, -e.score()))
+
+    def attempt(self, endpoint, path, timeout, **kwargs):
+        """
+        GET a path from one node and record the outcome.
+
+        Returns:
+            Tuple of (response, ok) where ok is False for server errors and throttling
+
+        Raises:
+            requests.RequestException: If the node did not answer
+        """
+        endpoint.limiter.acquire(request_class(path))
+        started = time.monotonic()
+        try:
+            response = endpoint.session.get(endpoint.url + path, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            with self.lock:
+                endpoint.record_failure()
+            raise
+        if is_node_failure(response):
+            with self.lock:
+                endpoint.record_failure()
+            return response, False
+        seconds = time.monotonic() - started
+        with self.lock:
+            endpoint.record_success(seconds)
+            self.samples.append(seconds)
+        return response, True
+
+    def hedge_delay(self):
+        """Seconds after which a request is hedged, or None until enough response times are known"""
+        with self.lock:
+            if len(self.samples) < MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return max(ordered[index], 0.05)
+
+    def get(self, path, timeout=10, hedge=False, **kwargs):
+        """
+        GET a path of the node API from the best node, failing over to the others.
+
+        Args:
+            path: Path starting with "/", e.g. "/chain/contracts/<address>"
+            timeout: Seconds to wait for each node
+            hedge: Hedge the request; only for idempotent reads
+
+        Returns:
+            requests.Response of the first node that answered; the caller checks its status
+
+        Raises:
+            requests.RequestException: If no node answered
+        """
+        self.start_probing()
+        endpoints = self.ranked()
+        if hedge:
+            response = self.hedged_get(endpoints, path, timeout, **kwargs)
+            if response is not None:
+                return response
+        last_error = None
+        last_response = None
+        for endpoint in endpoints:
+            try:
+                response, ok = self.attempt(endpoint, path, timeout, **kwargs)
+            except requests.RequestException as e:
+                print(f"Request to {endpoint.url} failed, trying next node: {e}")
+                last_error = e
+                continue
+            if not ok:
+                print(f"Node {endpoint.url} answered {response.status_code}, trying next node")
+                last_response = response
+                continue
+            return response
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    def hedged_get(self, endpoints, path, timeout, **kwargs):
+        """
+        Send a read to the best node and, if it has not answered within the hedging
+        delay, a duplicate to the next node (or over a second connection to the same
+        node). The first good answer wins; the other request is cancelled if it has
+        not started, otherwise its answer is discarded and its connection released.
+
+        Returns:
+            The winning response, or None if neither request got a good answer
+        """
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return None
+        primary = self.hedger.submit(self.attempt, endpoints[0], path, timeout, **kwargs)
+        futures = {primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            backup = endpoints[1] if len(endpoints) > 1 else endpoints[0]
+            print(f"No answer from {endpoints[0].url} after {delay:.3f}s, hedging to {backup.url}")
+            futures.add(self.hedger.submit(self.attempt, backup, path, timeout, **kwargs))
+
+        winner = None
+        pending = futures
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response, ok = future.result()
+                except requests.RequestException as e:
+                    print(f"Hedged read of {path} failed: {e}")
+                    continue
+                if ok and winner is None:
+                    winner = response
+                else:
+                    response.close()
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(discard_response)
+        return winner
+
+def discard_response(future):
+    """Release the connection of a hedged request that lost"""
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def default_pool():
+    """Return the process-wide pool over config.nodes"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EndpointPool(parse_endpoints(getattr(config, "nodes", None) or DEFAULT_NODES),
+                                 getattr(config, "node_probe_interval", 30),
+                                 getattr(config, "hedge_percentile", 95))
+        return _pool
+
+def get(path, timeout=10, **kwargs):
+    """GET a path of the node API through the default pool"""
+    return default_pool().get(path, timeout=timeout, **kwargs)
+
+def throttle_submission():
+    """Wait for the budget of one transaction submission"""
+    return default_pool().submissions.acquire(SUBMIT)
+
+def read(path, timeout=10, **kwargs):
+    """
+    GET an idempotent read, hedged when config.hedge_reads is set.
+    Used for contract state and AVL tree reads, whose tail latency dominates.
+    """
+    return get(path, timeout=timeout, hedge=getattr(config, "hedge_reads", False), **kwargs)
+
+_state_cache = None
+
+def state_cache():
+    """Return the process-wide contract state cache, or None if config.state_cache_ttl is 0"""
+    global _state_cache
+    from statecache import StateCache, STATE_CACHE_FILE
+    ttl = getattr(config, "state_cache_ttl", 1.0)
+    if not ttl:
+        return None
+    with _pool_lock:
+        if _state_cache is None:
+            _state_cache = StateCache(getattr(config, "state_cache_file", STATE_CACHE_FILE), ttl)
+        return _state_cache
+
+def contract_state(address, timeout=10):
+    """
+    Return the decoded /chain/contracts/{address} answer, through the shared state cache.
+
+    Raises:
+        requests.RequestException: If no node answered or the answer is an HTTP error
+    """
+    path = f"/chain/contracts/{address}"
+    cache = state_cache()
+    if cache is None:
+        return get_json(path, timeout=timeout)
+    return cache.get(path, lambda: get_json(path, timeout=timeout))
+
+def get_json(path, timeout=10):
+    """GET a path of the node API and decode the JSON body, raising on HTTP errors"""
+    response = read(path, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,77 @@
+"""
+Durable journal of contract deployment steps.
+Every completed step of a deployment is recorded with its resulting address or
+transaction id, so a rerun after a failure skips what is done and continues from
+the first incomplete step instead of redeploying everything.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+JOURNAL_FILE = "deploy-journal.json"
+
+# Several deployments may share the journal file from different threads
+_lock = threading.Lock()
+
+class DeploymentJournal:
+    """
+    Completed steps of one deployment, stored under its key in a JSON journal file.
+
+    Attributes:
+        key: Identifies the deployment, derived from its constructor arguments
+        filename: Journal file shared by all deployments
+    """
+
+    def __init__(self, key, filename=JOURNAL_FILE):
+        self.key = key
+        self.filename = filename
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return {}
+        with open(self.filename, 'r') as journal_file:
+            return json.load(journal_file)
+
+    def _save(self, journal):
+        # Write to a temporary file and rename it, so a crash never loses recorded steps
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'w') as journal_file:
+            json.dump(journal, journal_file, indent=4)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.filename)
+
+    def steps(self):
+        """Return the completed steps of this deployment as name -> result."""
+        with _lock:
+            return {name: step["result"] for name, step in self._load().get(self.key, {}).items()}
+
+    def record(self, name, result):
+        """Durably record a completed step and its result."""
+        with _lock:
+            journal = self._load()
+            journal.setdefault(self.key, {})[name] = {"result": result, "time": time.time()}
+            self._save(journal)
+
+    def step(self, name, function, *args, **kwargs):
+        """
+        Run a deployment step unless the journal shows it completed before.
+
+        Args:
+            name: Name of the step, unique within the deployment
+            function: Function performing the step and returning an address or transaction id
+
+        Returns:
+            The result of the step, from this run or from the journal
+        """
+        completed = self.steps()
+        if name in completed:
+            print(f"Skipping step '{name}' of {self.key}, already completed: {completed[name]}")
+            return completed[name]
+        result = function(*args, **kwargs)
+        self.record(name, result)
+        return result
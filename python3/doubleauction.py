@@ -3,22 +3,29 @@ Interface for DoubleAuction smart contract.
 Handles creation and management of prediction market auctions.
 """
 
-from pbccontract import PBCContract
+from pbccontract import PBCContract, current_keyfile
 from tokenv2 import TokenV2
-from serializedstate import SerializedState
-import time
+from serializedstate import SerializedState, fetch_avl_entries, decode_limit_order
+from deployjournal import DeploymentJournal
+
+# Ids of the AVL trees in the contract state, in order of creation
+BIDS_TREE = 2
+ASKS_TREE = 3
 
 class DoubleAuction(PBCContract):
     """
     Interface for the double auction prediction market contract.
+    Orders trade the asset token (a YES or NO token) against the currency token.
     
     Attributes:
         address: Contract address
-        true_token_address: YES token contract address
-        false_token_address: NO token contract address
+        true_token_address: Asset token contract address (the YES or NO token traded)
+        false_token_address: Currency token contract address
         price_numerator: Numerator of the price fraction
         price_denominator: Denominator of the price fraction
     """
+    step_settle_seconds = 1
+
     def __init__(self, address=None, true_token_address=None, false_token_address=None, 
                  price_numerator=None, price_denominator=None, token_amount=None):
         super().__init__("rust/target/wasm32-unknown-unknown/release/", "double_auction")
@@ -28,15 +35,17 @@ class DoubleAuction(PBCContract):
                 print(f"Initializing DoubleAuction from existing contract: {address}")
                 self.address = address
                 state = SerializedState(address=address)
-                fields = state.deserialize(["Address", "Address", "u64", "u64"])
-                self.true_token_address = fields[0]
-                self.false_token_address = fields[1]
-                self.price_numerator = fields[2]
-                self.price_denominator = fields[3]
-                print(f"Successfully loaded DoubleAuction: true_token={self.true_token_address}, false_token={self.false_token_address}, price={self.price_numerator}/{self.price_denominator}")
+                # price_numerator, price_denominator, next_order_id, own address, currency, asset
+                fields = state.deserialize(["u64", "u64", "u64", "Address", "Address", "Address"])
+                self.price_numerator = fields[0]
+                self.price_denominator = fields[1]
+                self.false_token_address = fields[4]
+                self.true_token_address = fields[5]
+                print(f"Successfully loaded DoubleAuction: asset={self.true_token_address}, currency={self.false_token_address}, price={self.price_numerator}/{self.price_denominator}")
             except Exception as e:
                 print(f"Error initializing DoubleAuction from address: {e}")
                 raise
+            return
         # Handle backward compatibility: if token_amount is provided, use it to set price_denominator
         elif token_amount is not None and price_denominator is None:
             price_denominator = token_amount
@@ -46,14 +55,16 @@ class DoubleAuction(PBCContract):
         if true_token_address and false_token_address and price_numerator is not None and price_denominator is not None:
             try:
                 print(f"Creating new DoubleAuction for tokens:")
-                print(f"  TRUE token: {true_token_address}")
-                print(f"  FALSE token: {false_token_address}")
+                print(f"  Asset token: {true_token_address}")
+                print(f"  Currency token: {false_token_address}")
                 print(f"  Price ratio: {price_numerator}/{price_denominator}")
                 
                 self.true_token_address = true_token_address
                 self.false_token_address = false_token_address
                 self.price_numerator = price_numerator
                 self.price_denominator = price_denominator
+                # Completed steps are journaled, so a rerun with the same arguments and key resumes where this one failed
+                journal = DeploymentJournal(f"auction:{current_keyfile()}:{false_token_address}:{true_token_address}:{price_numerator}/{price_denominator}")
                 
                 # Load token details for verification
                 try:
@@ -66,24 +77,21 @@ class DoubleAuction(PBCContract):
                     print("Continuing with deployment anyway...")
                 
                 print("Deploying auction contract...")
-                self.deploy([true_token_address, false_token_address, price_numerator, price_denominator])
+                # The contract is initialized with the currency token first, then the asset token
+                self.address = journal.step("deploy_auction", self._deploy_and_wait,
+                    [false_token_address, true_token_address, price_numerator, price_denominator])
                 print(f"DoubleAuction deployed at: {self.address}")
                 
-                # Small delay after deployment
-                time.sleep(2)
-                
                 print("Approving tokens for auction contract...")
                 try:
                     true_token = TokenV2(address=true_token_address)
                     # Use price_denominator as the token approval amount
-                    approve_tx = true_token.approve_relative(self.address, price_denominator)
+                    approve_tx = journal.step("approve_true", self._then_wait, true_token.approve_relative, self.address, price_denominator)
                     print(f"TRUE token approval transaction: {approve_tx}")
-                    time.sleep(1)
                     
                     false_token = TokenV2(address=false_token_address)
-                    approve_tx = false_token.approve_relative(self.address, price_denominator)
+                    approve_tx = journal.step("approve_false", self._then_wait, false_token.approve_relative, self.address, price_denominator)
                     print(f"FALSE token approval transaction: {approve_tx}")
-                    time.sleep(1)
                 except Exception as e:
                     print(f"Error approving tokens: {e}")
                     print("WARNING: You'll need to manually approve tokens for the auction contract.")
@@ -91,140 +99,231 @@ class DoubleAuction(PBCContract):
                 print("DoubleAuction setup completed successfully!")
             except Exception as e:
                 print(f"Error creating new DoubleAuction: {e}")
+                print("Completed steps are journaled, rerun with the same arguments to resume")
                 raise
         else:
             raise ValueError("Invalid arguments provided to DoubleAuction. Provide either an address or true_token_address, false_token_address, price_numerator, and price_denominator.")
 
-    def deposit(self, true_amount, false_amount):
+    @property
+    def asset_address(self):
+        """Address of the asset token traded in this auction."""
+        return self.true_token_address
+
+    @property
+    def currency_address(self):
+        """Address of the currency token paid in this auction."""
+        return self.false_token_address
+
+    @property
+    def numerator(self):
+        return self.price_numerator
+
+    @property
+    def denominator(self):
+        return self.price_denominator
+
+    def deposit(self, token_address, amount):
         """
-        Deposit TRUE and FALSE tokens into the auction.
+        Deposit asset or currency tokens into the auction. The tokens must be approved first.
         
         Args:
-            true_amount: Amount of TRUE tokens to deposit
-            false_amount: Amount of FALSE tokens to deposit
+            token_address: Address of the asset or currency token
+            amount: Amount of tokens to deposit
             
         Returns:
             Transaction hash
         """
-        print(f"Depositing {true_amount} TRUE tokens and {false_amount} FALSE tokens")
+        print(f"Depositing {amount} tokens of {token_address} to auction {self.address}")
         try:
-            return self.interact("deposit", [true_amount, false_amount])
+            return self.interact("deposit", [token_address, amount])
         except Exception as e:
             print(f"Error in deposit: {e}")
             raise
 
-    def bid_true(self, amount, price):
+    def withdraw(self, token_address, amount, wait=False):
         """
-        Place a bid for TRUE tokens.
+        Withdraw asset or currency tokens that are not locked in orders.
         
         Args:
-            amount: Amount of tokens to bid
-            price: Price offered (in FALSE tokens per TRUE token)
+            token_address: Address of the asset or currency token
+            amount: Amount of tokens to withdraw
+            wait: Whether the transaction waits for the transfer callback
             
         Returns:
             Transaction hash
         """
-        print(f"Bidding for {amount} TRUE tokens at price {price}")
+        print(f"Withdrawing {amount} tokens of {token_address} (wait={wait})")
+        wait_string = "false"
+        if wait:
+            wait_string = "true"
         try:
-            return self.interact("bid_true", [amount, price])
+            return self.interact("withdraw", [token_address, amount, wait_string])
         except Exception as e:
-            print(f"Error in bid_true: {e}")
+            print(f"Error in withdraw: {e}")
             raise
 
-    def bid_false(self, amount, price):
+    def submit_bid(self, price, amount, cancel_id):
         """
-        Place a bid for FALSE tokens.
+        Submit a bid limit order. It matches resting asks up to the price and rests with the remainder.
         
         Args:
-            amount: Amount of tokens to bid
-            price: Price offered (in TRUE tokens per FALSE token)
+            price: Price per token in units of price_numerator/price_denominator currency
+            amount: Amount of asset tokens to buy
+            cancel_id: Cancelation id, unique among the sender's open orders in this auction
             
         Returns:
             Transaction hash
         """
-        print(f"Bidding for {amount} FALSE tokens at price {price}")
+        print(f"Bidding for {amount} tokens at price {price} (cancelation id {cancel_id})")
         try:
-            return self.interact("bid_false", [amount, price])
+            return self.interact("submit_bid", [price, amount, cancel_id])
         except Exception as e:
-            print(f"Error in bid_false: {e}")
+            print(f"Error in submit_bid: {e}")
             raise
 
-    def withdraw_true(self, amount):
+    def submit_ask(self, price, amount, cancel_id):
         """
-        Withdraw TRUE tokens from auction.
+        Submit an ask limit order. It matches resting bids down to the price and rests with the remainder.
         
         Args:
-            amount: Amount of tokens to withdraw
+            price: Price per token in units of price_numerator/price_denominator currency
+            amount: Amount of asset tokens to sell
+            cancel_id: Cancelation id, unique among the sender's open orders in this auction
             
         Returns:
             Transaction hash
         """
-        print(f"Withdrawing {amount} TRUE tokens")
+        print(f"Asking for {amount} tokens at price {price} (cancelation id {cancel_id})")
         try:
-            return self.interact("withdraw_true", [amount])
+            return self.interact("submit_ask", [price, amount, cancel_id])
         except Exception as e:
-            print(f"Error in withdraw_true: {e}")
+            print(f"Error in submit_ask: {e}")
             raise
 
-    def withdraw_false(self, amount):
+    def cancel_limit_order(self, cancel_id):
         """
-        Withdraw FALSE tokens from auction.
+        Cancel the sender's open order with a cancelation id, returning its locked tokens to the sender's balance.
         
         Args:
-            amount: Amount of tokens to withdraw
+            cancel_id: Cancelation id of the order
             
         Returns:
             Transaction hash
         """
-        print(f"Withdrawing {amount} FALSE tokens")
+        print(f"Cancelling order with cancelation id {cancel_id}")
         try:
-            return self.interact("withdraw_false", [amount])
+            return self.interact("cancel_limit_order", [cancel_id])
         except Exception as e:
-            print(f"Error in withdraw_false: {e}")
+            print(f"Error in cancel_limit_order: {e}")
             raise
 
-    def clear(self):
+    def order_command(self, order):
         """
-        Clear matched bids in auction.
+        Build the command for one order of a batch.
         
+        Args:
+            order: Dictionary with is_bid, price, amount and cancel_id
+            
         Returns:
-            Transaction hash
+            Shell command string
         """
-        print("Clearing matched bids")
-        try:
-            return self.interact("clear", [])
-        except Exception as e:
-            print(f"Error in clear: {e}")
-            raise
+        action = "submit_bid" if order["is_bid"] else "submit_ask"
+        return self.command(action, [order["price"], order["amount"], order["cancel_id"]])
+
+    def submit_orders(self, orders):
+        """
+        Place many orders from the current key, each sent as soon as the previous one is included.
+        
+        Args:
+            orders: List of dictionaries with is_bid, price, amount and cancel_id
+            
+        Returns:
+            List with the transaction hash of each order, or None where it failed or was not sent
+        """
+        print(f"Submitting {len(orders)} orders to {self.address}")
+        return PBCContract.execute_sequence([self.order_command(order) for order in orders])
+
+    def submit_ladder(self, is_bid, prices, amounts, first_cancel_id):
+        """
+        Place a ladder of orders on one side, one per price level, see submit_orders.
+        
+        Args:
+            is_bid: True for a ladder of bids, False for asks
+            prices: Price per level
+            amounts: Amount per level, or a single amount for every level
+            first_cancel_id: Cancelation id of the first level, the following levels count up from it
+            
+        Returns:
+            List with the transaction hash of each level, or None where it failed or was not sent
+        """
+        if isinstance(amounts, int):
+            amounts = [amounts] * len(prices)
+        if len(amounts) != len(prices):
+            raise ValueError("A ladder needs one amount per price level")
+        orders = [
+            {"is_bid": is_bid, "price": price, "amount": amount, "cancel_id": first_cancel_id + level}
+            for level, (price, amount) in enumerate(zip(prices, amounts))
+        ]
+        return self.submit_orders(orders)
+
+    def cancel_replace(self, orders):
+        """
+        Replace open orders: each order's cancelation id is cancelled and then reused.
+        The cancels and submissions are one sequence of the current key, so each cancel
+        executes before its replacement, and nothing after a failed command is sent.
+        
+        Args:
+            orders: List of dictionaries with is_bid, price, amount and cancel_id
+            
+        Returns:
+            List with the transaction hashes of the cancels followed by those of the replacements,
+            None where a command failed or was not sent
+        """
+        commands = [self.command("cancel_limit_order", [order["cancel_id"]]) for order in orders]
+        commands += [self.order_command(order) for order in orders]
+        print(f"Replacing {len(orders)} orders in {self.address}")
+        return PBCContract.execute_sequence(commands)
+
+    def open_orders(self, owner=None):
+        """
+        Read the resting orders of the auction from the chain.
+        
+        Args:
+            owner: Optional owner address to filter on
+            
+        Returns:
+            List of decoded limit orders
+        """
+        orders = []
+        for tree_id in (BIDS_TREE, ASKS_TREE):
+            orders += [decode_limit_order(value) for _, value in fetch_avl_entries(self.address, tree_id)]
+        if owner is not None:
+            orders = [order for order in orders if order["owner"] == owner]
+        return orders
 
     def get_state(self):
         """
-        Get current auction state (true and false token balances).
+        Get current auction token balances of the asset and currency tokens.
         
         Returns:
-            Dictionary with true_balance and false_balance
+            Dictionary with true_balance (asset) and false_balance (currency)
         """
         print("Getting auction state")
         try:
-            state = SerializedState(address=self.address)
-            # First deserialize the token addresses and amount
-            fields = state.deserialize(["Address", "Address", "u256"])
-            
-            # Then get the balances
-            print("Getting TRUE token balance...")
+            print("Getting asset token balance...")
             try:
-                true_token = TokenV2(address=fields[0])
+                true_token = TokenV2(address=self.asset_address)
                 true_balance = true_token.get_balance(self.address)
             except Exception as e:
-                print(f"Error getting TRUE token balance: {e}")
+                print(f"Error getting asset token balance: {e}")
                 true_balance = "ERROR"
                 
-            print("Getting FALSE token balance...")
+            print("Getting currency token balance...")
             try:
-                false_token = TokenV2(address=fields[1])
+                false_token = TokenV2(address=self.currency_address)
                 false_balance = false_token.get_balance(self.address)
             except Exception as e:
-                print(f"Error getting FALSE token balance: {e}")
+                print(f"Error getting currency token balance: {e}")
                 false_balance = "ERROR"
                 
             return {
@@ -234,3 +333,28 @@ class DoubleAuction(PBCContract):
         except Exception as e:
             print(f"Error getting auction state: {e}")
             raise
+
+def mass_cancel(auctions, owner, cancel_id=None):
+    """
+    Cancel the open orders of the current key in every given auction.
+    The orders are read from the chain, so only orders that exist are cancelled,
+    and the cancels are sent as one sequence of the key.
+    
+    Args:
+        auctions: DoubleAuction instances
+        owner: Address of the current key
+        cancel_id: Optional cancelation id; only orders with it are cancelled
+    
+    Returns:
+        Dictionary of (auction address, cancelation id) -> transaction hash, or None where the cancel failed or was not sent
+    """
+    targets = [
+        (auction, order["cancelation_id"])
+        for auction in auctions
+        for order in auction.open_orders(owner)
+        if cancel_id is None or order["cancelation_id"] == cancel_id
+    ]
+    print(f"Cancelling {len(targets)} orders of {owner} in {len(auctions)} auctions")
+    commands = [auction.command("cancel_limit_order", [order_cancel_id]) for auction, order_cancel_id in targets]
+    results = PBCContract.execute_sequence(commands)
+    return {(auction.address, order_cancel_id): trans_id for (auction, order_cancel_id), trans_id in zip(targets, results)}
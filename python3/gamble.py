@@ -1,22 +1,20 @@
 from tokenv2 import TokenV2
 from tokensplitter import TokenSplitter
 from doubleauction import DoubleAuction
-import json
+from marketregistry import select_market
+from matching import OrderBook
+from pbccontract import PBCContract
 import math
 
-with open("prediction-market.json", 'r') as json_file:
-    data = json.load(json_file)
+data = select_market()
 
-currency = TokenV2(address=data["currency"])
-true_auction = DoubleAuction(address=data["true_auction"])
-false_auction = DoubleAuction(address=data["false_auction"])
-splitter = TokenSplitter(address=data["splitter"])
-true_address = true_auction.asset_address
-false_address = false_auction.asset_address
-true_token = TokenV2(address = true_address)
-false_token = TokenV2(address = false_address)
-true_symbol = true_token.symbol
-false_symbol = false_token.symbol
+# Contract states are fetched when first needed, not before the first prompt
+currency = TokenV2.lazy(data["currency"])
+true_auction = DoubleAuction.lazy(data["true_auction"])
+false_auction = DoubleAuction.lazy(data["false_auction"])
+splitter = TokenSplitter.lazy(data["splitter"])
+true_token = TokenV2.lazy(data["true_token"])
+false_token = TokenV2.lazy(data["false_token"])
 
 print(" PBC PREDICTION MARKET PARTICIPATION")
 print("")
@@ -52,6 +50,8 @@ amount_out = input(" What is your minimum acceptable winning amount, INCLUDING t
 amount_out = float(amount_out)
 actual_out = int(amount_out*(10**currency.decimals))
 answer2 = input(" Do you want to bet as a buyer or an seller? (B/S) ")
+while answer2 not in ("B", "S"):
+    answer2 = input(" Please answer B to bet as a buyer or S to bet as a seller: ")
 if answer2=="B":
     my_auction = true_auction
     if answer1!="Y":
@@ -59,8 +59,12 @@ if answer2=="B":
     print(" To bet as a buyer, you first deposit", amount_in, currency.symbol, "to the auction contract for", token_I_like.symbol)
     print(" Let me do that for you (hey, I know your secret key!)")
     
-    currency.approve_relative(my_auction.address, actual_in)
-    my_auction.deposit(currency.address, actual_in)
+    sent = PBCContract.execute_sequence([
+        currency.command("approve_relative", [my_auction.address, actual_in]),
+        my_auction.command("deposit", [currency.address, actual_in]),
+    ])
+    if None in sent:
+        raise SystemExit(" The deposit did not go through, please check your balance and try again.")
 
     print(" You then simply place a bid for", amount_out, token_I_like.symbol)
     print(" at price", amount_in, "divided by", amount_out, "that is, price", amount_in/amount_out)
@@ -74,29 +78,34 @@ if answer2=="S":
     print(" To bet as an seller, you first split", amount_out, currency.symbol, "in the token splitter.")
     print(" Let me do that for you (hey, I know your secret key!)")
 
-    print(" Approving transfer of currency to splitter...")
-    currency.approve_relative(splitter.address, actual_out)
-    print(" Actually doing the transfer of currency to splitter...") 
-    splitter.deposit(currency.address, actual_out)
-    print(" Splitting the deposited currency in two...")
-    splitter.split(actual_out)
-    print(" Withdrawing", true_token.symbol, "...")
-    splitter.withdraw(true_token.address, actual_out)
-    print(" Withdrawing", false_token.symbol, "...")
-    splitter.withdraw(false_token.address, actual_out)
-    
-    print(" You now have", amount_out, true_symbol, "and", amount_out, false_symbol)
-    print(" We now transfer the token you don't like - in your case", token_I_hate.symbol)
+    print(" Approving and transferring currency to the splitter, splitting it in two and withdrawing")
+    print(" both", true_token.symbol, "and", false_token.symbol, "- all sent back to back...")
+    print(" We then transfer the token you don't like - in your case", token_I_hate.symbol)
     print(" - to the auction contract...")
-        
-    token_I_hate.approve_relative(my_auction.address, actual_out)
-    my_auction.deposit(token_I_hate.address, actual_out)
+    sent = PBCContract.execute_sequence([
+        currency.command("approve_relative", [splitter.address, actual_out]),
+        splitter.command("deposit", [currency.address, actual_out]),
+        splitter.command("split", [actual_out]),
+        splitter.command("withdraw", [true_token.address, actual_out, "false"]),
+        splitter.command("withdraw", [false_token.address, actual_out, "false"]),
+        token_I_hate.command("approve_relative", [my_auction.address, actual_out]),
+        my_auction.command("deposit", [token_I_hate.address, actual_out]),
+    ])
+    if None in sent:
+        raise SystemExit(" Not all steps went through, please check your balances in the splitter and auction.")
+    print(" You now have", amount_out, token_I_like.symbol, "in your wallet and", amount_out, token_I_hate.symbol, "in the auction")
     
     print(" and attempt to sell them for a total price of:")
     print(amount_out, "minus", amount_in, currency.symbol, "=", amount_out-amount_in, currency.symbol)
     print("which, divided by", amount_out, "is a price per token of",(amount_out - amount_in)/amount_out)
     auction_price = math.ceil( ((amount_out - amount_in)/amount_out)*my_auction.denominator/my_auction.numerator)
-ok = input(" Keep an eye on the ask/bids lists and press ENTER...")    
+book = OrderBook(my_auction.numerator, my_auction.denominator, orders=my_auction.open_orders())
+estimate = book.submit(None, answer2=="B", auction_price, actual_out, c, apply=False)
+print(" Against the current book this order would trade", estimate.token_amount/(10**currency.decimals), "tokens")
+print(" in", len(estimate.fills), "fills for", estimate.currency_amount/(10**currency.decimals), currency.symbol)
+if estimate.rest is not None:
+    print(" and leave", estimate.rest["token_amount"]/(10**currency.decimals), "tokens resting at price", auction_price)
+ok = input(" Press ENTER to submit the order...")    
 if answer2=="B":
     my_auction.submit_bid(price=auction_price, amount=actual_out, cancel_id=c)
 if answer2=="S":
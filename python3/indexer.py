@@ -1,69 +1,486 @@
 from typing import Dict, List, Optional
-import json
+from dataclasses import dataclass
+import argparse
+import asyncio
+import multiprocessing
+import os
 import time
+import zlib
 from datetime import datetime
-from pbc_client import PbcClient, Market, Position
+from serializedstate import SerializedState, fetch_avl_entries, decode_limit_order, decode_token_balance
+from pbccontract import contract_shard
+from pollscheduler import AdaptivePoller, contract_state_signal
+from indexstore import IndexStore
+from trades import decode_cancel_rpc, decode_submit_rpc, fills_from_snapshots, fills_from_transaction
+from blockscanner import SHARDS, BlockScanner, ContractActivity, build_routes, ingest, shard_heads
+from marketregistry import REGISTRY_FILE, load_entries
+
+# Ids of the AVL trees in the contract states, in order of creation
+BALANCES_TREE = 0
+BIDS_TREE = 2
+ASKS_TREE = 3
+
+LIFE_STAGES = {0: "PREPARING", 1: "ACTIVE", 2: "RESOLVED"}
+
+# Index within a block that sorts after every transaction of the block
+AFTER_BLOCK = 2 ** 31
+
+@dataclass
+class Market:
+    """A prediction market: a token splitter with a YES and a NO double auction."""
+    id: str
+    title: str
+    description: str
+    end_date: Optional[int]
+    total_liquidity: int
+    yes_price: Optional[float]
+    no_price: Optional[float]
+    status: str
+    resolution: Optional[str]
+    currency: str
+    oracle: str
+    true_token: str
+    false_token: str
+    true_auction: str
+    false_auction: str
+
+@dataclass
+class Position:
+    """YES and NO token holdings of a trader in a market."""
+    trader: str
+    yes_amount: int
+    no_amount: int
+
+def load_market_entries(filename=REGISTRY_FILE):
+    """
+    Load the markets to index from the market registry written by initprediction.py and launchmarkets.py.
+
+    Returns:
+        List of market entry dictionaries
+    """
+    return load_entries(filename)
+
+def read_auction_state(address):
+    """Read price scaling and top of book of a DoubleAuction contract."""
+    state = SerializedState(address=address)
+    fields = state.deserialize(["u64", "u64", "u64", "Address", "Address", "Address"])
+    bids = [decode_limit_order(value) for _, value in fetch_avl_entries(address, BIDS_TREE, limit=1)]
+    asks = [decode_limit_order(value) for _, value in fetch_avl_entries(address, ASKS_TREE, limit=1)]
+    return {
+        "price_numerator": fields[0],
+        "price_denominator": fields[1],
+        "next_order_id": fields[2],
+        "currency": fields[4],
+        "asset": fields[5],
+        "best_bid": bids[0]["price_per_token"] if bids else None,
+        "best_ask": asks[0]["price_per_token"] if asks else None,
+    }
+
+def auction_price(auction):
+    """Price of one asset token in currency, from the mid of the top of book."""
+    quotes = [p for p in (auction["best_bid"], auction["best_ask"]) if p is not None]
+    if not quotes:
+        return None
+    return (sum(quotes) / len(quotes)) * auction["price_numerator"] / auction["price_denominator"]
+
+def read_splitter_state(address):
+    """Read description, symbol and life stage of a TokenSplitter contract."""
+    state = SerializedState(address=address)
+    fields = state.deserialize(["String", "String", "Address", "Address", "Address", "Address", "Address", "u8"])
+    resolution = None
+    if fields[7] == 2:
+        resolution = "YES" if state.chop("bool") else "NO"
+    return {
+        "description": fields[0],
+        "symbol": fields[1],
+        "splitter_address": fields[6],
+        "status": LIFE_STAGES.get(fields[7], "UNKNOWN"),
+        "resolution": resolution,
+    }
+
+def positions_from_balances(market, splitter_balances, true_balances, false_balances):
+    """
+    Combine balances into positions.
+    YES/NO tokens held in the splitter and asset tokens held in the auctions are counted.
+    """
+    contracts = {market.id, market.true_auction, market.false_auction}
+    positions: Dict[str, Position] = {}
+
+    def position(trader):
+        if trader not in positions:
+            positions[trader] = Position(trader=trader, yes_amount=0, no_amount=0)
+        return positions[trader]
+
+    for trader, (true_tokens, false_tokens, _) in splitter_balances.items():
+        if trader not in contracts and (true_tokens or false_tokens):
+            p = position(trader)
+            p.yes_amount += true_tokens
+            p.no_amount += false_tokens
+    for trader, (_, asset_tokens, _) in true_balances.items():
+        if trader not in contracts and asset_tokens:
+            position(trader).yes_amount += asset_tokens
+    for trader, (_, asset_tokens, _) in false_balances.items():
+        if trader not in contracts and asset_tokens:
+            position(trader).no_amount += asset_tokens
+    return list(positions.values())
+
+def market_contracts(entry):
+    """Splitter and auctions of a market entry, in signal order."""
+    return [entry["splitter"], entry["true_auction"], entry["false_auction"]]
+
+class ChainReader:
+    """
+    Reads markets and positions from the chain with the project's state readers.
+    The readers block, so every call runs in the default thread pool and never on the event loop.
+
+    Attributes:
+        entries: Market entries to read, as written by initprediction.py
+        semaphore: Bounds the number of contract reads in flight
+    """
+    def __init__(self, entries, concurrency=8):
+        self.entries = entries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.price_scaling: Dict[str, tuple] = {}
+
+    async def _run(self, function, *args):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, function, *args)
+
+    async def get_markets(self) -> List[Market]:
+        """Read all markets concurrently."""
+        markets = await asyncio.gather(*(self.get_market(entry) for entry in self.entries))
+        return list(markets)
+
+    async def get_market(self, entry, splitter_balances=None) -> Market:
+        """
+        Read a market from its splitter and auctions.
+
+        Args:
+            entry: Market entry with the contract addresses
+            splitter_balances: Optional balances of the splitter, read if not given
+        """
+        splitter, true_auction, false_auction = await asyncio.gather(
+            self._run(read_splitter_state, entry["splitter"]),
+            self._run(read_auction_state, entry["true_auction"]),
+            self._run(read_auction_state, entry["false_auction"]),
+        )
+        if splitter_balances is None:
+            splitter_balances = await self.get_balances(entry["splitter"])
+        self.price_scaling[entry["true_auction"]] = (true_auction["price_numerator"], true_auction["price_denominator"])
+        self.price_scaling[entry["false_auction"]] = (false_auction["price_numerator"], false_auction["price_denominator"])
+        # Original tokens held by the splitter itself back the outstanding YES/NO pairs
+        total_liquidity = splitter_balances.get(splitter["splitter_address"], (0, 0, 0))[2]
+        return Market(
+            id=entry["splitter"],
+            title=splitter["symbol"],
+            description=splitter["description"],
+            end_date=entry.get("end_date"),
+            total_liquidity=total_liquidity,
+            yes_price=auction_price(true_auction),
+            no_price=auction_price(false_auction),
+            status=splitter["status"],
+            resolution=splitter["resolution"],
+            currency=entry["currency"],
+            oracle=entry["oracle"],
+            true_token=entry["true_token"],
+            false_token=entry["false_token"],
+            true_auction=entry["true_auction"],
+            false_auction=entry["false_auction"],
+        )
+
+    async def get_balances(self, contract) -> Dict[str, tuple]:
+        """Read the TokenBalances tree of a contract as owner -> (a_tokens, b_tokens, liquidity_tokens)."""
+        entries = await self._run(fetch_avl_entries, contract, BALANCES_TREE)
+        return {key.hex(): decode_token_balance(value) for key, value in entries}
+
+    async def get_orders(self, auction) -> List[Dict]:
+        """Read all resting orders of an auction from its bid and ask trees."""
+        bids, asks = await asyncio.gather(
+            self._run(fetch_avl_entries, auction, BIDS_TREE),
+            self._run(fetch_avl_entries, auction, ASKS_TREE),
+        )
+        return [decode_limit_order(value) for _, value in bids + asks]
+
+    async def get_positions(self, market: Market) -> List[Position]:
+        """Read positions from the balance trees of the splitter and both auctions."""
+        balances = await asyncio.gather(
+            self.get_balances(market.id),
+            self.get_balances(market.true_auction),
+            self.get_balances(market.false_auction),
+        )
+        return positions_from_balances(market, *balances)
+
+    async def get_change_signal(self, entry):
+        """Cheap change signal of a market: the state digests of its three contracts, see contract_state_signal."""
+        return tuple(await asyncio.gather(*(self._run(contract_state_signal, c) for c in market_contracts(entry))))
 
 class MarketIndexer:
-    def __init__(self, client: PbcClient):
+    def __init__(self, client: ChainReader, store: Optional[IndexStore] = None, poller: Optional[AdaptivePoller] = None,
+                 activity: Optional[ContractActivity] = None):
         self.client = client
-        self.markets: Dict[str, Market] = {}
-        self.positions: Dict[str, Dict[str, Position]] = {}
+        self.store = store or IndexStore("indexer.db", market_type=Market, position_type=Position)
+        self.poller = poller or AdaptivePoller(min_interval=2, max_interval=60, max_age=300)
+        # Shard heads the checkpoints are current to
+        self.activity = activity or ContractActivity()
+        # Set by block ingestion, which needs to know which blocks each stored book reflects
+        self.track_books = False
+
+    async def _write(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function, *args)
 
     async def start_indexing(self):
-        """Start indexing market data from the blockchain."""
+        """Start indexing market data from the blockchain, resuming from the persisted checkpoints."""
+        self.poller.sync(entry["splitter"] for entry in self.client.entries)
+        await self._write(self.restore_checkpoints)
         while True:
             try:
                 await self.update_markets()
-                await self.update_positions()
-                time.sleep(5)  # Update every 5 seconds
             except Exception as e:
                 print(f"Error indexing data: {e}")
-                time.sleep(5)  # Wait before retrying
+            await asyncio.sleep(max(self.poller.seconds_until_due(), 0.1))
 
     async def update_markets(self):
-        """Update market data from the blockchain."""
-        markets = await self.client.get_markets()
-        for market in markets:
-            self.markets[market.id] = market
+        """Update the markets whose change signal moved, concurrently."""
+        due = set(self.poller.due_keys())
+        entries = [entry for entry in self.client.entries if entry["splitter"] in due]
+        results = await asyncio.gather(*(self.update_market(entry) for entry in entries), return_exceptions=True)
+        for entry, result in zip(entries, results):
+            if isinstance(result, Exception):
+                print(f"Error indexing market {entry['splitter']}: {result}")
+
+    def restore_checkpoints(self, catch_up=True):
+        """
+        Seed the poller from the market checkpoints of a previous run.
+
+        The derived state is already in the store, current to the shard heads in each
+        checkpoint. With catch_up, the blocks produced since those heads are scanned
+        once, and markets none of whose contracts had a transaction in them are
+        restored with the change signal of their last refresh instead of being
+        refetched, so restart time depends on the downtime. After a downtime longer
+        than the catch-up window, every market is refetched on its first poll.
+        Without catch_up, e.g. under block ingestion whose scanner replays the
+        downtime from its own checkpoints, every market is restored as is.
+        """
+        now = time.time()
+        checkpoints = {
+            market_id: value for market_id, value in self.store.get_checkpoints("market").items()
+            if market_id in self.poller.states
+        }
+        activity = self.activity
+        touched = {}
+        try:
+            if catch_up:
+                heads = [checkpoint["heads"] for checkpoint, _ in checkpoints.values() if checkpoint.get("heads")]
+                start = {shard: min(h.get(shard, -1) for h in heads) for shard in heads[0]} if heads else None
+                touched = activity.catch_up(start)
+            else:
+                activity.catch_up()
+        except Exception as e:
+            print(f"Could not catch up on the blocks since the checkpoints: {e}")
+            touched = None
+        entries = {entry["splitter"]: entry for entry in self.client.entries}
+        restored = 0
+        for market_id, (checkpoint, updated) in checkpoints.items():
+            for auction, (numerator, denominator) in checkpoint.get("price_scaling", {}).items():
+                self.client.price_scaling[auction] = (numerator, denominator)
+            if touched is None or not checkpoint.get("signal") or (catch_up and not checkpoint.get("heads")):
+                continue
+            contracts = market_contracts(entries[market_id])
+            if any(block_time > checkpoint["heads"].get(shard, -1)
+                   for contract in contracts for shard, block_time in touched.get(contract, {}).items()):
+                continue
+            self.poller.restore(market_id, tuple(checkpoint["signal"]), now - checkpoint.get("refreshed", updated))
+            restored += 1
+        print(f"Restored {restored} of {len(checkpoints)} market checkpoints")
+
+    async def update_market(self, entry):
+        """Refetch one market, its balances, positions and orders if its change signal moved."""
+        key = entry["splitter"]
+        # The refresh sees at least the blocks up to these heads
+        try:
+            heads = await self._write(self.activity.current_heads)
+        except Exception as e:
+            print(f"Could not read the shard heads, {key} is refetched after a restart: {e}")
+            heads = {}
+        refreshed, _ = await self.poller.poll_async(
+            key, lambda: self.refresh_market(entry), lambda: self.client.get_change_signal(entry)
+        )
+        signal = self.poller.states[key].last_signal
+        if refreshed and signal is not None:
+            auctions = [entry["true_auction"], entry["false_auction"]]
+            await self._write(self.store.set_checkpoint, "market", key, {
+                "heads": heads,
+                "signal": list(signal),
+                "refreshed": time.time(),
+                "price_scaling": {a: self.client.price_scaling[a] for a in auctions if a in self.client.price_scaling},
+            })
+
+    async def refresh_market(self, entry) -> Market:
+        contracts = market_contracts(entry)
+        before = await self._book_heads()
+        balances, orders = await asyncio.gather(
+            asyncio.gather(*(self.client.get_balances(contract) for contract in contracts)),
+            asyncio.gather(*(self.client.get_orders(auction) for auction in contracts[1:])),
+        )
+        after = await self._book_heads()
+        market = await self.client.get_market(entry, balances[0])
+
+        await self._write(self.store.save_market, market)
+        for contract, contract_balances in zip(contracts, balances):
+            await self._write(self.store.replace_balances, contract, contract_balances)
+        for auction, auction_orders in zip(contracts[1:], orders):
+            await self.record_snapshot_fills(market.id, auction, auction_orders)
+            if self.track_books:
+                await self._write(self.store.set_checkpoint, "book", auction, None)
+            await self._write(self.store.replace_open_orders, market.id, auction, auction_orders)
+            if self.track_books and before and after:
+                # The snapshot holds every transaction up to the heads before it, and maybe some up to the heads after
+                await self._write(self.store.set_checkpoint, "book", auction, {
+                    "low": {shard: [block_time, AFTER_BLOCK] for shard, block_time in before.items()},
+                    "high": {shard: [block_time, AFTER_BLOCK] for shard, block_time in after.items()},
+                })
+        await self._write(self.store.replace_positions, market.id, positions_from_balances(market, *balances))
+        return market
+
+    async def _book_heads(self):
+        if not self.track_books:
+            return None
+        try:
+            return await self._write(shard_heads)
+        except Exception as e:
+            print(f"Could not read the shard heads, transaction fills wait for the next snapshot: {e}")
+            return None
+
+    async def record_snapshot_fills(self, market_id, auction, orders):
+        """Fallback fill reconstruction: diff the stored book of an auction against a new snapshot."""
+        previous = await self._write(self.store.get_open_orders, auction)
+        if not previous:
+            return
+        fills = fills_from_snapshots(auction, previous, orders, time.time(), self.client.price_scaling.get(auction))
+        if fills:
+            await self._write(self.store.append_trades, market_id, fills)
+
+    async def record_transaction(self, market_id, auction, rpc, sender, tx_id, timestamp, shard, position):
+        """
+        Record the fills of an executed submit_bid/submit_ask transaction.
+
+        Fills are only matched against the stored book when it is the book just before
+        the transaction, see claim_book; otherwise the transaction is left to the
+        snapshot diff of the next refresh. The fills are also applied to the stored
+        book, so the next snapshot diff does not count them again.
+
+        Args:
+            market_id: Market the auction belongs to
+            auction: Auction the transaction targeted
+            rpc: Action RPC of the transaction
+            sender: Sender of the transaction
+            tx_id: Transaction hash
+            timestamp: Execution time of the transaction
+            shard: Shard the transaction executed on
+            position: (block time, index in the block) of the transaction
+
+        Returns:
+            List of fills recorded
+        """
+        submit = decode_submit_rpc(rpc)
+        if submit is None or not await self.claim_book(auction, shard, position):
+            return []
+        resting = await self._write(self.store.get_open_orders, auction)
+        fills = fills_from_transaction(auction, resting, submit, sender, tx_id, timestamp, self.client.price_scaling.get(auction))
+        if fills:
+            await self._write(self.store.append_trades, market_id, fills, True)
+        if sum(f["token_amount"] for f in fills) < submit["token_amount"]:
+            # The remainder now rests in the book, which the stored book does not have
+            await self._write(self.store.set_checkpoint, "book", auction, None)
+        return fills
+
+    async def claim_book(self, auction, shard, position):
+        """
+        Check whether the stored book of an auction is the book just before a transaction
+        that changes it, and if so move the book past the transaction.
+
+        The stored book holds every transaction up to its low position and maybe some up
+        to its high position. A transaction up to low is already in it; one between low
+        and high may or may not be, so the book is forgotten until the next snapshot.
+
+        Returns:
+            True if the transaction can be applied to the stored book
+        """
+        book = await self._write(self.store.get_checkpoint, "book", auction)
+        position = list(position)
+        if not book or shard not in book["low"] or position <= book["low"][shard]:
+            return False
+        if position <= book["high"][shard]:
+            await self._write(self.store.set_checkpoint, "book", auction, None)
+            return False
+        await self._write(self.store.set_checkpoint, "book", auction, {"low": {shard: position}, "high": {shard: position}})
+        return True
+
+    async def record_cancel(self, auction, rpc, sender, shard, position):
+        """
+        Remove the order of an executed cancel_limit_order transaction from the stored book,
+        so the snapshot diff of the next refresh does not take it for a fill.
+        A stored book that already holds the transaction is left alone, since the
+        cancelation id may have been reused by a later order.
+        """
+        cancelation_id = decode_cancel_rpc(rpc)
+        if cancelation_id is None:
+            return
+        book = await self._write(self.store.get_checkpoint, "book", auction)
+        if book and shard in book["low"] and list(position) <= book["low"][shard]:
+            return
+        await self._write(self.store.close_open_order, auction, sender, cancelation_id)
+        # Moves a book that was current just before the cancelation past it, or forgets an uncertain one
+        await self.claim_book(auction, shard, position)
 
     async def update_positions(self):
-        """Update position data from the blockchain."""
-        for market_id in self.markets:
-            positions = await self.client.get_positions(market_id)
-            self.positions[market_id] = {
-                position.trader: position for position in positions
-            }
+        """Update position data of all known markets from the blockchain, concurrently."""
+        market_list = self.get_markets()
+        results = await asyncio.gather(*(self.client.get_positions(market) for market in market_list))
+        for market, positions in zip(market_list, results):
+            await self._write(self.store.replace_positions, market.id, positions)
 
     def get_market(self, market_id: str) -> Optional[Market]:
         """Get market data by ID."""
-        return self.markets.get(market_id)
+        return self.store.get_market(market_id)
 
-    def get_markets(self) -> List[Market]:
-        """Get all markets."""
-        return list(self.markets.values())
+    def get_markets(self, status: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None) -> List[Market]:
+        """Get all markets, optionally by status and one page at a time."""
+        return self.store.get_markets(status, after, limit)
 
     def get_position(self, market_id: str, trader: str) -> Optional[Position]:
         """Get position data for a specific market and trader."""
-        return self.positions.get(market_id, {}).get(trader)
+        return self.store.get_position(market_id, trader)
 
-    def get_positions(self, market_id: str) -> List[Position]:
-        """Get all positions for a specific market."""
-        return list(self.positions.get(market_id, {}).values())
+    def get_positions(self, market_id: str, after: Optional[str] = None, limit: Optional[int] = None) -> List[Position]:
+        """Get all positions for a specific market, optionally one page at a time."""
+        return self.store.get_positions(market_id, after, limit)
 
     def get_active_markets(self) -> List[Market]:
         """Get all active markets."""
-        return [
-            market for market in self.markets.values()
-            if market.status == "ACTIVE"
-        ]
+        return self.store.get_markets(status="ACTIVE")
 
     def get_resolved_markets(self) -> List[Market]:
         """Get all resolved markets."""
-        return [
-            market for market in self.markets.values()
-            if market.status == "RESOLVED"
-        ]
+        return self.store.get_markets(status="RESOLVED")
+
+    def get_orders(self, market_id: str, status: str = "OPEN", after: Optional[tuple] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Get the orders of a market with the given status, optionally one page at a time."""
+        return self.store.get_orders(market_id, status, after, limit)
+
+    def get_orders_by_owner(self, owner: str, cancelation_id: Optional[int] = None) -> List[Dict]:
+        """Get the orders of an owner, optionally by cancelation id."""
+        return self.store.get_orders_by_owner(owner, cancelation_id)
+
+    def get_trades(self, market_id: str, after: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        """Get the trades of a market in log order."""
+        return self.store.get_trades(market_id, after=after, limit=limit)
+
+    def get_candles(self, auction: str, resolution: int, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+        """Get OHLCV candles of an auction at one of the maintained resolutions."""
+        return self.store.get_candles(auction, resolution, start, end)
 
     def get_market_stats(self, market_id: str) -> Dict:
         """Get statistics for a specific market."""
@@ -71,33 +488,166 @@ class MarketIndexer:
         if not market:
             return {}
 
-        positions = self.get_positions(market_id)
-        total_yes = sum(p.yes_amount for p in positions)
-        total_no = sum(p.no_amount for p in positions)
+        aggregates = self.store.get_aggregates(market_id)
 
         return {
             "market_id": market_id,
             "title": market.title,
             "description": market.description,
-            "end_date": datetime.fromtimestamp(market.end_date).isoformat(),
+            "end_date": datetime.fromtimestamp(market.end_date).isoformat() if market.end_date else None,
             "total_liquidity": market.total_liquidity,
             "yes_price": market.yes_price,
             "no_price": market.no_price,
             "status": market.status,
             "resolution": market.resolution,
-            "total_yes_positions": total_yes,
-            "total_no_positions": total_no,
-            "number_of_traders": len(positions),
+            "total_yes_positions": aggregates["total_yes"],
+            "total_no_positions": aggregates["total_no"],
+            "number_of_traders": aggregates["traders"],
+            "open_interest": aggregates["open_interest"],
+            "volume_24h": aggregates["volume_24h"],
+            "volume_7d": aggregates["volume_7d"],
+            "currency_volume_24h": aggregates["currency_volume_24h"],
+            "currency_volume_7d": aggregates["currency_volume_7d"],
         }
 
+def partition_entries(entries, workers, by="auto"):
+    """
+    Split market entries into partitions for worker processes.
+
+    Args:
+        entries: Market entries to partition
+        workers: Number of partitions
+        by: "shard" to group markets by the shard of their splitter, "hash" to
+            spread them by a CRC32 of the splitter address, or "auto" to group by
+            shard unless there are more workers than shards to fill
+
+    Returns:
+        List of non-empty lists of entries
+    """
+    if by == "auto":
+        by = "shard" if workers <= len(SHARDS) else "hash"
+    partitions = [[] for _ in range(workers)]
+    shard_slots = {}
+    for entry in entries:
+        shard = None
+        if by == "shard":
+            shard = contract_shard(entry["splitter"])
+            if shard is None:
+                print(f"Could not resolve shard of {entry['splitter']}, partitioning by hash")
+        if shard is not None:
+            if shard not in shard_slots:
+                shard_slots[shard] = len(shard_slots) % workers
+            slot = shard_slots[shard]
+        else:
+            slot = zlib.crc32(entry["splitter"].encode("utf-8")) % workers
+        partitions[slot].append(entry)
+    return [partition for partition in partitions if partition]
+
+def partition_shards(entries):
+    """
+    Shards the contracts of some markets live on, so a worker only reads the heads and
+    catch-up blocks of its own partition. All shards if any shard cannot be resolved.
+    """
+    shards = {contract_shard(contract) for entry in entries for contract in market_contracts(entry)}
+    if None in shards:
+        return list(SHARDS)
+    return sorted(shards)
+
+def run_worker(entries, db_path, concurrency):
+    """Entry point of a worker process: index one partition of the markets into the shared store."""
+    store = IndexStore(db_path, market_type=Market, position_type=Position)
+    activity = ContractActivity(partition_shards(entries))
+    print(f"Worker for {len(entries)} markets reads shards {', '.join(activity.shards)}")
+    indexer = MarketIndexer(ChainReader(entries, concurrency), store, activity=activity)
+    try:
+        asyncio.run(indexer.start_indexing())
+    except KeyboardInterrupt:
+        pass
+
+class ShardedIndexer(MarketIndexer):
+    """
+    Runs polling and decoding in a pool of worker processes, one per partition of the markets.
+    Workers write into the shared store; this process only serves queries from it.
+
+    Attributes:
+        workers: Number of worker processes
+        partition_by: "auto", "shard" or "hash", see partition_entries
+        processes: Running worker processes
+    """
+    def __init__(self, client: ChainReader, store: Optional[IndexStore] = None, workers: Optional[int] = None,
+                 partition_by: str = "auto", concurrency: int = 8):
+        super().__init__(client, store)
+        self.workers = workers or os.cpu_count() or 1
+        self.partition_by = partition_by
+        self.concurrency = concurrency
+        self.partitions: List[List[Dict]] = []
+        self.processes: List[multiprocessing.Process] = []
+
+    def start_workers(self):
+        """Partition the markets and start one worker process per partition."""
+        self.partitions = partition_entries(self.client.entries, self.workers, self.partition_by)
+        self.processes = [self._spawn(number) for number in range(len(self.partitions))]
+
+    def _spawn(self, number):
+        entries = self.partitions[number]
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(entries, self.store.path, self.concurrency),
+            name=f"indexer-worker-{number}",
+            daemon=True,
+        )
+        process.start()
+        print(f"Started {process.name} for {len(entries)} markets")
+        return process
+
+    def stop_workers(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    async def start_indexing(self):
+        """Start the workers and restart any that exit."""
+        self.start_workers()
+        try:
+            while True:
+                for number, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        print(f"{process.name} exited with code {process.exitcode}, restarting")
+                        self.processes[number] = self._spawn(number)
+                await asyncio.sleep(5)
+        finally:
+            self.stop_workers()
+
 async def main():
-    # Initialize the Partisia client
-    client = PbcClient()
-    
+    parser = argparse.ArgumentParser(description="Index prediction markets into a local store")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes when polling (1 indexes in-process)")
+    parser.add_argument("--partition", choices=["auto", "shard", "hash"], default=None,
+                        help="how to split markets across workers; auto groups by shard unless workers outnumber shards")
+    parser.add_argument("--db", default="indexer.db", help="index store file")
+    parser.add_argument("--ingest", choices=["poll", "blocks"], default="poll",
+                        help="poll every market, or scan shard blocks in this process and refresh only markets with transactions")
+    options = parser.parse_args()
+    if options.ingest == "blocks" and (options.workers is not None or options.partition is not None):
+        parser.error("--workers and --partition only apply to --ingest poll; block ingestion runs in one process")
+
+    # Read the markets created by initprediction.py
+    client = ChainReader(load_market_entries())
+    store = IndexStore(options.db, market_type=Market, position_type=Position)
+
     # Create and start the indexer
-    indexer = MarketIndexer(client)
+    if options.ingest == "blocks":
+        # Blocks drive the refreshes, polling only remains as a slow safety net
+        indexer = MarketIndexer(client, store, AdaptivePoller(min_interval=2, max_interval=600, max_age=3600))
+        scanner = BlockScanner(store, build_routes(client.entries))
+        await ingest(indexer, scanner)
+        return
+    if (options.workers or 1) > 1:
+        indexer = ShardedIndexer(client, store, options.workers, options.partition or "auto")
+    else:
+        indexer = MarketIndexer(client, store)
     await indexer.start_indexing()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,624 @@
+"""
+Persistent store for the market indexer.
+Keeps markets, orders, positions and balances in SQLite (WAL mode), so the
+index survives restarts and queries run concurrently with the writer.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, fields
+from trades import CANDLE_RESOLUTIONS, fill_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS markets (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    end_date INTEGER,
+    total_liquidity TEXT,
+    yes_price REAL,
+    no_price REAL,
+    status TEXT,
+    resolution TEXT,
+    currency TEXT,
+    oracle TEXT,
+    true_token TEXT,
+    false_token TEXT,
+    true_auction TEXT,
+    false_auction TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS idx_markets_status ON markets (status);
+
+CREATE TABLE IF NOT EXISTS orders (
+    auction TEXT NOT NULL,
+    order_id INTEGER NOT NULL,
+    market TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    cancelation_id INTEGER NOT NULL,
+    is_bid INTEGER NOT NULL,
+    price_per_token TEXT NOT NULL,
+    token_amount TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL,
+    PRIMARY KEY (auction, order_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_orders_market_status ON orders (market, status);
+CREATE INDEX IF NOT EXISTS idx_orders_owner_cancelation ON orders (owner, cancelation_id);
+
+CREATE TABLE IF NOT EXISTS positions (
+    market TEXT NOT NULL,
+    trader TEXT NOT NULL,
+    yes_amount TEXT NOT NULL,
+    no_amount TEXT NOT NULL,
+    updated REAL,
+    PRIMARY KEY (market, trader)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS balances (
+    contract TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    a_tokens TEXT NOT NULL,
+    b_tokens TEXT NOT NULL,
+    liquidity_tokens TEXT NOT NULL,
+    updated REAL,
+    PRIMARY KEY (contract, owner)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS market_aggregates (
+    market TEXT PRIMARY KEY,
+    total_yes TEXT NOT NULL,
+    total_no TEXT NOT NULL,
+    traders INTEGER NOT NULL DEFAULT 0,
+    open_interest TEXT NOT NULL,
+    updated REAL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fill_key TEXT NOT NULL UNIQUE,
+    market TEXT NOT NULL,
+    auction TEXT NOT NULL,
+    maker_order_id INTEGER NOT NULL,
+    maker TEXT NOT NULL,
+    taker TEXT,
+    taker_side TEXT NOT NULL,
+    price_per_token TEXT NOT NULL,
+    token_amount TEXT NOT NULL,
+    currency_amount TEXT,
+    timestamp REAL NOT NULL,
+    tx_id TEXT,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_market ON trades (market, id);
+CREATE INDEX IF NOT EXISTS idx_trades_auction ON trades (auction, id);
+
+CREATE TABLE IF NOT EXISTS candles (
+    auction TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    market TEXT NOT NULL,
+    open TEXT NOT NULL,
+    high TEXT NOT NULL,
+    low TEXT NOT NULL,
+    close TEXT NOT NULL,
+    open_time REAL NOT NULL,
+    close_time REAL NOT NULL,
+    volume TEXT NOT NULL,
+    currency_volume TEXT NOT NULL,
+    trades INTEGER NOT NULL,
+    PRIMARY KEY (auction, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+# Token amounts are u128 and prices u64, beyond SQLite's signed 64-bit integers.
+# They are stored as zero-padded decimal text, which is exact and sorts like the
+# numbers, and all arithmetic on them is done in Python.
+AMOUNT_WIDTH = 40
+AMOUNT_COLUMNS = {
+    "markets": ["total_liquidity"],
+    "orders": ["price_per_token", "token_amount"],
+    "positions": ["yes_amount", "no_amount"],
+    "balances": ["a_tokens", "b_tokens", "liquidity_tokens"],
+    "market_aggregates": ["total_yes", "total_no", "open_interest"],
+    "trades": ["price_per_token", "token_amount", "currency_amount"],
+    "candles": ["open", "high", "low", "close", "volume", "currency_volume"],
+}
+DECODED_COLUMNS = {column for columns in AMOUNT_COLUMNS.values() for column in columns}
+
+def encode_amount(value):
+    """Encode a non-negative integer amount for storage, keeping None."""
+    if value is None:
+        return None
+    if value < 0:
+        raise ValueError(f"Amounts are unsigned, got {value}")
+    return f"{value:0{AMOUNT_WIDTH}d}"
+
+def decode_amount(value):
+    """Decode a stored amount, keeping None."""
+    return None if value is None else int(value)
+
+def decode_row(row):
+    """Return a row as a dictionary with its amount columns decoded."""
+    return {key: decode_amount(row[key]) if key in DECODED_COLUMNS else row[key] for key in row.keys()}
+
+class IndexStore:
+    """
+    SQLite-backed store shared by the indexer (writer) and query threads (readers).
+
+    Writes are serialized through a single connection; every reading thread gets
+    its own connection, which WAL mode lets run alongside the writer.
+    Amounts and prices are stored as fixed-width decimal text, see AMOUNT_COLUMNS,
+    and returned as Python integers.
+
+    Attributes:
+        path: Database file
+        market_type: Dataclass used for market rows
+        position_type: Dataclass used for position rows
+    """
+
+    def __init__(self, path="indexer.db", market_type=None, position_type=None):
+        self.path = path
+        self.market_type = market_type
+        self.position_type = position_type
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.writer = self._connect()
+        self.writer.executescript(SCHEMA)
+        self.writer.commit()
+        # data_version only moves for commits of other connections, so it gets its own
+        self.version_lock = threading.Lock()
+        self.version_connection = self._connect()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=30000")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def reader(self):
+        """Return the read connection of the calling thread."""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            connection.execute("PRAGMA query_only=ON")
+            self.local.connection = connection
+        return connection
+
+    def data_version(self):
+        """
+        Return a number that changes whenever any connection, in this or another process, commits to the store.
+        Readers use it to invalidate what they derived from earlier contents.
+        """
+        with self.version_lock:
+            return self.version_connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self.write_lock:
+            self.writer.close()
+        with self.version_lock:
+            self.version_connection.close()
+
+    # Writing
+
+    def save_market(self, market):
+        """Insert or update a market."""
+        row = asdict(market)
+        row["total_liquidity"] = encode_amount(row.get("total_liquidity"))
+        row["updated"] = time.time()
+        columns = list(row)
+        updates = ", ".join(f"{c}=excluded.{c}" for c in columns if c != "id")
+        with self.write_lock, self.writer:
+            self.writer.execute(
+                f"INSERT INTO markets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                [row[c] for c in columns],
+            )
+            # Open interest is the collateral backing the outstanding YES/NO pairs
+            self._update_aggregates(market.id, open_interest=market.total_liquidity or 0)
+
+    def _update_aggregates(self, market_id, yes_delta=0, no_delta=0, traders_delta=0, open_interest=None):
+        # Apply deltas to the running aggregates of a market inside the current write transaction
+        row = self.writer.execute(
+            "SELECT total_yes, total_no, traders, open_interest FROM market_aggregates WHERE market=?", (market_id,)
+        ).fetchone()
+        total_yes, total_no, traders, current_interest = (0, 0, 0, 0) if row is None else (
+            decode_amount(row[0]), decode_amount(row[1]), row[2], decode_amount(row[3])
+        )
+        self.writer.execute(
+            "INSERT OR REPLACE INTO market_aggregates (market, total_yes, total_no, traders, open_interest, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (market_id, encode_amount(total_yes + yes_delta), encode_amount(total_no + no_delta), traders + traders_delta,
+             encode_amount(current_interest if open_interest is None else open_interest), time.time()),
+        )
+
+    def replace_positions(self, market_id, positions):
+        """
+        Make the stored positions of a market equal to the given ones.
+        Only rows that changed are written.
+
+        Args:
+            market_id: Market the positions belong to
+            positions: Iterable of objects with trader, yes_amount and no_amount
+        """
+        now = time.time()
+        with self.write_lock, self.writer:
+            existing = {
+                row[0]: (decode_amount(row[1]), decode_amount(row[2]))
+                for row in self.writer.execute(
+                    "SELECT trader, yes_amount, no_amount FROM positions WHERE market=?", (market_id,)
+                )
+            }
+            new = {p.trader: (p.yes_amount, p.no_amount) for p in positions}
+            self.writer.executemany(
+                "INSERT INTO positions (market, trader, yes_amount, no_amount, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(market, trader) DO UPDATE SET yes_amount=excluded.yes_amount, "
+                "no_amount=excluded.no_amount, updated=excluded.updated",
+                [(market_id, trader, encode_amount(yes), encode_amount(no), now)
+                 for trader, (yes, no) in new.items() if existing.get(trader) != (yes, no)],
+            )
+            self.writer.executemany(
+                "DELETE FROM positions WHERE market=? AND trader=?",
+                [(market_id, trader) for trader in existing if trader not in new],
+            )
+            yes_delta = sum(yes for yes, _ in new.values()) - sum(yes for yes, _ in existing.values())
+            no_delta = sum(no for _, no in new.values()) - sum(no for _, no in existing.values())
+            self._update_aggregates(market_id, yes_delta, no_delta, len(new) - len(existing))
+
+    def replace_balances(self, contract, balances):
+        """
+        Make the stored balances of a contract equal to the given ones.
+
+        Args:
+            contract: Contract holding the TokenBalances
+            balances: Dictionary of owner to (a_tokens, b_tokens, liquidity_tokens)
+        """
+        now = time.time()
+        with self.write_lock, self.writer:
+            existing = {
+                row[0]: tuple(decode_amount(value) for value in row[1:])
+                for row in self.writer.execute(
+                    "SELECT owner, a_tokens, b_tokens, liquidity_tokens FROM balances WHERE contract=?", (contract,)
+                )
+            }
+            self.writer.executemany(
+                "INSERT INTO balances (contract, owner, a_tokens, b_tokens, liquidity_tokens, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(contract, owner) DO UPDATE SET a_tokens=excluded.a_tokens, b_tokens=excluded.b_tokens, "
+                "liquidity_tokens=excluded.liquidity_tokens, updated=excluded.updated",
+                [(contract, owner) + tuple(encode_amount(amount) for amount in amounts) + (now,)
+                 for owner, amounts in balances.items() if existing.get(owner) != tuple(amounts)],
+            )
+            self.writer.executemany(
+                "DELETE FROM balances WHERE contract=? AND owner=?",
+                [(contract, owner) for owner in existing if owner not in balances],
+            )
+
+    def replace_open_orders(self, market_id, auction, orders):
+        """
+        Record the orders currently resting in an auction's books.
+        Stored orders of the auction that are no longer resting are marked CLOSED.
+
+        Args:
+            market_id: Market the auction belongs to
+            auction: Auction contract address
+            orders: Iterable of decoded LimitOrder dictionaries
+        """
+        now = time.time()
+        with self.write_lock, self.writer:
+            existing = {
+                row[0]: decode_amount(row[1])
+                for row in self.writer.execute(
+                    "SELECT order_id, token_amount FROM orders WHERE market=? AND status='OPEN' AND auction=?",
+                    (market_id, auction),
+                )
+            }
+            resting = {order["id"]: order for order in orders}
+            self.writer.executemany(
+                "INSERT INTO orders (auction, order_id, market, owner, cancelation_id, is_bid, price_per_token, token_amount, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'OPEN', ?) "
+                "ON CONFLICT(auction, order_id) DO UPDATE SET token_amount=excluded.token_amount, status='OPEN', updated=excluded.updated",
+                [
+                    (auction, o["id"], market_id, o["owner"], o["cancelation_id"], int(o["is_bid"]),
+                     encode_amount(o["price_per_token"]), encode_amount(o["token_amount"]), now)
+                    for o in resting.values() if existing.get(o["id"]) != o["token_amount"]
+                ],
+            )
+            self.writer.executemany(
+                "UPDATE orders SET status='CLOSED', updated=? WHERE auction=? AND order_id=?",
+                [(now, auction, order_id) for order_id in existing if order_id not in resting],
+            )
+
+    def append_trades(self, market_id, fills, apply_to_orders=False):
+        """
+        Append fills to the trade log and fold them into the candles of every resolution.
+        Fills already in the log are ignored, so appending is idempotent.
+
+        Args:
+            market_id: Market the fills belong to
+            fills: Fill records as built by trades.py
+            apply_to_orders: Also reduce the stored open orders by the appended fills
+
+        Returns:
+            Number of fills appended
+        """
+        appended = 0
+        now = time.time()
+        with self.write_lock, self.writer:
+            for f in fills:
+                cursor = self.writer.execute(
+                    "INSERT OR IGNORE INTO trades (fill_key, market, auction, maker_order_id, maker, taker, taker_side, "
+                    "price_per_token, token_amount, currency_amount, timestamp, tx_id, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fill_key(f), market_id, f["auction"], f["maker_order_id"], f["maker"], f["taker"], f["taker_side"],
+                     encode_amount(f["price_per_token"]), encode_amount(f["token_amount"]), encode_amount(f["currency_amount"]),
+                     f["timestamp"], f["tx_id"], f["source"]),
+                )
+                if cursor.rowcount == 0:
+                    continue
+                appended += 1
+                self._add_to_candles(market_id, f)
+                if apply_to_orders:
+                    self._apply_fill_to_orders(f, now)
+        return appended
+
+    def _add_to_candles(self, market_id, f):
+        price = f["price_per_token"]
+        timestamp = f["timestamp"]
+        for resolution in CANDLE_RESOLUTIONS:
+            bucket = int(timestamp // resolution) * resolution
+            row = self.writer.execute(
+                "SELECT * FROM candles WHERE auction=? AND resolution=? AND bucket=?", (f["auction"], resolution, bucket)
+            ).fetchone()
+            candle = {"open": price, "high": price, "low": price, "close": price, "open_time": timestamp,
+                      "close_time": timestamp, "volume": 0, "currency_volume": 0, "trades": 0}
+            if row is not None:
+                candle = decode_row(row)
+                if timestamp < candle["open_time"]:
+                    candle["open"], candle["open_time"] = price, timestamp
+                if timestamp >= candle["close_time"]:
+                    candle["close"], candle["close_time"] = price, timestamp
+                candle["high"] = max(candle["high"], price)
+                candle["low"] = min(candle["low"], price)
+            self.writer.execute(
+                "INSERT OR REPLACE INTO candles (auction, resolution, bucket, market, open, high, low, close, open_time, "
+                "close_time, volume, currency_volume, trades) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f["auction"], resolution, bucket, market_id, encode_amount(candle["open"]), encode_amount(candle["high"]),
+                 encode_amount(candle["low"]), encode_amount(candle["close"]), candle["open_time"], candle["close_time"],
+                 encode_amount(candle["volume"] + f["token_amount"]),
+                 encode_amount(candle["currency_volume"] + (f["currency_amount"] or 0)), candle["trades"] + 1),
+            )
+
+    def _apply_fill_to_orders(self, f, now):
+        # Reduce the maker order by the fill, closing it once consumed
+        row = self.writer.execute(
+            "SELECT token_amount FROM orders WHERE auction=? AND order_id=? AND status='OPEN'",
+            (f["auction"], f["maker_order_id"]),
+        ).fetchone()
+        if row is None:
+            return
+        remaining = decode_amount(row[0]) - f["token_amount"]
+        self.writer.execute(
+            "UPDATE orders SET token_amount=?, updated=?, status=? WHERE auction=? AND order_id=?",
+            (encode_amount(max(remaining, 0)), now, "CLOSED" if remaining <= 0 else "OPEN", f["auction"], f["maker_order_id"]),
+        )
+
+    def close_open_order(self, auction, owner, cancelation_id):
+        """Mark the resting order of an owner with a cancelation id CLOSED, e.g. after its cancelation."""
+        with self.write_lock, self.writer:
+            self.writer.execute(
+                "UPDATE orders SET status='CLOSED', updated=? WHERE auction=? AND owner=? AND cancelation_id=? AND status='OPEN'",
+                (time.time(), auction, owner, cancelation_id),
+            )
+
+    def set_checkpoint(self, scope, key, value):
+        """
+        Persist the high-water mark of a shard or contract.
+
+        Args:
+            scope: Kind of checkpoint, e.g. "shard" or "market"
+            key: Shard id or contract address
+            value: JSON-serializable high-water mark
+        """
+        with self.write_lock, self.writer:
+            self.writer.execute(
+                "INSERT INTO checkpoints (scope, key, value, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(scope, key) DO UPDATE SET value=excluded.value, updated=excluded.updated",
+                (scope, key, json.dumps(value), time.time()),
+            )
+
+    # Reading
+
+    def get_checkpoint(self, scope, key):
+        """Get a persisted high-water mark, or None if there is none."""
+        row = self.reader().execute(
+            "SELECT value FROM checkpoints WHERE scope=? AND key=?", (scope, key)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_checkpoints(self, scope):
+        """Get all persisted high-water marks of a scope as key -> (value, updated)."""
+        rows = self.reader().execute("SELECT key, value, updated FROM checkpoints WHERE scope=?", (scope,))
+        return {row[0]: (json.loads(row[1]), row[2]) for row in rows}
+
+    def _market(self, row):
+        if row is None:
+            return None
+        if self.market_type is None:
+            return decode_row(row)
+        names = {f.name for f in fields(self.market_type)}
+        return self.market_type(**{k: v for k, v in decode_row(row).items() if k in names})
+
+    def _position(self, row):
+        if row is None:
+            return None
+        if self.position_type is None:
+            return decode_row(row)
+        return self.position_type(trader=row["trader"], yes_amount=decode_amount(row["yes_amount"]),
+                                  no_amount=decode_amount(row["no_amount"]))
+
+    def get_market(self, market_id):
+        return self._market(self.reader().execute("SELECT * FROM markets WHERE id=?", (market_id,)).fetchone())
+
+    def get_markets(self, status=None, after=None, limit=None):
+        """
+        Get markets ordered by id, optionally filtered by status.
+
+        Args:
+            status: Optional market status to filter on
+            after: Optional id to continue after (cursor)
+            limit: Optional maximum number of markets
+        """
+        query = "SELECT * FROM markets WHERE 1=1"
+        params = []
+        if status is not None:
+            query += " AND status=?"
+            params.append(status)
+        if after is not None:
+            query += " AND id>?"
+            params.append(after)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self._market(row) for row in self.reader().execute(query, params)]
+
+    def get_position(self, market_id, trader):
+        return self._position(self.reader().execute(
+            "SELECT * FROM positions WHERE market=? AND trader=?", (market_id, trader)
+        ).fetchone())
+
+    def get_positions(self, market_id, after=None, limit=None):
+        """Get positions of a market ordered by trader, optionally from a cursor."""
+        query = "SELECT * FROM positions WHERE market=?"
+        params = [market_id]
+        if after is not None:
+            query += " AND trader>?"
+            params.append(after)
+        query += " ORDER BY trader"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self._position(row) for row in self.reader().execute(query, params)]
+
+    def get_aggregates(self, market_id, now=None):
+        """
+        Get the running aggregates of a market, independent of its number of traders.
+        Volumes cover the hourly candles of the last 24 hours and 7 days.
+
+        Returns:
+            Dictionary with total_yes, total_no, traders, open_interest and volumes
+        """
+        connection = self.reader()
+        row = connection.execute(
+            "SELECT total_yes, total_no, traders, open_interest FROM market_aggregates WHERE market=?", (market_id,)
+        ).fetchone()
+        aggregates = {"total_yes": 0, "total_no": 0, "traders": 0, "open_interest": 0}
+        if row is not None:
+            aggregates = {"total_yes": decode_amount(row[0]), "total_no": decode_amount(row[1]), "traders": row[2],
+                          "open_interest": decode_amount(row[3])}
+
+        now = time.time() if now is None else now
+        auctions = connection.execute(
+            "SELECT true_auction, false_auction FROM markets WHERE id=?", (market_id,)
+        ).fetchone()
+        for name, window in (("24h", 86400), ("7d", 7 * 86400)):
+            volume, currency_volume = 0, 0
+            if auctions is not None:
+                start = int((now - window) // 3600 + 1) * 3600
+                for row in connection.execute(
+                    "SELECT volume, currency_volume FROM candles WHERE auction IN (?, ?) AND resolution=3600 AND bucket>=?",
+                    (auctions[0], auctions[1], start),
+                ):
+                    volume += decode_amount(row[0])
+                    currency_volume += decode_amount(row[1])
+            aggregates["volume_" + name] = volume
+            aggregates["currency_volume_" + name] = currency_volume
+        return aggregates
+
+    def get_orders(self, market_id, status="OPEN", after=None, limit=None):
+        """Get orders of a market with the given status, ordered by auction and order id."""
+        query = "SELECT * FROM orders WHERE market=? AND status=?"
+        params = [market_id, status]
+        if after is not None:
+            query += " AND (auction, order_id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY auction, order_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [decode_row(row) for row in self.reader().execute(query, params)]
+
+    def get_orders_by_owner(self, owner, cancelation_id=None):
+        """Get the orders of an owner, optionally only those with a given cancelation id."""
+        if cancelation_id is None:
+            rows = self.reader().execute("SELECT * FROM orders WHERE owner=?", (owner,))
+        else:
+            rows = self.reader().execute(
+                "SELECT * FROM orders WHERE owner=? AND cancelation_id=?", (owner, cancelation_id)
+            )
+        return [decode_row(row) for row in rows]
+
+    def get_open_orders(self, auction):
+        """Get the stored resting orders of an auction as decoded LimitOrder dictionaries."""
+        rows = self.reader().execute(
+            "SELECT order_id, owner, cancelation_id, is_bid, price_per_token, token_amount FROM orders "
+            "WHERE auction=? AND status='OPEN'",
+            (auction,),
+        )
+        return [
+            {"id": row[0], "owner": row[1], "cancelation_id": row[2], "is_bid": bool(row[3]),
+             "price_per_token": decode_amount(row[4]), "token_amount": decode_amount(row[5])}
+            for row in rows
+        ]
+
+    def get_trades(self, market_id=None, auction=None, after=None, limit=100):
+        """
+        Get trades in log order for a market or an auction.
+
+        Args:
+            market_id: Market to get trades for
+            auction: Auction to get trades for, instead of a whole market
+            after: Optional trade id to continue after (cursor)
+            limit: Maximum number of trades
+        """
+        column, value = ("auction", auction) if auction is not None else ("market", market_id)
+        query = f"SELECT * FROM trades WHERE {column}=?"
+        params = [value]
+        if after is not None:
+            query += " AND id>?"
+            params.append(after)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return [decode_row(row) for row in self.reader().execute(query, params)]
+
+    def get_candles(self, auction, resolution, start=None, end=None):
+        """Get the candles of an auction at a resolution, optionally within [start, end)."""
+        query = "SELECT * FROM candles WHERE auction=? AND resolution=?"
+        params = [auction, resolution]
+        if start is not None:
+            query += " AND bucket>=?"
+            params.append(start)
+        if end is not None:
+            query += " AND bucket<?"
+            params.append(end)
+        query += " ORDER BY bucket"
+        return [decode_row(row) for row in self.reader().execute(query, params)]
+
+    def get_balances(self, contract, owner=None):
+        if owner is None:
+            rows = self.reader().execute("SELECT * FROM balances WHERE contract=?", (contract,))
+        else:
+            rows = self.reader().execute("SELECT * FROM balances WHERE contract=? AND owner=?", (contract, owner))
+        return [decode_row(row) for row in rows]
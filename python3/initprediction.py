@@ -2,7 +2,7 @@ from tokenv2 import TokenV2
 from tokensplitter import TokenSplitter
 from doubleauction import DoubleAuction
 from windowsupdater import WindowsUpdater
-import json
+from marketregistry import REGISTRY_FILE, register_market
 
 print("PREDICTION MARKET INITIALIZATION")
 print("")
@@ -41,8 +41,11 @@ print()
 
 data = {
     "event": event_description,
+    "symbol": event_symbol,
     "oracle": oracle_address,
     "currency": original_address,
+    "price_numerator": 1,
+    "price_denominator": 1000,
     "splitter": my_splitter.address,
     "true_token": true_token_address,
     "true_auction": auction_true.address,
@@ -50,7 +53,6 @@ data = {
     "false_auction": auction_false.address
 }
 
-filename = "prediction-market.json"
 updater = WindowsUpdater()
 true_token = TokenV2(address = true_token_address)
 false_token = TokenV2(address = false_token_address)
@@ -58,7 +60,7 @@ false_token = TokenV2(address = false_token_address)
 updater.add_window(true_token.symbol, "render_bids_asks", [auction_true.address])
 updater.add_window(false_token.symbol, "render_bids_asks", [auction_false.address])
 
-with open(filename, 'w') as json_file:
-    json.dump(data, json_file, indent=4) 
+register_market(event_symbol, data)
+print("The market is registered under", event_symbol, "in", REGISTRY_FILE)
 
 print("Have a nice day and may the odds be ever in your favor")
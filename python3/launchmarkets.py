@@ -0,0 +1,194 @@
+"""
+Non-interactive launcher for many prediction markets at once.
+Reads a JSON or YAML list of event specs, deploys the markets and records each
+one in the market registry. Transactions of one key share a nonce sequence and
+are sent one after the other, so markets are only deployed in parallel across
+the keys of a wallet pool.
+
+Spec format (JSON shown, YAML takes the same structure):
+    [
+        {
+            "description": "It rains in Aarhus on 1 May",
+            "symbol": "RAIN",
+            "currency": "<currency token address>",
+            "oracle": "<oracle address>",
+            "price_ratio": "1/1000"
+        }
+    ]
+"""
+
+import argparse
+import json
+import threading
+from concurrent.futures import as_completed
+
+import config
+from tokenv2 import TokenV2
+from tokensplitter import TokenSplitter, splitter_journal_key
+from doubleauction import DoubleAuction
+from walletpool import WalletPool, configured_keyfiles
+from windowsupdater import WindowsUpdater
+from deployjournal import DeploymentJournal
+from marketregistry import REGISTRY_FILE, load_registry, register_market
+
+DEFAULT_PRICE_RATIO = (1, 1000)
+
+# WindowsUpdater rewrites windows.data without locking
+_windows_lock = threading.Lock()
+
+def load_specs(filename):
+    """
+    Load event specs from a JSON or YAML file.
+
+    Returns:
+        List of spec dictionaries
+    """
+    with open(filename, 'r') as spec_file:
+        if filename.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML specs requires PyYAML: pip install pyyaml")
+            specs = yaml.safe_load(spec_file)
+        else:
+            specs = json.load(spec_file)
+    if isinstance(specs, dict):
+        specs = [specs]
+    for spec in specs:
+        missing = [field for field in ("description", "symbol", "currency", "oracle") if not spec.get(field)]
+        if missing:
+            raise ValueError(f"Spec {spec} is missing {', '.join(missing)}")
+    symbols = [spec["symbol"] for spec in specs]
+    duplicates = sorted({symbol for symbol in symbols if symbols.count(symbol) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate event symbols in specs: {', '.join(duplicates)}")
+    return specs
+
+def price_ratio(spec):
+    """Return (price_numerator, price_denominator) of a spec, from "n/d", [n, d] or the defaults."""
+    ratio = spec.get("price_ratio")
+    if ratio is None:
+        return DEFAULT_PRICE_RATIO
+    if isinstance(ratio, str):
+        numerator, denominator = ratio.split("/")
+        return int(numerator), int(denominator)
+    numerator, denominator = ratio
+    return int(numerator), int(denominator)
+
+def launch_market(spec, registry_file=REGISTRY_FILE):
+    """
+    Deploy the token splitter, outcome tokens and both auctions of one event and register them.
+
+    Args:
+        spec: Event spec with description, symbol, currency, oracle and optional price_ratio
+        registry_file: Registry to record the market in
+
+    Returns:
+        The registered market entry
+    """
+    numerator, denominator = price_ratio(spec)
+    print(f"Setting up tokensplitter contract for {spec['symbol']}....")
+    splitter = TokenSplitter(event_description=spec["description"], event_symbol=spec["symbol"],
+                             original_address=spec["currency"], oracle_address=spec["oracle"])
+
+    # One after the other: both deployments are signed with this thread's key
+    auction_true = DoubleAuction(true_token_address=splitter.true_address, false_token_address=spec["currency"],
+                                 price_numerator=numerator, price_denominator=denominator)
+    auction_false = DoubleAuction(true_token_address=splitter.false_address, false_token_address=spec["currency"],
+                                  price_numerator=numerator, price_denominator=denominator)
+
+    entry = {
+        "event": spec["description"],
+        "symbol": spec["symbol"],
+        "oracle": spec["oracle"],
+        "currency": spec["currency"],
+        "price_numerator": numerator,
+        "price_denominator": denominator,
+        "splitter": splitter.address,
+        "true_token": splitter.true_address,
+        "true_auction": auction_true.address,
+        "false_token": splitter.false_address,
+        "false_auction": auction_false.address,
+    }
+    register_market(spec["symbol"], entry, registry_file)
+
+    true_token = TokenV2(address=splitter.true_address)
+    false_token = TokenV2(address=splitter.false_address)
+    with _windows_lock:
+        updater = WindowsUpdater()
+        updater.add_window(true_token.symbol, "render_bids_asks", [auction_true.address])
+        updater.add_window(false_token.symbol, "render_bids_asks", [auction_false.address])
+    return entry
+
+def journaled_keyfile(spec, keyfiles):
+    """The key of a pool that has journaled steps of a spec's deployment, or None if no key started it."""
+    for keyfile in keyfiles:
+        key = splitter_journal_key(keyfile, spec["symbol"], spec["currency"], spec["oracle"], spec["description"])
+        if DeploymentJournal(key).steps():
+            return keyfile
+    return None
+
+def submit_launch(pool, spec, registry_file):
+    """Queue the launch of a market, on the key that started its deployment in an earlier run if there is one."""
+    keyfile = journaled_keyfile(spec, pool.keyfiles)
+    if keyfile is not None:
+        print(f"Resuming {spec['symbol']} with {keyfile}, which started its deployment")
+        return pool.submit_on(keyfile, launch_market, spec, registry_file)
+    return pool.submit(launch_market, spec, registry_file, ordering_key=spec["symbol"])
+
+def launch_markets(specs, registry_file=REGISTRY_FILE, pool=None):
+    """
+    Launch the markets of many specs.
+    Events already in the registry are skipped, so a failed batch can simply be rerun.
+    With a wallet pool each market is deployed by one key of the pool, and the markets
+    of different keys in parallel; without one they are deployed one by one.
+
+    Returns:
+        Tuple of (launched entries by symbol, exceptions by symbol)
+    """
+    registry = load_registry(registry_file)
+    pending = [spec for spec in specs if spec["symbol"] not in registry]
+    for spec in specs:
+        if spec["symbol"] in registry:
+            print(f"Skipping {spec['symbol']}, already launched with splitter {registry[spec['symbol']]['splitter']}")
+
+    launched, failed = {}, {}
+    owned = pool is None
+    if owned:
+        pool = WalletPool([config.keyfile])
+    try:
+        futures = {submit_launch(pool, spec, registry_file): spec["symbol"] for spec in pending}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                launched[symbol] = future.result()
+                print(f"Launched {symbol}: splitter {launched[symbol]['splitter']}")
+            except Exception as e:
+                failed[symbol] = e
+                print(f"Failed to launch {symbol}: {e}")
+    finally:
+        if owned:
+            pool.shutdown()
+    return launched, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Launch prediction markets from a JSON or YAML spec file")
+    parser.add_argument("specs", help="file with a list of event specs")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="maximum number of markets deployed at once, one per key of the wallet pool")
+    parser.add_argument("--registry", default=REGISTRY_FILE, help="market registry to record launched markets in")
+    parser.add_argument("--wallet-pool", action="store_true",
+                        help="spread the markets over the keys in config.keyfiles; without it they are deployed one by one")
+    options = parser.parse_args()
+
+    specs = load_specs(options.specs)
+    pool = WalletPool(configured_keyfiles()[:max(options.concurrency, 1)]) if options.wallet_pool else None
+    launched, failed = launch_markets(specs, options.registry, pool)
+    if pool is not None:
+        pool.shutdown()
+    print(f"Launched {len(launched)} markets, {len(failed)} failed, {len(specs) - len(launched) - len(failed)} already registered")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
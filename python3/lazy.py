@@ -0,0 +1,59 @@
+"""
+Deferred imports and lazily built contract wrappers, so entry points show their
+first prompt without importing pexpect, requests and pytz or fetching contract
+states they may never use.
+"""
+
+import importlib
+import threading
+
+class LazyModule:
+    """Module imported on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+def lazy_import(name):
+    """Return a stand-in for a module that imports it when it is first used"""
+    return LazyModule(name)
+
+class LazyContract:
+    """
+    Stand-in for the wrapper of an existing contract.
+    The address is known up front; the wrapper, which checks the contract files and
+    fetches the state, is built on first access to anything else.
+
+    Attributes:
+        address: Contract address
+    """
+
+    def __init__(self, contract_class, address):
+        self.__dict__["_contract_class"] = contract_class
+        self.__dict__["_contract"] = None
+        self.__dict__["_lock"] = threading.Lock()
+        self.__dict__["address"] = address
+
+    def _load(self):
+        with self._lock:
+            if self._contract is None:
+                self.__dict__["_contract"] = self._contract_class(address=self.address)
+        return self._contract
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        state = "loaded" if self._contract is not None else "not loaded"
+        return f"<lazy {self._contract_class.__name__} {self.address} ({state})>"
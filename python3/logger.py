@@ -1,6 +1,8 @@
 import os
 from datetime import datetime
-import pytz
+from lazy import lazy_import
+
+pytz = lazy_import("pytz")
 
 def get_current_datetime_in_denmark():
     denmark_timezone = pytz.timezone("Europe/Copenhagen")
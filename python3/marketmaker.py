@@ -0,0 +1,362 @@
+"""
+Automated market making on the YES and NO auctions of prediction markets.
+Both auctions of a market are quoted together around one fair value, so that
+YES and NO quotes always respect the YES + NO = 1 parity enforced by split/join.
+Inventory is moved between the splitter and the auctions with split/join, and
+quotes are only replaced when fair value or the book moves past a threshold.
+"""
+
+import argparse
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import config
+from pbccontract import PBCContract, account_address
+from walletpool import WalletPool, configured_keyfiles
+from tokenv2 import TokenV2
+from tokensplitter import TokenSplitter
+from doubleauction import DoubleAuction
+from serializedstate import read_token_balance
+from matching import total_price
+from marketregistry import load_registry
+
+@dataclass
+class QuoteParams:
+    """
+    Quoting parameters, with prices as probabilities (currency per token, where YES + NO = 1).
+
+    Attributes:
+        spread: Distance between bid and ask of one auction
+        size: Token amount quoted on each side
+        threshold: Move of a target price, in probability, that triggers a requote
+        skew: Fraction of the spread the fair value is shifted per unit of inventory imbalance
+        max_inventory: Tokens of each outcome held before pairs are joined back into currency
+        tick: Lowest and highest quotable probability
+    """
+    spread: float = 0.04
+    size: int = 1000
+    threshold: float = 0.01
+    skew: float = 0.5
+    max_inventory: int = 10000
+    tick: float = 0.01
+
+def to_price(probability, numerator, denominator, side):
+    """Convert a probability to an auction price_per_token, rounding bids down and asks up."""
+    exact = probability * denominator / numerator
+    return math.floor(exact) if side == "bid" else math.ceil(exact)
+
+def to_probability(price, numerator, denominator):
+    return price * numerator / denominator
+
+def parity_quotes(fair_yes, spread):
+    """
+    Quote both auctions around one fair value.
+    YES bid + NO ask = YES ask + NO bid = 1, so the quotes never offer a split/join arbitrage.
+
+    Returns:
+        Dictionary of outcome -> {"bid": probability, "ask": probability}
+    """
+    fair_no = 1 - fair_yes
+    return {
+        "yes": {"bid": fair_yes - spread / 2, "ask": fair_yes + spread / 2},
+        "no": {"bid": fair_no - spread / 2, "ask": fair_no + spread / 2},
+    }
+
+class MarketMaker:
+    """
+    Quotes one market: a bid and an ask in each of its YES and NO auctions.
+
+    Attributes:
+        entry: Market registry entry
+        owner: Address of the key the quotes are sent from
+        params: QuoteParams
+        fair_value: Optional function returning the fair YES probability, overriding the book mid
+        cancel_id_base: Cancelation id of the bids; asks use the next id
+        quotes: Current quotes per outcome and side as (price, amount)
+    """
+
+    def __init__(self, entry, owner, params: QuoteParams, fair_value: Optional[Callable[[], float]] = None, cancel_id_base=9000):
+        self.entry = entry
+        self.owner = owner
+        self.params = params
+        self.fair_value = fair_value
+        self.cancel_ids = {"bid": cancel_id_base, "ask": cancel_id_base + 1}
+        self.splitter = TokenSplitter(address=entry["splitter"])
+        self.auctions = {
+            "yes": DoubleAuction(address=entry["true_auction"]),
+            "no": DoubleAuction(address=entry["false_auction"]),
+        }
+        self.tokens = {"yes": entry["true_token"], "no": entry["false_token"]}
+        self.quotes: Dict[str, Dict[str, tuple]] = {"yes": {}, "no": {}}
+
+    def read_books(self):
+        """Read the best bid and ask of both auctions, excluding our own orders, as probabilities."""
+        books = {}
+        for outcome, auction in self.auctions.items():
+            orders = [order for order in auction.open_orders() if order["owner"] != self.owner]
+            bids = [order["price_per_token"] for order in orders if order["is_bid"]]
+            asks = [order["price_per_token"] for order in orders if not order["is_bid"]]
+            books[outcome] = {
+                "bid": to_probability(max(bids), auction.numerator, auction.denominator) if bids else None,
+                "ask": to_probability(min(asks), auction.numerator, auction.denominator) if asks else None,
+            }
+        return books
+
+    def read_inventory(self):
+        """
+        Read our balances in the splitter and both auctions.
+
+        Returns:
+            Dictionary with splitter (true, false, original) and per outcome the (currency, asset) in its auction
+        """
+        inventory = {"splitter": read_token_balance(self.entry["splitter"], self.owner)}
+        for outcome, auction in self.auctions.items():
+            currency, asset, _ = read_token_balance(auction.address, self.owner)
+            inventory[outcome] = (currency, asset)
+        return inventory
+
+    def estimate_fair_value(self, books):
+        """
+        Fair YES probability from both books: the YES mid and one minus the NO mid are both estimates.
+        Falls back to the previous quotes' center, then to 0.5.
+        """
+        if self.fair_value is not None:
+            return self.fair_value()
+        estimates = []
+        for outcome, book in books.items():
+            if book["bid"] is not None and book["ask"] is not None:
+                mid = (book["bid"] + book["ask"]) / 2
+                estimates.append(mid if outcome == "yes" else 1 - mid)
+        if estimates:
+            return sum(estimates) / len(estimates)
+        quoted = self.quotes["yes"]
+        if "bid" in quoted and "ask" in quoted:
+            auction = self.auctions["yes"]
+            return (to_probability(quoted["bid"][0], auction.numerator, auction.denominator)
+                    + to_probability(quoted["ask"][0], auction.numerator, auction.denominator)) / 2
+        return 0.5
+
+    def target_quotes(self, fair_yes, inventory):
+        """
+        Target prices and amounts of all four quotes.
+        Fair value leans against inventory: long YES lowers the YES quotes and raises the NO quotes.
+
+        Returns:
+            Dictionary of outcome -> side -> (price_per_token, amount)
+        """
+        params = self.params
+        yes_held = inventory["splitter"][0] + inventory["yes"][1]
+        no_held = inventory["splitter"][1] + inventory["no"][1]
+        imbalance = (yes_held - no_held) / max(params.max_inventory, 1)
+        fair_yes -= params.skew * params.spread * max(-1.0, min(1.0, imbalance))
+        fair_yes = max(params.tick + params.spread / 2, min(1 - params.tick - params.spread / 2, fair_yes))
+
+        targets = {}
+        for outcome, sides in parity_quotes(fair_yes, params.spread).items():
+            auction = self.auctions[outcome]
+            targets[outcome] = {
+                side: (to_price(probability, auction.numerator, auction.denominator, side), params.size)
+                for side, probability in sides.items()
+            }
+        return targets
+
+    def needs_requote(self, outcome, side, target, resting):
+        """
+        Whether a quote is missing, no longer resting (filled or cancelled), or its price moved past the threshold.
+
+        Args:
+            outcome: "yes" or "no"
+            side: "bid" or "ask"
+            target: Target (price_per_token, amount) of the quote
+            resting: Cancelation ids of our open orders in the outcome's auction
+        """
+        current = self.quotes[outcome].get(side)
+        if current is None or self.cancel_ids[side] not in resting:
+            return True
+        auction = self.auctions[outcome]
+        moved = abs(to_probability(target[0] - current[0], auction.numerator, auction.denominator))
+        return moved >= self.params.threshold or target[1] != current[1]
+
+    def with_refunds(self, inventory, own_orders, stale):
+        """
+        Inventory after the cancels of stale quotes: a cancelled bid refunds its locked currency
+        and a cancelled ask its locked tokens to our free auction balance.
+
+        Args:
+            inventory: Inventory as read by read_inventory
+            own_orders: Outcome -> our open orders in its auction
+            stale: (outcome, side) pairs being requoted
+        """
+        inventory = dict(inventory)
+        for outcome, side in stale:
+            auction = self.auctions[outcome]
+            currency, asset = inventory[outcome]
+            for order in own_orders[outcome]:
+                if order["cancelation_id"] != self.cancel_ids[side]:
+                    continue
+                if order["is_bid"]:
+                    currency += total_price(order["token_amount"], order["price_per_token"], auction.numerator, auction.denominator)
+                else:
+                    asset += order["token_amount"]
+            inventory[outcome] = (currency, asset)
+        return inventory
+
+    def rebalance(self, inventory, targets):
+        """
+        Make sure each auction holds the asset for its ask and the currency for its bid,
+        splitting currency into pairs when tokens are short and joining pairs when both outcomes pile up.
+        The auction balances must include the refunds of the quotes cancelled in the same round, see with_refunds.
+        """
+        params = self.params
+        splitter_yes, splitter_no, splitter_currency = inventory["splitter"]
+
+        # Both outcomes beyond the limit are a riskless pair, turn it back into currency
+        excess = min(splitter_yes, splitter_no) - params.max_inventory
+        if excess > 0:
+            self.splitter.join(excess)
+            splitter_yes -= excess
+            splitter_no -= excess
+            splitter_currency += excess
+
+        # Split currency into pairs for the asks that lack tokens
+        short = {outcome: max(0, targets[outcome]["ask"][1] - inventory[outcome][1]) for outcome in self.auctions}
+        needed = max(short["yes"] - splitter_yes, short["no"] - splitter_no, 0)
+        if needed > 0:
+            if needed > splitter_currency:
+                print(f"Not enough currency in splitter {self.entry['splitter']} to split {needed}, asks stay short")
+                needed = splitter_currency
+            if needed > 0:
+                self.splitter.split(needed)
+                splitter_yes += needed
+                splitter_no += needed
+                splitter_currency -= needed
+
+        for outcome, auction in self.auctions.items():
+            move = min(short[outcome], splitter_yes if outcome == "yes" else splitter_no)
+            if move > 0:
+                self.move_to_auction(self.tokens[outcome], auction, move)
+
+            bid_price, bid_amount = targets[outcome]["bid"]
+            currency_short = total_price(bid_amount, bid_price, auction.numerator, auction.denominator) - inventory[outcome][0]
+            if currency_short > 0:
+                move = min(currency_short, splitter_currency)
+                if move > 0:
+                    self.move_to_auction(self.entry["currency"], auction, move)
+                    splitter_currency -= move
+
+    def move_to_auction(self, token_address, auction, amount):
+        """Withdraw tokens from the splitter and deposit them into an auction."""
+        print(f"Moving {amount} of {token_address} from splitter to auction {auction.address}")
+        self.splitter.withdraw(token_address, amount, wait=True)
+        TokenV2(address=token_address).approve_relative(auction.address, amount)
+        auction.deposit(token_address, amount)
+
+    def step(self):
+        """
+        Read books and inventory, then requote the quotes that moved past the threshold.
+        All cancels and new quotes of both auctions go out as one sequence of the key.
+
+        Returns:
+            Number of transactions sent
+        """
+        books = self.read_books()
+        inventory = self.read_inventory()
+        fair_yes = self.estimate_fair_value(books)
+        targets = self.target_quotes(fair_yes, inventory)
+        own_orders = {outcome: auction.open_orders(self.owner) for outcome, auction in self.auctions.items()}
+        resting = {outcome: {order["cancelation_id"] for order in orders} for outcome, orders in own_orders.items()}
+
+        stale = [
+            (outcome, side) for outcome in self.auctions for side in ("bid", "ask")
+            if self.needs_requote(outcome, side, targets[outcome][side], resting[outcome])
+        ]
+        if not stale:
+            return 0
+        self.rebalance(self.with_refunds(inventory, own_orders, stale), targets)
+
+        commands = []
+        for outcome, side in stale:
+            auction = self.auctions[outcome]
+            cancel_id = self.cancel_ids[side]
+            if cancel_id in resting[outcome]:
+                commands.append(auction.command("cancel_limit_order", [cancel_id]))
+        for outcome, side in stale:
+            price, amount = targets[outcome][side]
+            order = {"is_bid": side == "bid", "price": price, "amount": amount, "cancel_id": self.cancel_ids[side]}
+            commands.append(self.auctions[outcome].order_command(order))
+
+        print(f"Requoting {self.entry['splitter']} around YES={fair_yes:.4f}: {stale}")
+        results = PBCContract.execute_sequence(commands)
+        for (outcome, side), trans_id in zip(stale, results[len(results) - len(stale):]):
+            if trans_id is not None:
+                self.quotes[outcome][side] = targets[outcome][side]
+            else:
+                self.quotes[outcome].pop(side, None)
+        return len(commands)
+
+class MarketMakerEngine:
+    """
+    Runs a MarketMaker per market every interval.
+    Each market is bound to one key of a wallet pool and stepped on that key's worker,
+    so markets on different keys are stepped in parallel and markets sharing a key one
+    after the other, never sending from one key at once.
+
+    Attributes:
+        makers: MarketMaker instances, each with the owner address of its market's key
+        interval: Seconds between rounds
+        pool: WalletPool the markets are stepped on
+    """
+
+    def __init__(self, makers, interval=10, pool=None):
+        self.makers = makers
+        self.interval = interval
+        self.pool = pool or WalletPool([config.keyfile])
+
+    def run_once(self):
+        futures = {self.pool.submit(maker.step, ordering_key=maker.entry["splitter"]): maker for maker in self.makers}
+        sent = 0
+        for future, maker in futures.items():
+            try:
+                sent += future.result()
+            except Exception as e:
+                print(f"Error making market {maker.entry['splitter']}: {e}")
+        return sent
+
+    def run(self):
+        while True:
+            started = time.monotonic()
+            sent = self.run_once()
+            print(f"Market making round sent {sent} transactions")
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Quote the YES and NO auctions of registered markets")
+    parser.add_argument("--owner", help="address of the key, if there is a single key and config.address is not set")
+    parser.add_argument("--markets", nargs="*", help="event symbols to quote (default: all registered)")
+    parser.add_argument("--spread", type=float, default=0.04, help="bid/ask spread as a probability")
+    parser.add_argument("--size", type=int, default=1000, help="token amount per quote")
+    parser.add_argument("--threshold", type=float, default=0.01, help="price move that triggers a requote")
+    parser.add_argument("--max-inventory", type=int, default=10000, help="tokens per outcome before joining pairs")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between rounds")
+    parser.add_argument("--concurrency", type=int, default=4, help="markets stepped at once, one per key in config.keyfiles")
+    options = parser.parse_args()
+
+    registry = load_registry()
+    keys = options.markets or sorted(registry)
+    params = QuoteParams(spread=options.spread, size=options.size, threshold=options.threshold, max_inventory=options.max_inventory)
+    pool = WalletPool(configured_keyfiles()[:max(options.concurrency, 1)])
+    makers = []
+    for key in keys:
+        keyfile = pool.keyfile_for(registry[key]["splitter"])
+        owner = account_address(keyfile)
+        if owner is None and len(pool.keyfiles) == 1:
+            owner = options.owner
+        if owner is None:
+            raise SystemExit(f"No address configured for {keyfile}: set config.addresses, or --owner for a single key")
+        makers.append(MarketMaker(registry[key], owner, params))
+    MarketMakerEngine(makers, options.interval, pool).run()
+
+if __name__ == "__main__":
+    main()
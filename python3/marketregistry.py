@@ -0,0 +1,71 @@
+"""
+Registry of launched prediction markets, keyed by event.
+Replaces the single-market prediction-market.json written by earlier versions
+of initprediction.py, which is migrated on first use.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+REGISTRY_FILE = "prediction-markets.json"
+LEGACY_FILE = "prediction-market.json"
+
+# Markets may be registered from several launcher threads at once
+_lock = threading.Lock()
+
+def load_registry(filename=REGISTRY_FILE):
+    """
+    Load the registry of launched markets.
+
+    Returns:
+        Dictionary of event key -> market entry (event, oracle, currency, splitter,
+        true_token, true_auction, false_token, false_auction)
+    """
+    if os.path.exists(filename):
+        with open(filename, 'r') as json_file:
+            return json.load(json_file)
+    if filename == REGISTRY_FILE and os.path.exists(LEGACY_FILE):
+        with open(LEGACY_FILE, 'r') as json_file:
+            legacy = json.load(json_file)
+        print(f"Using single market from {LEGACY_FILE}, it is copied to {REGISTRY_FILE} on the next launch")
+        return {legacy.get("symbol", legacy["event"]): legacy}
+    return {}
+
+def save_registry(registry, filename=REGISTRY_FILE):
+    """Write the registry atomically, so a crash never leaves a truncated file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, 'w') as json_file:
+        json.dump(registry, json_file, indent=4)
+    os.replace(temp_path, filename)
+
+def register_market(key, entry, filename=REGISTRY_FILE):
+    """Add or replace the market of an event in the registry."""
+    with _lock:
+        registry = load_registry(filename)
+        registry[key] = entry
+        save_registry(registry, filename)
+
+def load_entries(filename=REGISTRY_FILE):
+    """Return the registered market entries as a list."""
+    return list(load_registry(filename).values())
+
+def select_market(filename=REGISTRY_FILE):
+    """
+    Pick the market to trade: the only one registered, or one chosen interactively.
+
+    Returns:
+        Market entry dictionary
+    """
+    registry = load_registry(filename)
+    if not registry:
+        raise FileNotFoundError(f"No markets registered in {filename}, run initprediction.py or launchmarkets.py first")
+    if len(registry) == 1:
+        return next(iter(registry.values()))
+    keys = sorted(registry)
+    for number, key in enumerate(keys, start=1):
+        print(f" {number}: {registry[key]['event']}")
+    choice = input(" Which event do you want to bet on? (number) ")
+    return registry[keys[int(choice) - 1]]
@@ -0,0 +1,197 @@
+"""
+Off-chain replica of the DoubleAuction matching engine.
+Mirrors submit_bid, submit_ask and cancel_limit_order of double-auction/src/lib.rs:
+priority keys from Priority::cheap_early/expensive_early, partial fills at the
+maker's price, and total_price rounding per fill. Given a mirrored book it
+returns the exact fills, the resting remainder and the currency moved.
+"""
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+U64_MAX = (1 << 64) - 1
+
+def total_price(amount, price_per_token, price_numerator, price_denominator):
+    """Currency moved for an amount of tokens at a price, rounded as the contract's total_price."""
+    if amount >= U64_MAX:
+        raise ValueError("Token amounts larger than u64 are not allowed.")
+    return ((amount * price_per_token) // price_denominator) * price_numerator
+
+def cheap_early(price, order_id):
+    """Priority key of an ask: lowest price first, then lowest order id."""
+    return price.to_bytes(8, "big") + order_id.to_bytes(8, "big")
+
+def expensive_early(price, order_id):
+    """Priority key of a bid: highest price first, then lowest order id."""
+    return ((~price) & U64_MAX).to_bytes(8, "big") + order_id.to_bytes(8, "big")
+
+def order_key(order):
+    if order["is_bid"]:
+        return expensive_early(order["price_per_token"], order["id"])
+    return cheap_early(order["price_per_token"], order["id"])
+
+@dataclass
+class MatchResult:
+    """
+    Outcome of a submitted order.
+
+    Attributes:
+        fills: Fills in matching order, each with maker (the resting order before the fill), amount and currency
+        rest: The order left resting in the book, or None if fully filled
+        token_amount: Tokens traded
+        currency_amount: Currency paid to (bid) or by (ask) the makers
+        currency_locked: Currency the sender locks for a resting bid
+    """
+    fills: List[Dict] = field(default_factory=list)
+    rest: Optional[Dict] = None
+    token_amount: int = 0
+    currency_amount: int = 0
+    currency_locked: int = 0
+
+class OrderBook:
+    """
+    A mirrored DoubleAuction book.
+
+    Attributes:
+        price_numerator: Price scaling numerator of the auction
+        price_denominator: Price scaling denominator of the auction
+        next_order_id: Id the next resting order gets
+        bids: Priority key -> order, with keys kept sorted in bid_keys
+        asks: Priority key -> order, with keys kept sorted in ask_keys
+        by_cancelation: (owner, cancelation_id) -> order
+    """
+
+    def __init__(self, price_numerator, price_denominator, next_order_id=0, orders=()):
+        self.price_numerator = price_numerator
+        self.price_denominator = price_denominator
+        self.next_order_id = next_order_id
+        self.bids, self.asks = {}, {}
+        self.bid_keys, self.ask_keys = [], []
+        self.by_cancelation = {}
+        for order in orders:
+            self._insert(dict(order))
+        if orders:
+            self.next_order_id = max(self.next_order_id, max(order["id"] for order in orders) + 1)
+
+    def _side(self, is_bid):
+        return (self.bids, self.bid_keys) if is_bid else (self.asks, self.ask_keys)
+
+    def _insert(self, order):
+        side, keys = self._side(order["is_bid"])
+        key = order_key(order)
+        side[key] = order
+        insort(keys, key)
+        self.by_cancelation[(order["owner"], order["cancelation_id"])] = order
+
+    def _remove(self, order):
+        side, keys = self._side(order["is_bid"])
+        key = order_key(order)
+        del side[key]
+        del keys[bisect_left(keys, key)]
+
+    def orders(self):
+        """All resting orders, bids then asks, in priority order."""
+        return [self.bids[key] for key in self.bid_keys] + [self.asks[key] for key in self.ask_keys]
+
+    def best_bid(self):
+        return self.bids[self.bid_keys[0]] if self.bid_keys else None
+
+    def best_ask(self):
+        return self.asks[self.ask_keys[0]] if self.ask_keys else None
+
+    def match(self, is_bid, price_per_token, token_amount):
+        """
+        Walk the opposite side as the contract does, without changing the book.
+
+        Returns:
+            Tuple of (fills, rest_amount)
+        """
+        side, keys = self._side(not is_bid)
+        rest_amount = token_amount
+        fills = []
+        for key in keys:
+            if rest_amount == 0:
+                break
+            maker = side[key]
+            if is_bid and maker["price_per_token"] > price_per_token:
+                break
+            if not is_bid and maker["price_per_token"] < price_per_token:
+                break
+            amount = min(rest_amount, maker["token_amount"])
+            rest_amount -= amount
+            currency = total_price(amount, maker["price_per_token"], self.price_numerator, self.price_denominator)
+            fills.append({"maker": dict(maker), "amount": amount, "currency": currency})
+        return fills, rest_amount
+
+    def submit(self, sender, is_bid, price_per_token, token_amount, cancelation_id, apply=True):
+        """
+        Submit a limit order as submit_bid/submit_ask would execute it.
+
+        Args:
+            sender: Owner of the new order
+            is_bid: True for submit_bid, False for submit_ask
+            price_per_token: Limit price
+            token_amount: Amount of asset tokens
+            cancelation_id: Cancelation id of a resting remainder
+            apply: Update the book; False only estimates
+
+        Returns:
+            MatchResult
+        """
+        fills, rest_amount = self.match(is_bid, price_per_token, token_amount)
+        result = MatchResult(fills=fills)
+        result.token_amount = token_amount - rest_amount
+        result.currency_amount = sum(f["currency"] for f in fills)
+        if rest_amount > 0:
+            result.rest = {
+                "token_amount": rest_amount,
+                "price_per_token": price_per_token,
+                "id": self.next_order_id,
+                "owner": sender,
+                "is_bid": is_bid,
+                "cancelation_id": cancelation_id,
+            }
+            if is_bid:
+                result.currency_locked = total_price(rest_amount, price_per_token, self.price_numerator, self.price_denominator)
+        if not apply:
+            return result
+
+        side, _ = self._side(not is_bid)
+        for f in fills:
+            maker = side[order_key(f["maker"])]
+            if maker["token_amount"] > f["amount"]:
+                maker["token_amount"] -= f["amount"]
+            else:
+                self._remove(maker)
+                self.by_cancelation.pop((maker["owner"], maker["cancelation_id"]), None)
+        if result.rest is not None:
+            self._insert(dict(result.rest))
+            self.next_order_id += 1
+        return result
+
+    def submit_bid(self, sender, price_per_token, token_amount, cancelation_id, apply=True):
+        return self.submit(sender, True, price_per_token, token_amount, cancelation_id, apply)
+
+    def submit_ask(self, sender, price_per_token, token_amount, cancelation_id, apply=True):
+        return self.submit(sender, False, price_per_token, token_amount, cancelation_id, apply)
+
+    def cancel(self, sender, cancelation_id):
+        """
+        Cancel an order as cancel_limit_order does.
+
+        Returns:
+            Tuple of (cancelled order, refund) where the refund is currency for a bid and tokens for an ask
+        """
+        order = self.by_cancelation.get((sender, cancelation_id))
+        if order is None:
+            raise ValueError("The given cancelation request did not match any orders.")
+        side, _ = self._side(order["is_bid"])
+        resting = side[order_key(order)]
+        if resting["is_bid"]:
+            refund = total_price(resting["token_amount"], resting["price_per_token"], self.price_numerator, self.price_denominator)
+        else:
+            refund = resting["token_amount"]
+        self._remove(resting)
+        del self.by_cancelation[(sender, cancelation_id)]
+        return resting, refund
@@ -1,11 +1,23 @@
-import tkinter as tk
 import json
 import os
 import time
 import threading
 import base64
 import struct
-import requests
+from lazy import lazy_import
+import argparse
+import chainclient
+from retrypolicy import MONITOR_READ
+import sys
+from pollscheduler import AdaptivePoller, contract_state_signal
+
+requests = lazy_import("requests")
+
+try:
+    import tkinter as tk
+except ImportError:
+    # Headless mode does not need Tk
+    tk = None
 
 def extract_rust_struct(value_bytes):
     if len(value_bytes) < 24:
@@ -15,12 +27,14 @@ def extract_rust_struct(value_bytes):
     u128 = (high << 64) | low
     return u128, u64
 
-def fetch_and_parse_webpage(url):
+def fetch_and_parse_webpage(path):
     try:
-        # Fetch the webpage content
-        response = requests.get(url)
-        response.raise_for_status()
-        content = response.text
+        # Fetch the page from the node pool, retrying briefly so one failed read does not blank a window
+        def fetch():
+            response = chainclient.read(path)
+            response.raise_for_status()
+            return response.text
+        content = MONITOR_READ.run(fetch, description=f"read of {path}")
         
         # Parse the content as JSON
         json_data = json.loads(content)
@@ -41,15 +55,22 @@ def fetch_and_parse_webpage(url):
         print(f"Data processing error: {e}")
         return None
 
-def render_bids_asks(address):
-        bids_url = "https://node1.testnet.partisiablockchain.com/chain/contracts/"+address+"/avl/2/next?n=10"
-        result = fetch_and_parse_webpage(bids_url)
+def snapshot_bids_asks(address):
+        bids_path = "/chain/contracts/"+address+"/avl/2/next?n=10"
+        result = fetch_and_parse_webpage(bids_path)
         bids_list = [extract_rust_struct(value) for value in result]
-        asks_url = "https://node1.testnet.partisiablockchain.com/chain/contracts/"+address+"/avl/3/next?n=10"
-        result = fetch_and_parse_webpage(asks_url)
+        asks_path = "/chain/contracts/"+address+"/avl/3/next?n=10"
+        result = fetch_and_parse_webpage(asks_path)
         asks_list = [extract_rust_struct(value) for value in result]
-        new_ask_list = [(f"{float(amount)/100:.2f}", f"{float(price)/1000:.3f}") for (amount,price) in asks_list]
-        new_bid_list = [(f"{float(amount)/100:.2f}", f"{float(price)/1000:.3f}") for (amount,price) in bids_list]
+        return {
+            "address": address,
+            "bids": [{"amount": amount, "price": price} for (amount, price) in bids_list],
+            "asks": [{"amount": amount, "price": price} for (amount, price) in asks_list],
+        }
+
+def format_bids_asks(snapshot):
+        new_ask_list = [(f"{float(o['amount'])/100:.2f}", f"{float(o['price'])/1000:.3f}") for o in snapshot["asks"]]
+        new_bid_list = [(f"{float(o['amount'])/100:.2f}", f"{float(o['price'])/1000:.3f}") for o in snapshot["bids"]]
         new_ask_list.reverse()
         ask_string = "¤n  ASKS:"
         for (a,b) in new_ask_list:
@@ -58,7 +79,20 @@ def render_bids_asks(address):
         for (a,b) in new_bid_list:
             bid_string = bid_string + "¤n " + a + " @ " + b
         return "¤r"+ask_string+"¤n¤n¤g"+bid_string
-    
+
+def render_bids_asks(address):
+        return format_bids_asks(snapshot_bids_asks(address))
+
+# Rendering functions that can also produce a structured snapshot, as (snapshot, format) pairs
+SNAPSHOT_FUNCTIONS = {
+    "render_bids_asks": (snapshot_bids_asks, format_bids_asks),
+}
+
+# Cheap change signals checked before a full refetch, keyed by rendering function
+SIGNAL_FUNCTIONS = {
+    "render_bids_asks": contract_state_signal,
+}
+
 # Define color codes for ctext
 COLOR_MAP = {
     '¤b': 'black',
@@ -145,13 +179,16 @@ def update_windows_data_file():
     except IOError as e:
         print(f"Error writing {data_file}: {e}")
 
-def monitor_webpages():
+def monitor_webpages(poller=None):
     global windows
+    poller = poller or AdaptivePoller()
 
     while True:
         data = load_windows_data()
         active_keys = set(windows.keys())
         desired_keys = {generate_composite_key(item) for item in data}
+        poller.sync(desired_keys)
+        due_keys = set(poller.due_keys())
 
         # Close windows no longer in data
         for key in active_keys - desired_keys:
@@ -169,11 +206,86 @@ def monitor_webpages():
             if key not in windows:
                 windows[key] = MonitorWindow(root, title, render_function, args)
 
+            if key not in due_keys:
+                continue
+
             # Invoke the render function dynamically
-            rendered_ctext = eval(render_function)(*args)
-            windows[key].update_content(rendered_ctext)
+            refreshed, (rendered_ctext, _) = poll_item(poller, key, item)
+            if refreshed:
+                windows[key].update_content(rendered_ctext)
+
+        time.sleep(min(poller.seconds_until_due(), poller.min_interval))
 
-        time.sleep(2)
+def render_item(item):
+    """
+    Poll the chain once for a window and render it.
+
+    Returns:
+        Tuple of (ctext, snapshot), where snapshot is None for plain rendering functions
+    """
+    render_function = item["rendering_function"]
+    args = item["args_to_rendering_function"]
+    if render_function in SNAPSHOT_FUNCTIONS:
+        snapshot_function, format_function = SNAPSHOT_FUNCTIONS[render_function]
+        snapshot = snapshot_function(*args)
+        return format_function(snapshot), snapshot
+    return eval(render_function)(*args), None
+
+def poll_item(poller, key, item):
+    """
+    Check the cheap change signal of a window and only re-render it when the signal moved.
+
+    Returns:
+        Tuple of (refreshed, (ctext, snapshot))
+    """
+    signal_function = SIGNAL_FUNCTIONS.get(item["rendering_function"])
+    signal = None
+    if signal_function is not None:
+        args = item["args_to_rendering_function"]
+        signal = lambda: signal_function(*args)
+    return poller.poll(key, lambda: render_item(item), signal)
+
+def monitor_headless(hub, poller=None):
+    """
+    Poll every market in the data file and publish the results to the hub.
+    Chain load is independent of the number of connected subscribers, and
+    markets are only refetched when their change signal moves.
+    """
+    poller = poller or AdaptivePoller()
+    published = {}
+    while True:
+        data = load_windows_data()
+        desired_keys = {generate_composite_key(item) for item in data}
+        poller.sync(desired_keys)
+        due_keys = set(poller.due_keys())
+
+        for key in set(published) - desired_keys:
+            hub.remove(key)
+            del published[key]
+
+        for item in data:
+            key = generate_composite_key(item)
+            if key not in due_keys:
+                continue
+            try:
+                refreshed, (rendered_ctext, snapshot) = poll_item(poller, key, item)
+            except Exception as e:
+                print(f"Error rendering {key}: {e}")
+                continue
+            if not refreshed or published.get(key) == rendered_ctext:
+                continue
+            published[key] = rendered_ctext
+            hub.publish(key, {
+                "key": key,
+                "window_title": item["window_title"],
+                "rendering_function": item["rendering_function"],
+                "args_to_rendering_function": item["args_to_rendering_function"],
+                "ctext": rendered_ctext,
+                "snapshot": snapshot,
+                "updated": time.time(),
+            })
+
+        time.sleep(min(poller.seconds_until_due(), poller.min_interval))
 
 def sample_render_function(url):
     # Example rendering function that fetches a webpage and processes it
@@ -187,11 +299,35 @@ def sample_render_function(url):
         return f"¤rError fetching URL: {e}"
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor prediction market order books")
+    parser.add_argument("--headless", action="store_true", help="serve updates over SSE/WebSocket instead of opening windows")
+    parser.add_argument("--host", default="127.0.0.1", help="interface for the headless server")
+    parser.add_argument("--port", type=int, default=8765, help="port for the headless server")
+    parser.add_argument("--min-interval", type=float, default=1, help="seconds between polls of an active market")
+    parser.add_argument("--max-interval", type=float, default=30, help="seconds between polls of an idle market")
+    parser.add_argument("--max-age", type=float, default=60, help="seconds after which a market is refetched regardless of its signal")
+    options = parser.parse_args()
+    poller = AdaptivePoller(min_interval=options.min_interval, max_interval=options.max_interval, max_age=options.max_age)
+
+    if options.headless:
+        from monitorserver import MonitorHub, start_server
+        hub = MonitorHub()
+        start_server(hub, options.host, options.port)
+        try:
+            monitor_headless(hub, poller)
+        except KeyboardInterrupt:
+            print("Exiting...")
+        sys.exit(0)
+
+    if tk is None:
+        print("tkinter is not available, run with --headless to serve updates over SSE/WebSocket")
+        sys.exit(1)
+
     root = tk.Tk()
     root.withdraw()  # Hide the root window
 
     # Start monitoring in a separate thread
-    monitor_thread = threading.Thread(target=monitor_webpages, daemon=True)
+    monitor_thread = threading.Thread(target=monitor_webpages, args=(poller,), daemon=True)
     monitor_thread.start()
 
     # Main event loop
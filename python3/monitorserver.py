@@ -0,0 +1,268 @@
+"""
+Fan-out server for the headless market monitor.
+A single poller publishes rendered books and JSON snapshots, which are pushed
+to any number of subscribers over Server-Sent Events or WebSocket.
+"""
+
+import base64
+import hashlib
+import json
+import queue
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Largest client frame accepted; clients only send control frames
+MAX_CLIENT_FRAME = 65536
+
+class MonitorHub:
+    """
+    Keeps the latest snapshot per monitored window and fans updates out to subscribers.
+
+    Attributes:
+        latest: Most recent message per window key
+        subscribers: Set of per-client queues receiving new messages
+        queue_size: Maximum number of pending messages per client before old ones are dropped
+    """
+
+    def __init__(self, queue_size=100):
+        self.latest = {}
+        self.subscribers = set()
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+
+    def publish(self, key, message):
+        """
+        Store a message as the latest for its window and push it to all subscribers.
+
+        Args:
+            key: Composite window key
+            message: JSON-serializable dictionary
+        """
+        payload = json.dumps(message)
+        with self.lock:
+            self.latest[key] = payload
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            self._offer(q, payload)
+
+    def remove(self, key):
+        """Forget a window that is no longer monitored and notify subscribers."""
+        with self.lock:
+            if key not in self.latest:
+                return
+            del self.latest[key]
+            subscribers = list(self.subscribers)
+        payload = json.dumps({"key": key, "removed": True})
+        for q in subscribers:
+            self._offer(q, payload)
+
+    def subscribe(self):
+        """
+        Register a new subscriber, primed with the current snapshot of every window.
+
+        Returns:
+            Queue of JSON payloads for the subscriber
+        """
+        q = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            for payload in self.latest.values():
+                self._offer(q, payload)
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def snapshot(self):
+        """Return the latest messages of all windows as a JSON list."""
+        with self.lock:
+            return "[" + ",".join(self.latest.values()) + "]"
+
+    @staticmethod
+    def _offer(q, payload):
+        # A slow client loses its oldest updates rather than stalling the poller
+        while True:
+            try:
+                q.put_nowait(payload)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+class MonitorRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the hub over HTTP.
+
+    Endpoints:
+        /snapshot: Latest state of every window as JSON
+        /events: Server-Sent Events stream of updates
+        /ws: WebSocket stream of updates
+    """
+
+    hub = None
+    keepalive_seconds = 15
+    # WebSocket upgrades are only accepted by clients over HTTP/1.1
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/snapshot":
+            self._send_snapshot()
+        elif path == "/events":
+            self._stream_events()
+        elif path == "/ws":
+            self._stream_websocket()
+        else:
+            self.send_error(404, "Unknown endpoint, use /snapshot, /events or /ws")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_snapshot(self):
+        body = self.hub.snapshot().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        q = self.hub.subscribe()
+        try:
+            while True:
+                try:
+                    payload = q.get(timeout=self.keepalive_seconds)
+                    self.wfile.write(b"data: " + payload.encode("utf-8") + b"\n\n")
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            self.hub.unsubscribe(q)
+
+    def _stream_websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+            self.send_error(400, "Expected a WebSocket upgrade request")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+        q = self.hub.subscribe()
+        write_lock = threading.Lock()
+
+        def send(data, opcode):
+            with write_lock:
+                self.wfile.write(websocket_frame(data, opcode))
+                self.wfile.flush()
+
+        threading.Thread(target=self._read_websocket, args=(q, send), daemon=True).start()
+        try:
+            while True:
+                try:
+                    payload = q.get(timeout=self.keepalive_seconds)
+                except queue.Empty:
+                    send(b"", opcode=0x9)
+                    continue
+                if payload is None:
+                    break
+                send(payload.encode("utf-8"), opcode=0x1)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            self.hub.unsubscribe(q)
+
+    def _read_websocket(self, q, send):
+        # Answer the client's pings and close frame; a close or a dead socket ends the stream
+        try:
+            while True:
+                frame = read_websocket_frame(self.rfile)
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == 0x8:
+                    send(payload[:2], opcode=0x8)
+                    break
+                if opcode == 0x9:
+                    send(payload, opcode=0xA)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            self.hub.unsubscribe(q)
+            MonitorHub._offer(q, None)
+
+def websocket_frame(data, opcode):
+    """Build a single unmasked server-to-client WebSocket frame."""
+    header = bytes([0x80 | opcode])
+    length = len(data)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack(">H", length)
+    else:
+        header += bytes([127]) + struct.pack(">Q", length)
+    return header + data
+
+def read_websocket_frame(stream):
+    """
+    Read one masked client-to-server WebSocket frame.
+
+    Returns:
+        Tuple of (opcode, unmasked payload), or None if the connection closed or the frame is too large
+    """
+    header = stream.read(2)
+    if len(header) < 2:
+        return None
+    opcode, length = header[0] & 0x0F, header[1] & 0x7F
+    if length >= 126:
+        size = 2 if length == 126 else 8
+        extended = stream.read(size)
+        if len(extended) < size:
+            return None
+        length = struct.unpack(">H" if size == 2 else ">Q", extended)[0]
+    if length > MAX_CLIENT_FRAME:
+        return None
+    mask = stream.read(4) if header[1] & 0x80 else b""
+    payload = stream.read(length)
+    if len(payload) < length or len(mask) not in (0, 4):
+        return None
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+def start_server(hub, host="127.0.0.1", port=8765):
+    """
+    Serve a hub on a local port in a background thread.
+
+    Args:
+        hub: MonitorHub to serve
+        host: Interface to bind to
+        port: Port to listen on
+
+    Returns:
+        The running ThreadingHTTPServer
+    """
+    handler = type("BoundMonitorRequestHandler", (MonitorRequestHandler,), {"hub": hub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Monitor server listening on http://{host}:{port} (/snapshot, /events, /ws)")
+    return server
@@ -4,25 +4,147 @@ Handles contract deployment, transaction management, and logging.
 """
 
 import config
-import pexpect
+from lazy import lazy_import, LazyContract
 import sys
 from logger import Logger
 import subprocess
-import requests
+import chainclient
+from retrypolicy import VERIFICATION, SUBMISSION, FinalError, is_retryable
 import time
 import json
 import shlex
 import os.path
 import tempfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import threading
 
-def verify_transaction(trans_id, retries):
+# Imported on first use, so scripts reach their first prompt quickly
+requests = lazy_import("requests")
+pexpect = lazy_import("pexpect")
+
+# Key used by the calling thread, set by a WalletPool worker; config.keyfile otherwise
+_signing = threading.local()
+
+def current_keyfile():
+    """Return the keyfile transactions of the calling thread are signed with."""
+    return getattr(_signing, "keyfile", None) or config.keyfile
+
+@contextmanager
+def signing_key(keyfile):
+    """Sign the transactions sent by the calling thread inside the block with another keyfile."""
+    previous = getattr(_signing, "keyfile", None)
+    _signing.keyfile = keyfile
+    try:
+        yield keyfile
+    finally:
+        _signing.keyfile = previous
+
+def with_current_key(function):
+    """Wrap a function so it signs with the caller's key when run on another thread."""
+    keyfile = current_keyfile()
+    def run(*args, **kwargs):
+        with signing_key(keyfile):
+            return function(*args, **kwargs)
+    return run
+
+def account_address(keyfile=None):
+    """
+    Return the account address of a keyfile, from config.addresses (keyfile -> address)
+    or config.address for config.keyfile, or None if it is not configured.
+    """
+    keyfile = keyfile or current_keyfile()
+    address = getattr(config, "addresses", {}).get(keyfile)
+    if address is None and keyfile == config.keyfile:
+        address = getattr(config, "address", None)
+    return address
+
+def account_nonce(address):
+    """Return the nonce the next transaction signed by an account must use."""
+    response = chainclient.get(f"/chain/accounts/{address}", timeout=5)
+    response.raise_for_status()
+    return response.json()["nonce"]
+
+class NonceTracker:
+    """
+    Local view of an account's nonce, so consecutive transactions of one key can be
+    sent as soon as the previous one is included instead of once it is verified.
+    
+    Attributes:
+        address: Account address
+        next_nonce: Nonce the next transaction will use, None until synced
+    """
+    
+    def __init__(self, address):
+        self.address = address
+        self.next_nonce = None
+        self.lock = threading.Lock()
+
+    def sync(self):
+        """Resync the local nonce from the chain, e.g. after a failure or gap"""
+        with self.lock:
+            self.next_nonce = account_nonce(self.address)
+            print(f"Nonce of {self.address} synced to {self.next_nonce}")
+            return self.next_nonce
+
+    def expect_next(self):
+        """
+        Return the nonce the next transaction of the key is expected to use, and count it as used.
+        The CLI picks the nonce itself from the chain; this is only the nonce to wait on.
+        """
+        if self.next_nonce is None:
+            self.sync()
+        with self.lock:
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+
+    def wait_until_used(self, nonce, timeout=30, interval=0.25):
+        """
+        Wait until a nonce is used on chain, i.e. its transaction is included.
+        If the chain is further ahead than expected, another sender shares the key and
+        the local nonce is resynced.
+        
+        Returns:
+            bool: True if the nonce was used within the timeout
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                chain_nonce = account_nonce(self.address)
+            except (requests.RequestException, KeyError, ValueError) as e:
+                print(f"Error reading nonce of {self.address}: {e}")
+                chain_nonce = None
+            if chain_nonce is not None and chain_nonce > nonce:
+                with self.lock:
+                    if chain_nonce > self.next_nonce:
+                        print(f"Nonce gap on {self.address}: chain at {chain_nonce}, expected {self.next_nonce}")
+                        self.next_nonce = chain_nonce
+                return True
+            time.sleep(interval)
+        return False
+
+# Seconds carefully_execute waits for the nonce of a failed attempt to be used before sending again
+RESEND_CHECK_SECONDS = 10
+
+_nonce_trackers = {}
+_nonce_trackers_lock = threading.Lock()
+
+def nonce_tracker(address):
+    """Return the process-wide nonce tracker of an account"""
+    with _nonce_trackers_lock:
+        if address not in _nonce_trackers:
+            _nonce_trackers[address] = NonceTracker(address)
+        return _nonce_trackers[address]
+
+def verify_transaction(trans_id, retries=None):
     """
     Verifies a transaction has been successfully processed on the blockchain.
     
     Args:
         trans_id: Transaction hash to verify
-        retries: Number of retry attempts
+        retries: Number of attempts, or None to poll until the VERIFICATION deadline
          
     Returns:
         bool: True if transaction successful, False otherwise
@@ -31,18 +153,19 @@ def verify_transaction(trans_id, retries):
     if "transactions/" in trans_id:
         trans_id = trans_id.split("transactions/")[1]
         
-    url0 = f"https://node1.testnet.partisiablockchain.com/chain/shards/Shard0/transactions/{trans_id}"
-    url1 = f"https://node1.testnet.partisiablockchain.com/chain/shards/Shard1/transactions/{trans_id}"
-    url2 = f"https://node1.testnet.partisiablockchain.com/chain/shards/Shard2/transactions/{trans_id}"
-    delays = [2, 4, 8]  # Exponential backoff delays
-    urls = [url0, url1, url2]
+    path0 = f"/chain/shards/Shard0/transactions/{trans_id}"
+    path1 = f"/chain/shards/Shard1/transactions/{trans_id}"
+    path2 = f"/chain/shards/Shard2/transactions/{trans_id}"
+    paths = [path0, path1, path2]
     print(f"Verifying transaction {trans_id} on shards")
     
-    for attempt in range(len(delays) + 1):
-        for url in urls:
+    def check_shards():
+        # Unreachable nodes on every shard are an error worth backing off from; 404s mean not there yet
+        errors = []
+        for path in paths:
             try:
-                print(f"Checking shard URL: {url}")
-                response = requests.get(url, timeout=5)
+                print(f"Checking shard path: {path}")
+                response = chainclient.get(path, timeout=5)
                 response.raise_for_status()  # Raise an error for HTTP issues
                 data = response.json()  # Attempt to parse JSON
                 
@@ -55,22 +178,43 @@ def verify_transaction(trans_id, retries):
                     print(f"Transaction {trans_id} verified successfully")
                     return True
             except requests.RequestException as e:
-                print(f"Request exception checking {url}: {e}")
-                # Handle non-existing pages, non-JSON responses, or HTTP errors
-                pass
+                print(f"Request exception checking {path}: {e}")
+                if is_retryable(e):
+                    errors.append(e)
             except json.JSONDecodeError as e:
-                print(f"JSON decode error for {url}: {e}")
-                pass
-                
-        if attempt < len(delays):
-            wait_time = delays[attempt]
-            print(f"Transaction not verified yet, waiting {wait_time} seconds before retry...")
-            time.sleep(wait_time)
-        else:
-            print(f"Failed to verify transaction {trans_id} after {len(delays) + 1} attempts")
+                print(f"JSON decode error for {path}: {e}")
+        if len(errors) == len(paths):
+            raise errors[-1]
+        return False
     
+    try:
+        policy = VERIFICATION if retries is None else VERIFICATION.with_attempts(retries)
+        if policy.run(check_shards, retry_result=lambda verified: not verified, description=f"verification of {trans_id}"):
+            return True
+    except requests.RequestException as e:
+        print(f"Nodes unreachable while verifying {trans_id}: {e}")
+    print(f"Failed to verify transaction {trans_id}")
     return False
 
+def contract_shard(address):
+    """
+    Fetch the id of the shard a contract lives on, e.g. "Shard1".
+
+    Returns:
+        Shard id, or None if it could not be fetched
+    """
+    print(f"Fetching shard ID for contract: {address}")
+    try:
+        print(f"Requesting contract data from: /chain/contracts/{address}")
+        json_data = chainclient.contract_state(address, timeout=10)
+        if "shardId" in json_data:
+            print(f"Contract is on shard: {json_data['shardId']}")
+            return json_data["shardId"]
+        print(f"Warning: 'shardId' not found in response. Keys: {list(json_data.keys())}")
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error fetching contract data: {e}")
+    return None
+
 class PBCContract:
     """
     Base class for Partisia Blockchain smart contracts.
@@ -84,12 +228,17 @@ class PBCContract:
     
     log_file = Logger("pbc_cli.log")
 
+    # Seconds a journaled setup step waits for the chain before the next step
+    deploy_settle_seconds = 2
+    step_settle_seconds = 2
+
     @staticmethod
     def execute(command):
         """Execute a shell command and extract transaction ID"""
         try:
             print(f"Executing: {command}")
             PBCContract.log_file.print(command)
+            chainclient.throttle_submission()
             result = subprocess.check_output(command, shell=True, text=True)
             PBCContract.log_file.print(result)
             
@@ -119,38 +268,57 @@ class PBCContract:
 
     @staticmethod
     def carefully_execute(command):
-        """Execute a command with retries and transaction verification"""
-        max_attempts = 3
-        for attempt in range(1, max_attempts + 1):
-            try:
-                print(f"Attempt {attempt}/{max_attempts} to execute command")
-                trans_id = PBCContract.execute(command)
-                print(f"Verifying transaction {trans_id}")
-                response = verify_transaction(trans_id, retries=4)  
-                if response:
-                    success_msg = f"Transaction {trans_id} verified as successful"
-                    print(success_msg)
-                    PBCContract.log_file.print(success_msg)
-                    return trans_id
-                else:
-                    error_msg = f"Transaction {trans_id} verification failed"
-                    print(error_msg)
-                    PBCContract.log_file.print(error_msg)
-            except Exception as e:
-                error_msg = f"Error in attempt {attempt}: {e}"
-                print(error_msg)
+        """
+        Execute a command with retries and transaction verification.
+        When the account address of the key is configured, the nonce of the first send is
+        read from the chain, as the CLI does, and the command is only sent again while that
+        nonce is unused; once it is used the earlier transaction was included, so it is
+        verified instead of being executed twice.
+        """
+        address = account_address()
+        sent = {}
+
+        def verify(trans_id, final):
+            print(f"Verifying transaction {trans_id}")
+            if not verify_transaction(trans_id):
+                error_msg = f"Transaction {trans_id} verification failed"
                 PBCContract.log_file.print(error_msg)
-                
-            if attempt < max_attempts:
-                retry_msg = f"Retrying command (attempt {attempt+1}/{max_attempts})..."
-                print(retry_msg)
-                PBCContract.log_file.print(retry_msg)
-                time.sleep(2 ** attempt)  # Exponential backoff
-                
-        error_msg = f"Maximum attempts reached ({max_attempts}), all attempted transactions failed"
-        print(error_msg)
-        PBCContract.log_file.print(error_msg)
-        raise Exception(error_msg)
+                raise (FinalError if final else Exception)(error_msg)
+            success_msg = f"Transaction {trans_id} verified as successful"
+            print(success_msg)
+            PBCContract.log_file.print(success_msg)
+            return trans_id
+
+        def attempt():
+            if "nonce" in sent and nonce_tracker(address).wait_until_used(sent["nonce"], timeout=RESEND_CHECK_SECONDS):
+                if sent.get("trans_id") is None:
+                    error_msg = f"Nonce {sent['nonce']} of {address} was used by a transaction with unknown id, not sending again"
+                    PBCContract.log_file.print(error_msg)
+                    raise FinalError(error_msg)
+                print(f"Transaction {sent['trans_id']} was included, verifying it instead of sending again")
+                return verify(sent["trans_id"], final=True)
+            if address is not None and "nonce" not in sent:
+                # The local tracker may be ahead after failed sends; the chain has the nonce the CLI will use.
+                # A resend while it is unused picks the same nonce, so only one of the two can be included
+                tracker = nonce_tracker(address)
+                tracker.sync()
+                sent["nonce"] = tracker.expect_next()
+            sent["trans_id"] = None
+            sent["trans_id"] = PBCContract.execute(command)
+            return verify(sent["trans_id"], final=False)
+
+        try:
+            return SUBMISSION.run(attempt, description="command")
+        except Exception as e:
+            error_msg = f"All attempted transactions failed, last error: {e}"
+            print(error_msg)
+            PBCContract.log_file.print(error_msg)
+            if "nonce" in sent:
+                try:
+                    nonce_tracker(address).sync()
+                except (requests.RequestException, KeyError, ValueError) as sync_error:
+                    print(f"Error resyncing nonce of {address}: {sync_error}")
+            raise Exception(error_msg) from e
     
     def __init__(self, path, name):
         """
@@ -186,34 +354,21 @@ class PBCContract:
         
         print(f"Found contract files: {wasm_path} and {abi_path}")
 
+    @classmethod
+    def lazy(cls, address):
+        """
+        Return a stand-in for the wrapper of an existing contract that is only built,
+        checking files and fetching state, when something other than its address is used.
+        """
+        return LazyContract(cls, address)
+
     def get_shard(self):
         """Fetch the shard ID for the deployed contract"""
         if not self.address:
             raise ValueError("Contract not deployed. Call deploy() first")
             
         if not self.shard:
-            print(f"Fetching shard ID for contract: {self.address}")
-            try:
-                url = f"https://node1.testnet.partisiablockchain.com/chain/contracts/{self.address}"
-                print(f"Requesting contract data from: {url}")
-                
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                content = response.text
-                
-                try:
-                    json_data = json.loads(content)
-                    if "shardId" in json_data:
-                        self.shard = json_data["shardId"]
-                        print(f"Contract is on shard: {self.shard}")
-                    else:
-                        print(f"Warning: 'shardId' not found in response. Keys: {list(json_data.keys())}")
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing contract data: {e}")
-                    print(f"Raw response: {content[:200]}...")  # Print first 200 chars
-            except requests.RequestException as e:
-                print(f"Error fetching contract data: {e}")
-                
+            self.shard = contract_shard(self.address)
         return self.shard
 
     def deploy(self, params):
@@ -240,7 +395,7 @@ class PBCContract:
         print(f"ABI path: {abi_path}")
         print(f"Parameters: {params}")
         
-        s1 = f"cargo pbc transaction deploy --privatekey {config.keyfile} --gas {str(config.gas)} {wasm_path} --abi {abi_path}"
+        s1 = f"cargo pbc transaction deploy --privatekey {current_keyfile()} --gas {str(config.gas)} {wasm_path} --abi {abi_path}"
         for s in params:
             if isinstance(s, str) and ' ' in s:
                 s1 = s1 + " " + shlex.quote(s)
@@ -271,16 +426,28 @@ class PBCContract:
                 print(f"Command output before error: {child.before.decode('utf-8')}")
             raise
 
-    def interact(self, action_name, params):
+    def _deploy_and_wait(self, params):
+        """Deploy the contract as a setup step and let the chain register it before the next one"""
+        address = self.deploy(params)
+        time.sleep(self.deploy_settle_seconds)
+        return address
+
+    def _then_wait(self, function, *args):
+        """Run a setup step and let its transaction settle before the next one"""
+        result = function(*args)
+        time.sleep(self.step_settle_seconds)
+        return result
+
+    def command(self, action_name, params):
         """
-        Interact with a deployed contract.
+        Build the CLI command invoking an action of the deployed contract.
         
         Args:
             action_name: Function name to call
             params: List of parameters to pass to the function
             
         Returns:
-            Transaction hash
+            Shell command string
         """
         if not self.address:
             raise ValueError("Contract not deployed yet. Call deploy() first.")
@@ -289,17 +456,31 @@ class PBCContract:
         if not os.path.exists(abi_path):
             raise FileNotFoundError(f"Contract ABI file not found at: {abi_path}")
             
-        print(f"Interacting with contract: {self.contract_name}")
-        print(f"Contract address: {self.address}")
-        print(f"Action: {action_name}")
-        print(f"Parameters: {params}")
-        
-        s1 = f"cargo pbc transaction action --show tx --privatekey {config.keyfile} --gas {str(config.gas)} --abi {abi_path} {self.address} {action_name}"
+        s1 = f"cargo pbc transaction action --show tx --privatekey {current_keyfile()} --gas {str(config.gas)} --abi {abi_path} {self.address} {action_name}"
         for s in params:
             if isinstance(s, str) and ' ' in s:
                 s1 = s1 + " " + shlex.quote(s)
             else:
                 s1 = s1 + " " + str(s)
+        return s1
+
+    def interact(self, action_name, params):
+        """
+        Interact with a deployed contract.
+        
+        Args:
+            action_name: Function name to call
+            params: List of parameters to pass to the function
+            
+        Returns:
+            Transaction hash
+        """
+        print(f"Interacting with contract: {self.contract_name}")
+        print(f"Contract address: {self.address}")
+        print(f"Action: {action_name}")
+        print(f"Parameters: {params}")
+        
+        s1 = self.command(action_name, params)
                 
         print(f"Executing interact command: {s1}")
         
@@ -309,3 +490,117 @@ class PBCContract:
         else:
             print("Using standard execution mode without transaction verification")
             return PBCContract.execute(s1)
+
+    @staticmethod
+    def execute_batch(commands, careful=None, concurrency=8, timeout=30):
+        """
+        Send independent commands of the current key, e.g. orders in different auctions.
+        
+        The CLI reads the nonce from the chain, so transactions of one key cannot be
+        sent back to back: each command is sent as soon as the transaction before it
+        is included, and all transactions are verified concurrently at the end.
+        Unlike execute_sequence, a failed command does not stop the batch, since the
+        commands do not depend on each other. Failed commands are not resent.
+        
+        Args:
+            commands: Shell commands, e.g. built with command()
+            careful: Verify the transactions, defaults to config.careful
+            concurrency: Maximum number of concurrent verifications
+            timeout: Seconds to wait for each transaction to be included
+            
+        Returns:
+            List with the transaction hash of each command, or None where it failed
+        """
+        return PBCContract._execute_gated(commands, careful, timeout, concurrency, stop_on_failure=False)
+
+    @staticmethod
+    def verify_all(trans_ids, concurrency=8):
+        """
+        Verify sent transactions concurrently.
+        
+        Args:
+            trans_ids: Transaction hashes, None for commands that were not sent
+            concurrency: Maximum number of concurrent verifications
+            
+        Returns:
+            The transaction hashes, with None where verification failed
+        """
+        sent = [trans_id for trans_id in trans_ids if trans_id is not None]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            verified = dict(zip(sent, executor.map(lambda trans_id: verify_transaction(trans_id), sent)))
+        results = []
+        for trans_id in trans_ids:
+            if trans_id is not None and not verified[trans_id]:
+                error_msg = f"Batched transaction {trans_id} verification failed"
+                print(error_msg)
+                PBCContract.log_file.print(error_msg)
+                trans_id = None
+            results.append(trans_id)
+        print(f"Batch of {len(trans_ids)} commands: {sum(r is not None for r in results)} succeeded")
+        return results
+
+    @staticmethod
+    def execute_sequence(commands, careful=None, timeout=30):
+        """
+        Send dependent commands of the current key in order, each as soon as the one before it is included.
+        
+        The CLI picks the nonce from the chain, so each command is sent once the
+        expected nonce of the previous one is used on chain (included), instead of
+        after the full verification carefully_execute waits for. All transactions
+        are verified together at the end. On a send failure or a nonce that is not
+        used in time, the nonce is resynced from the chain and the rest of the
+        sequence is not sent, since it depends on the failed command.
+        
+        Without an address for the key in config, commands are executed one by one
+        as interact() would.
+        
+        Args:
+            commands: Shell commands, e.g. built with command()
+            careful: Verify the transactions, defaults to config.careful
+            timeout: Seconds to wait for each transaction to be included
+            
+        Returns:
+            List with the transaction hash of each command, or None where it failed or was not sent
+        """
+        return PBCContract._execute_gated(commands, careful, timeout, stop_on_failure=True)
+
+    @staticmethod
+    def _execute_gated(commands, careful, timeout, concurrency=8, stop_on_failure=True):
+        # Send each command once the nonce of the one before it is used, then verify them all
+        careful = config.careful if careful is None else careful
+        address = account_address()
+        if address is None:
+            print(f"No address configured for {current_keyfile()}, executing the commands one by one")
+            run = PBCContract.carefully_execute if careful else PBCContract.execute
+            trans_ids = [None] * len(commands)
+            for index, command in enumerate(commands):
+                try:
+                    trans_ids[index] = run(command)
+                except Exception as e:
+                    print(f"Error executing command {index + 1}/{len(commands)}: {e}")
+                    if stop_on_failure:
+                        break
+            return trans_ids
+
+        tracker = nonce_tracker(address)
+        trans_ids = [None] * len(commands)
+        for index, command in enumerate(commands):
+            nonce = tracker.expect_next()
+            try:
+                trans_ids[index] = PBCContract.execute(command)
+            except Exception as e:
+                print(f"Error sending command {index + 1}/{len(commands)}: {e}")
+                tracker.sync()
+                if stop_on_failure:
+                    break
+                continue
+            if not tracker.wait_until_used(nonce, timeout):
+                error_msg = f"Transaction {trans_ids[index]} with nonce {nonce} not included after {timeout} seconds"
+                print(error_msg)
+                PBCContract.log_file.print(error_msg)
+                tracker.sync()
+                if stop_on_failure:
+                    break
+        if not careful:
+            return trans_ids
+        return PBCContract.verify_all(trans_ids, concurrency)
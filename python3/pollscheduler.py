@@ -0,0 +1,214 @@
+"""
+Adaptive polling driven by cheap change signals.
+Each contract is probed with a cheap signal first and only fully refetched when
+the signal moves; active contracts are polled quickly, idle ones back off.
+"""
+
+import hashlib
+import json
+import time
+import chainclient
+
+def contract_state_signal(address):
+    """
+    Cheap change signal for a contract: a digest of its serialized state.
+    The state is read through the shared state cache, so pollers in every process
+    share one read per contract, and AVL tree contents are not part of it. For a
+    DoubleAuction it covers next_order_id, so every submitted order moves it;
+    changes kept only in AVL trees (balances, cancelations) are caught by the
+    poller's max_age refresh.
+
+    Args:
+        address: Contract address
+
+    Returns:
+        Hex digest of the serialized contract state
+    """
+    serialized = chainclient.contract_state(address).get("serializedContract")
+    if serialized is None:
+        raise ValueError(f"serializedContract not found for {address}")
+    if not isinstance(serialized, str):
+        serialized = json.dumps(serialized, sort_keys=True)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+class PollState:
+    """
+    Scheduling state of a single polled key.
+
+    Attributes:
+        interval: Current seconds between signal checks
+        next_due: Monotonic time of the next check
+        last_signal: Last observed change signal
+        last_refresh: Monotonic time of the last full refresh
+        last_result: Result of the last full refresh
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_due = 0.0
+        self.last_signal = None
+        self.last_refresh = None
+        self.last_result = None
+
+class AdaptivePoller:
+    """
+    Schedules polls per key based on observed activity.
+
+    A key is refreshed when its signal changes, when no signal is available, or
+    when the last refresh is older than max_age (catching changes the signal misses).
+    Keys that changed drop to min_interval; unchanged keys back off to max_interval.
+
+    Attributes:
+        min_interval: Seconds between checks of an active key
+        max_interval: Upper bound on seconds between checks of an idle key
+        backoff: Factor applied to the interval after an unchanged check
+        max_age: Seconds after which a key is refreshed regardless of its signal
+    """
+
+    def __init__(self, min_interval=1, max_interval=30, backoff=2, max_age=60):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_age = max_age
+        self.states = {}
+
+    def sync(self, keys):
+        """Track exactly the given keys, adding new ones as immediately due."""
+        keys = set(keys)
+        for key in set(self.states) - keys:
+            del self.states[key]
+        for key in keys - set(self.states):
+            self.states[key] = PollState(self.min_interval)
+
+    def due_keys(self, now=None):
+        """Return the keys whose next check is due."""
+        now = time.monotonic() if now is None else now
+        return [key for key, state in self.states.items() if state.next_due <= now]
+
+    def seconds_until_due(self, now=None):
+        """Return how long to sleep until the next key becomes due."""
+        if not self.states:
+            return self.min_interval
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(state.next_due for state in self.states.values()) - now)
+
+    def restore(self, key, signal, age):
+        """
+        Seed a key from a persisted checkpoint, so an unchanged key is not refetched after a restart.
+
+        Args:
+            key: Key to restore
+            signal: Change signal observed at the last refresh
+            age: Seconds since the last refresh
+        """
+        state = self._state(key)
+        state.last_signal = signal
+        state.last_refresh = time.monotonic() - age
+
+    def invalidate(self, key):
+        """Make a key due now and force a full refresh on its next poll, e.g. after a known transaction."""
+        state = self._state(key)
+        state.last_signal = None
+        state.interval = self.min_interval
+        state.next_due = 0.0
+
+    def needs_refresh(self, key, current_signal):
+        """
+        Decide whether a key must be fully refetched.
+
+        Args:
+            key: Key being polled
+            current_signal: Freshly observed change signal, or None when unavailable
+
+        Returns:
+            bool: True if the signal moved, is unavailable, or the data is older than max_age
+        """
+        state = self._state(key)
+        stale = state.last_refresh is None or time.monotonic() - state.last_refresh >= self.max_age
+        return current_signal is None or current_signal != state.last_signal or stale
+
+    def record(self, key, current_signal, refreshed, result=None, failed=False):
+        """
+        Record the outcome of a poll and schedule the next check of the key.
+
+        Args:
+            key: Key that was polled
+            current_signal: Change signal observed during the poll
+            refreshed: Whether the full data was refetched
+            result: Refetched data when refreshed
+            failed: Whether the refetch failed
+
+        Returns:
+            The latest full data for the key
+        """
+        state = self._state(key)
+        changed = False
+        if refreshed and not failed:
+            changed = result != state.last_result
+            state.last_result = result
+            state.last_refresh = time.monotonic()
+        if not failed and current_signal is not None and current_signal != state.last_signal:
+            changed = changed or state.last_signal is not None
+            state.last_signal = current_signal
+
+        if changed:
+            state.interval = self.min_interval
+        else:
+            state.interval = min(state.interval * self.backoff, self.max_interval)
+        state.next_due = time.monotonic() + state.interval
+        return state.last_result
+
+    def poll(self, key, refresh, signal=None):
+        """
+        Check a key and refresh it if its signal moved.
+
+        Args:
+            key: Key to poll
+            refresh: Function fetching the full data for the key
+            signal: Optional function returning a cheap change signal for the key
+
+        Returns:
+            Tuple of (refreshed, result) where result is the latest full data
+        """
+        current_signal = None
+        if signal is not None:
+            try:
+                current_signal = signal()
+            except Exception as e:
+                print(f"Change signal failed for {key}, refreshing instead: {e}")
+
+        if not self.needs_refresh(key, current_signal):
+            return False, self.record(key, current_signal, False)
+        try:
+            result = refresh()
+        except Exception:
+            self.record(key, current_signal, True, failed=True)
+            raise
+        return True, self.record(key, current_signal, True, result)
+
+    async def poll_async(self, key, refresh, signal=None):
+        """
+        Coroutine version of poll, where refresh and signal are coroutine functions.
+
+        Returns:
+            Tuple of (refreshed, result) where result is the latest full data
+        """
+        current_signal = None
+        if signal is not None:
+            try:
+                current_signal = await signal()
+            except Exception as e:
+                print(f"Change signal failed for {key}, refreshing instead: {e}")
+
+        if not self.needs_refresh(key, current_signal):
+            return False, self.record(key, current_signal, False)
+        try:
+            result = await refresh()
+        except Exception:
+            self.record(key, current_signal, True, failed=True)
+            raise
+        return True, self.record(key, current_signal, True, result)
+
+    def _state(self, key):
+        if key not in self.states:
+            self.states[key] = PollState(self.min_interval)
+        return self.states[key]
@@ -0,0 +1,260 @@
+"""
+Client-side rate limiting of node requests.
+Every node gets a token bucket shared by all requests, and each request class
+(submissions, verifications, state reads, AVL pages) its own bucket on top.
+Higher-priority classes are served first when requests queue up, and background
+classes leave part of the node budget to them, so trading latency holds while
+the monitor, indexer and bots poll heavily.
+
+Optionally the buckets and waiting requests are kept in a SQLite file shared by
+several processes, so the budgets and priorities hold across the monitor,
+indexer and bots together. This costs a write transaction per request, so by
+default each process limits only itself.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Request classes in priority order, most urgent first
+SUBMIT = "submit"
+VERIFY = "verify"
+STATE = "state"
+AVL = "avl"
+PRIORITY = {SUBMIT: 0, VERIFY: 1, STATE: 2, AVL: 3}
+
+# Requests per second and burst size
+DEFAULT_NODE_RATE = (30, 60)
+DEFAULT_CLASS_RATES = {SUBMIT: (5, 10), VERIFY: (10, 20), STATE: (20, 40), AVL: (20, 40)}
+
+# Share of a node's burst only submissions and verifications may use
+RESERVED_SHARE = 0.25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rate_waiters (
+    id TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    class TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Seconds a waiting request stays registered without checking again, so waiters of crashed processes expire
+WAITER_TTL = 5
+
+# Longest sleep of a waiting request between checks of the shared buckets
+MAX_POLL = 0.25
+
+def request_class(path):
+    """Classify a node API path"""
+    if "/avl/" in path:
+        return AVL
+    if "/transactions/" in path or path.startswith("/chain/accounts/"):
+        return VERIFY
+    return STATE
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously.
+
+    Attributes:
+        rate: Tokens added per second
+        capacity: Maximum number of tokens, i.e. the burst size
+        tokens: Tokens currently available
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, tokens):
+        """Seconds until the bucket holds the given number of tokens"""
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+class RateLimiter:
+    """
+    Budget of one node: a bucket for the node and one per request class.
+
+    A request takes a token from both. It does not go while a waiting request of
+    a more urgent class has class budget left, and state reads and AVL pages also
+    leave RESERVED_SHARE of the node bucket to submissions and verifications.
+
+    Attributes:
+        node: Bucket shared by all request classes
+        classes: Request class -> bucket
+        waiting: Request class -> number of waiting requests
+    """
+
+    def __init__(self, node_rate=DEFAULT_NODE_RATE, class_rates=None):
+        self.node = TokenBucket(*node_rate)
+        rates = dict(DEFAULT_CLASS_RATES, **(class_rates or {}))
+        self.classes = {name: TokenBucket(*rate) for name, rate in rates.items()}
+        self.waiting = {name: 0 for name in self.classes}
+        self.condition = threading.Condition()
+
+    def _needed(self, name):
+        """Node tokens a request of a class needs available before it may take one"""
+        if PRIORITY[name] > PRIORITY[VERIFY]:
+            return 1 + self.node.capacity * RESERVED_SHARE
+        return 1
+
+    def _blocked_by_priority(self, name):
+        """True if a waiting request of a more urgent class could go now, given its own class budget"""
+        return any(
+            count and PRIORITY[other] < PRIORITY[name] and self.classes[other].tokens >= 1
+            for other, count in self.waiting.items()
+        )
+
+    def acquire(self, name):
+        """
+        Wait until a request of the given class may be sent.
+
+        Returns:
+            Seconds waited
+        """
+        started = time.monotonic()
+        with self.condition:
+            self.waiting[name] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.node.refill(now)
+                    for each in self.classes.values():
+                        each.refill(now)
+                    bucket = self.classes[name]
+                    needed = self._needed(name)
+                    if not self._blocked_by_priority(name) and bucket.tokens >= 1 and self.node.tokens >= needed:
+                        bucket.tokens -= 1
+                        self.node.tokens -= 1
+                        return time.monotonic() - started
+                    delay = max(bucket.seconds_until(1), self.node.seconds_until(needed), 0.001)
+                    self.condition.wait(delay)
+            finally:
+                self.waiting[name] -= 1
+                self.condition.notify_all()
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose buckets and waiting requests are rows in a SQLite file, so one
+    budget and one priority order cover every process using the file.
+
+    Each attempt refills and takes tokens in one BEGIN IMMEDIATE transaction, with the
+    same rules as RateLimiter. Waiting requests register a row that expires unless
+    refreshed, so a more urgent request in another process holds back this one.
+    Bucket times are wall-clock, since monotonic time is not shared between processes.
+    If the file cannot be used, the limiter falls back to limiting within the process.
+
+    Attributes:
+        filename: SQLite file shared by all processes
+        scope: Prefix of the bucket keys, e.g. the node URL
+    """
+
+    def __init__(self, filename, scope, node_rate=DEFAULT_NODE_RATE, class_rates=None):
+        super().__init__(node_rate, class_rates)
+        self.filename = filename
+        self.scope = scope
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def _try_take(self, connection, name, waiter):
+        """
+        Take a token of a class if the shared buckets and waiting requests allow it.
+
+        Returns:
+            0 if a token was taken, otherwise seconds until it is worth trying again
+        """
+        now = time.time()
+        keys = {bucket: f"{self.scope}:{bucket}" for bucket in ["node"] + list(self.classes)}
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM rate_waiters WHERE expires < ?", (now,))
+            rows = {
+                row[0]: (row[1], row[2]) for row in connection.execute(
+                    f"SELECT key, tokens, updated FROM rate_buckets WHERE key IN ({', '.join('?' * len(keys))})",
+                    list(keys.values()),
+                )
+            }
+            buckets = {}
+            for bucket, template in [("node", self.node)] + list(self.classes.items()):
+                buckets[bucket] = TokenBucket(template.rate, template.capacity)
+                buckets[bucket].tokens, buckets[bucket].updated = rows.get(keys[bucket], (template.capacity, now))
+                buckets[bucket].refill(now)
+            waiting = {row[0] for row in connection.execute(
+                "SELECT DISTINCT class FROM rate_waiters WHERE scope = ? AND id != ?", (self.scope, waiter)
+            )}
+            blocked = any(PRIORITY[other] < PRIORITY[name] and buckets[other].tokens >= 1 for other in waiting)
+            bucket, node = buckets[name], buckets["node"]
+            needed = self._needed(name)
+            if not blocked and bucket.tokens >= 1 and node.tokens >= needed:
+                bucket.tokens -= 1
+                node.tokens -= 1
+                delay = 0
+                connection.execute("DELETE FROM rate_waiters WHERE id = ?", (waiter,))
+            else:
+                delay = max(bucket.seconds_until(1), node.seconds_until(needed), 0.001)
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_waiters (id, scope, class, expires) VALUES (?, ?, ?, ?)",
+                    (waiter, self.scope, name, now + WAITER_TTL),
+                )
+            connection.executemany(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(keys[b], buckets[b].tokens, now) for b in buckets],
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+        return delay
+
+    def acquire(self, name):
+        """
+        Wait until a request of the given class may be sent, by the budget shared with other processes.
+
+        Returns:
+            Seconds waited
+        """
+        started = time.monotonic()
+        waiter = f"{os.getpid()}:{threading.get_ident()}"
+        try:
+            connection = self._connection()
+            while True:
+                delay = self._try_take(connection, name, waiter)
+                if delay == 0:
+                    return time.monotonic() - started
+                time.sleep(min(delay, MAX_POLL))
+        except sqlite3.Error as e:
+            print(f"Shared rate limits unavailable, limiting within this process: {e}")
+            return super().acquire(name)
+
+def make_limiter(scope, node_rate=DEFAULT_NODE_RATE, class_rates=None, filename=None):
+    """A SharedRateLimiter over a file, or a RateLimiter of this process only if no file is given"""
+    if filename:
+        return SharedRateLimiter(filename, scope, node_rate, class_rates)
+    return RateLimiter(node_rate, class_rates)
+
+def configured_rates(config):
+    """Node rate and class rates from config.rate_limits, e.g. {"node": (30, 60), "state": (10, 20)}"""
+    limits = dict(getattr(config, "rate_limits", None) or {})
+    return limits.pop("node", DEFAULT_NODE_RATE), limits
@@ -0,0 +1,173 @@
+"""
+One retry policy for every node request and transaction submission.
+Backoff is exponential with jitter so clients that failed together do not
+retry together, every call has an overall deadline, and a process-wide retry
+budget stops retries from multiplying the load on a node that is already down.
+Polling for a result waits at least a floor share of each delay, so it is not
+used up in quick succession before the result can be there.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+from lazy import lazy_import
+
+requests = lazy_import("requests")
+
+def is_retryable(error):
+    """
+    Classify an error: connection errors, timeouts, server errors and throttling are
+    worth retrying; client errors such as 404 and undecodable answers are not.
+    """
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is None or response.status_code >= 500 or response.status_code == 429
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, ValueError):
+        return False
+    return isinstance(error, requests.RequestException)
+
+class FinalError(Exception):
+    """An error no retry can fix, e.g. a transaction that was included and must not be sent again"""
+
+def retryable_unless_final(error):
+    return not isinstance(error, FinalError)
+
+class RetryBudget:
+    """
+    Limits retries to a share of recent calls over a sliding window, with a small
+    floor so an idle process can still retry.
+
+    Attributes:
+        ratio: Retries allowed per call in the window
+        min_retries: Retries always allowed in the window
+        window: Seconds of history considered
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.calls = deque()
+        self.retries = deque()
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        for times in (self.calls, self.retries):
+            while times and times[0] < now - self.window:
+                times.popleft()
+
+    def record_call(self):
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            self.calls.append(now)
+
+    def try_spend(self):
+        """Take one retry from the budget; False if the budget is used up"""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self.retries) >= max(self.min_retries, self.ratio * len(self.calls)):
+                return False
+            self.retries.append(now)
+            return True
+
+# Shared by all policies of the process
+GLOBAL_BUDGET = RetryBudget()
+
+class RetryPolicy:
+    """
+    Retry policy for one kind of call.
+
+    Error retries spend the retry budget. Retries asked for by the result (e.g. a
+    transaction that is not yet final) are polling and do not.
+
+    Attributes:
+        attempts: Maximum number of attempts, including the first
+        base_delay: Backoff cap before the first retry, in seconds
+        max_delay: Largest backoff cap, in seconds
+        floor: Share of the backoff cap always waited, 0 for full jitter
+        deadline: Seconds after the first attempt within which all retries must start, or None
+        retryable: Function classifying an exception as retryable
+        budget: RetryBudget spent by error retries, or None for no budget
+    """
+
+    def __init__(self, attempts=3, base_delay=1, max_delay=10, deadline=None, retryable=is_retryable, budget=GLOBAL_BUDGET, floor=0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.floor = floor
+        self.deadline = deadline
+        self.retryable = retryable
+        self.budget = budget
+
+    def with_attempts(self, attempts):
+        """The same policy with another number of attempts"""
+        return RetryPolicy(attempts, self.base_delay, self.max_delay, self.deadline, self.retryable, self.budget, self.floor)
+
+    def backoff(self, retry):
+        """Jittered delay before a retry, counting retries from 0, between the floor share of the cap and the cap"""
+        cap = min(self.max_delay, self.base_delay * 2 ** retry)
+        return random.uniform(cap * self.floor, cap)
+
+    def run(self, function, retry_result=None, description="call"):
+        """
+        Call a function until it succeeds, the attempts or deadline run out, or the
+        retry budget is used up.
+
+        Args:
+            function: Function without arguments to call
+            retry_result: Optional function telling whether a result should be retried
+            description: What is being called, for the log
+
+        Returns:
+            The first accepted result, or the last result if only results were retried
+
+        Raises:
+            The last exception if it was not retryable or no retry was left
+        """
+        stop_at = None if self.deadline is None else time.monotonic() + self.deadline
+        if self.budget is not None:
+            self.budget.record_call()
+        for attempt in range(self.attempts):
+            error = None
+            try:
+                result = function()
+            except Exception as e:
+                if not self.retryable(e):
+                    raise
+                error = e
+            else:
+                if retry_result is None or not retry_result(result):
+                    return result
+
+            if attempt == self.attempts - 1:
+                break
+            if error is not None and self.budget is not None and not self.budget.try_spend():
+                print(f"Retry budget used up, not retrying {description}")
+                break
+            delay = self.backoff(attempt)
+            if stop_at is not None:
+                remaining = stop_at - time.monotonic()
+                if remaining <= 0:
+                    print(f"Deadline reached for {description}")
+                    break
+                delay = min(delay, remaining)
+            reason = error if error is not None else "not done yet"
+            print(f"Retrying {description} in {delay:.1f}s (attempt {attempt + 2}/{self.attempts}): {reason}")
+            time.sleep(delay)
+
+        if error is not None:
+            raise error
+        return result
+
+# Policies of the call sites
+STATE_READ = RetryPolicy(attempts=3, base_delay=2, max_delay=8, deadline=30)
+# Verification polls every 1.5-2 seconds: a transaction is not final sooner, and full jitter could spend every attempt at once
+VERIFICATION = RetryPolicy(attempts=30, base_delay=2, max_delay=2, deadline=60, floor=0.75)
+SUBMISSION = RetryPolicy(attempts=3, base_delay=2, max_delay=8, deadline=120, retryable=retryable_unless_final)
+MONITOR_READ = RetryPolicy(attempts=3, base_delay=0.5, max_delay=2, deadline=5)
@@ -3,11 +3,11 @@ Handles deserialization of contract state from Partisia blockchain.
 Supports various data types and provides clean interface for state reading.
 """
 
-import requests
 import json
+import chainclient
+from retrypolicy import STATE_READ
 import base64
 import struct
-import time
 
 class SerializedState:
     """
@@ -31,38 +31,16 @@ class SerializedState:
         if address:
             print(f"Fetching state for contract: {address}")
             try:
-                # Add retry mechanism for contract state fetch
-                max_retries = 3
-                delay_seconds = 2
-                
-                for attempt in range(max_retries):
-                    try:
-                        response = requests.get(f"https://node1.testnet.partisiablockchain.com/chain/contracts/{address}", timeout=10)
-                        response.raise_for_status()
-                        content = response.text
-                        json_data = json.loads(content)
-                        
-                        if "serializedContract" in json_data:
-                            base64content = json_data["serializedContract"]
-                            print(f"Successfully fetched contract state on attempt {attempt+1}")
-                            break
-                        else:
-                            print(f"Warning: serializedContract not found in response on attempt {attempt+1}")
-                            print(f"Response keys: {json_data.keys()}")
-                            
-                            if attempt < max_retries - 1:
-                                print(f"Waiting {delay_seconds} seconds before retry...")
-                                time.sleep(delay_seconds)
-                                delay_seconds *= 2  # Exponential backoff
-                    except requests.RequestException as e:
-                        print(f"Request error on attempt {attempt+1}: {e}")
-                        if attempt < max_retries - 1:
-                            print(f"Waiting {delay_seconds} seconds before retry...")
-                            time.sleep(delay_seconds)
-                            delay_seconds *= 2
-                
-                if base64content is None:
-                    raise Exception(f"Failed to fetch serializedContract for address {address} after {max_retries} attempts")
+                json_data = STATE_READ.run(
+                    lambda: chainclient.contract_state(address, timeout=10),
+                    retry_result=lambda data: "serializedContract" not in data,
+                    description=f"state fetch of {address}",
+                )
+                if "serializedContract" not in json_data:
+                    print(f"Response keys: {json_data.keys()}")
+                    raise Exception(f"Failed to fetch serializedContract for address {address}")
+                base64content = json_data["serializedContract"]
+                print("Successfully fetched contract state")
             except Exception as e:
                 print(f"Error fetching contract state: {e}")
                 raise
@@ -161,5 +139,93 @@ class SerializedState:
                 return result
             raise
     
+def fetch_avl_entries(address, tree_id, page_size=100, limit=None):
+    """
+    Fetch the entries of an AVL tree stored in a contract's state, in key order.
+
+    Args:
+        address: Contract address
+        tree_id: Id of the AVL tree within the contract state
+        page_size: Number of entries requested per page
+        limit: Optional maximum number of entries to return
+
+    Returns:
+        List of (key, value) byte string tuples
+    """
+    base_path = f"/chain/contracts/{address}/avl/{tree_id}/next"
+    entries = []
+    last_key = None
+    while limit is None or len(entries) < limit:
+        n = page_size if limit is None else min(page_size, limit - len(entries))
+        path = f"{base_path}?n={n}" if last_key is None else f"{base_path}/{last_key.hex()}?n={n}"
+        response = chainclient.read(path, timeout=10)
+        response.raise_for_status()
+        page = json.loads(response.text)
+        for item in page:
+            entries.append((base64.b64decode(item["key"]), base64.b64decode(item["value"])))
+        if len(page) < n:
+            break
+        last_key = entries[-1][0]
+    return entries
+
+def fetch_avl_value(address, tree_id, key):
+    """
+    Fetch the value of one key of an AVL tree stored in a contract's state.
+
+    Args:
+        address: Contract address
+        tree_id: Id of the AVL tree within the contract state
+        key: Serialized key as bytes
+
+    Returns:
+        The value as bytes, or None if the tree has no such key
+    """
+    response = chainclient.read(f"/chain/contracts/{address}/avl/{tree_id}/{key.hex()}", timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return base64.b64decode(json.loads(response.text)["data"])
+
+def decode_limit_order(value_bytes):
+    """
+    Decode a LimitOrder value from a DoubleAuction order tree.
+
+    Returns:
+        Dictionary with token_amount, price_per_token, id, owner, is_bid and cancelation_id
+    """
+    if len(value_bytes) < 58:
+        raise ValueError(f"Value bytes are too short to contain a LimitOrder ({len(value_bytes)} bytes).")
+    low, high, price, order_id = struct.unpack('<QQQQ', value_bytes[:32])
+    return {
+        "token_amount": (high << 64) | low,
+        "price_per_token": price,
+        "id": order_id,
+        "owner": value_bytes[32:53].hex(),
+        "is_bid": value_bytes[53] != 0,
+        "cancelation_id": struct.unpack('<I', value_bytes[54:58])[0],
+    }
+
+def decode_token_balance(value_bytes):
+    """
+    Decode a TokenBalance value from a TokenBalances tree.
+
+    Returns:
+        Tuple of (a_tokens, b_tokens, liquidity_tokens)
+    """
+    if len(value_bytes) < 48:
+        raise ValueError(f"Value bytes are too short to contain a TokenBalance ({len(value_bytes)} bytes).")
+    words = struct.unpack('<QQQQQQ', value_bytes[:48])
+    return tuple((words[i + 1] << 64) | words[i] for i in range(0, 6, 2))
+
+def read_token_balance(address, owner, tree_id=0):
+    """
+    Read the TokenBalance of one owner in a contract's TokenBalances tree.
+
+    Returns:
+        Tuple of (a_tokens, b_tokens, liquidity_tokens), zeros if the owner has no balance
+    """
+    value = fetch_avl_value(address, tree_id, bytes.fromhex(owner))
+    return (0, 0, 0) if value is None else decode_token_balance(value)
+
 #s = SerializedState(address = "024056f1a19745f2b8e86e10aa5a144d6b09b641d8")
 #print(s.deserialize(["String","u8","String","Address","u128"]))
@@ -0,0 +1,169 @@
+"""
+Settlement watcher with bulk redemption.
+Watches the LifeStage of every registered splitter with adaptive polling and,
+once a market is settled, redeems the winning tokens of every configured wallet.
+Each wallet redeems its markets one after the other on its own key, and the
+wallets run in parallel. Each market's redemption steps are journaled per
+wallet, so a crash or rerun continues where it stopped instead of redoing
+transactions.
+"""
+
+import argparse
+import time
+
+from pbccontract import account_address
+from walletpool import WalletPool, configured_keyfiles
+from pollscheduler import AdaptivePoller, contract_state_signal
+from serializedstate import read_token_balance
+from deployjournal import DeploymentJournal
+from marketregistry import load_entries
+from indexer import read_splitter_state
+
+REDEEM_JOURNAL_FILE = "redeem-journal.json"
+
+class SettlementWatcher:
+    """
+    Detects settled markets and redeems the winning tokens of every wallet.
+
+    Settled is a terminal life stage, so a market stops being polled once it is
+    seen settled; the others are checked with a cheap change signal first and
+    backed off while nothing changes.
+
+    Attributes:
+        entries: Market registry entries
+        wallets: Keyfile -> address of the wallets to redeem for
+        poller: AdaptivePoller over splitter addresses
+        pool: WalletPool with one queue per wallet, signing each wallet's redemptions with its key
+        settled: Splitter address -> winning outcome ("YES" or "NO") of the markets seen settled
+    """
+
+    def __init__(self, entries, wallets, poller=None, journal_file=REDEEM_JOURNAL_FILE, pool=None):
+        self.entries = {entry["splitter"]: entry for entry in entries}
+        self.wallets = wallets
+        self.poller = poller or AdaptivePoller(min_interval=5, max_interval=300, max_age=3600)
+        self.journal_file = journal_file
+        self.pool = pool or WalletPool(list(wallets))
+        self.settled = {}
+
+    def check_markets(self):
+        """
+        Poll the life stage of the due splitters that are not yet settled.
+
+        Returns:
+            List of splitter addresses that became settled
+        """
+        self.poller.sync(address for address in self.entries if address not in self.settled)
+        newly_settled = []
+        for address in self.poller.due_keys():
+            try:
+                _, state = self.poller.poll(
+                    address, lambda: read_splitter_state(address), lambda: contract_state_signal(address)
+                )
+            except Exception as e:
+                print(f"Error reading splitter {address}: {e}")
+                continue
+            if state is not None and state["status"] == "RESOLVED":
+                print(f"Market {address} ({state['symbol']}) settled as {state['resolution']}")
+                self.settled[address] = state["resolution"]
+                newly_settled.append(address)
+        return newly_settled
+
+    def redeem_market(self, address, owner):
+        """
+        Redeem all of a wallet's winning tokens of one settled market and withdraw the currency.
+        Winning tokens left in the outcome auction or in the wallet are moved into the splitter first.
+        Runs on the wallet's key, see redeem_settled.
+
+        Returns:
+            Dictionary of completed step -> transaction id
+        """
+        from tokenv2 import TokenV2
+        from tokensplitter import TokenSplitter
+        from doubleauction import DoubleAuction
+
+        entry = self.entries[address]
+        outcome_yes = self.settled[address] == "YES"
+        token_address = entry["true_token"] if outcome_yes else entry["false_token"]
+        auction = DoubleAuction(address=entry["true_auction"] if outcome_yes else entry["false_auction"])
+        splitter = TokenSplitter(address=address)
+        token = TokenV2(address=token_address)
+        journal = DeploymentJournal(f"redeem:{address}:{owner}", self.journal_file)
+
+        def splitter_balance():
+            true_tokens, false_tokens, original_tokens = read_token_balance(address, owner)
+            return (true_tokens if outcome_yes else false_tokens), original_tokens
+
+        # Amounts are read when a step runs, so a resumed run only moves what is left
+        in_auction = read_token_balance(auction.address, owner)[1]
+        if in_auction > 0:
+            journal.step("withdraw_auction", auction.withdraw, token_address, in_auction, True)
+        in_wallet = token.get_balance(owner)
+        if in_wallet:
+            journal.step("approve_splitter", token.approve_relative, address, in_wallet)
+            journal.step("deposit_splitter", splitter.deposit, token_address, in_wallet)
+        winning, _ = splitter_balance()
+        if winning > 0:
+            journal.step("redeem", splitter.redeem, winning)
+        _, currency = splitter_balance()
+        if currency > 0:
+            journal.step("withdraw_currency", splitter.withdraw, entry["currency"], currency, True)
+        journal.record("done", True)
+        return journal.steps()
+
+    def redeem_settled(self, addresses=None):
+        """
+        Redeem in all given settled markets for every wallet, skipping markets whose journal is done.
+        Each wallet's markets are queued on its own key and redeemed one after the other,
+        while different wallets redeem in parallel.
+
+        Returns:
+            Dictionary of (splitter address, wallet address) -> completed steps, or the exception that stopped it
+        """
+        addresses = list(self.settled) if addresses is None else addresses
+        futures = {}
+        for keyfile, owner in self.wallets.items():
+            for address in addresses:
+                if DeploymentJournal(f"redeem:{address}:{owner}", self.journal_file).steps().get("done"):
+                    continue
+                futures[(address, owner)] = self.pool.submit_on(keyfile, self.redeem_market, address, owner)
+        results = {}
+        for (address, owner), future in futures.items():
+            try:
+                results[(address, owner)] = future.result()
+                print(f"Redeemed market {address} for {owner}")
+            except Exception as e:
+                results[(address, owner)] = e
+                print(f"Error redeeming market {address} for {owner}, rerun to resume: {e}")
+        return results
+
+    def run(self):
+        """Watch until every market is settled and redeemed."""
+        while True:
+            if self.check_markets():
+                self.redeem_settled()
+            if len(self.settled) == len(self.entries):
+                print("All markets are settled")
+                return
+            time.sleep(max(self.poller.seconds_until_due(), 1))
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch registered markets and redeem winning tokens on settlement")
+    parser.add_argument("--owner", help="address of the key, if there is a single key and config.address is not set")
+    options = parser.parse_args()
+
+    keyfiles = configured_keyfiles()
+    wallets = {}
+    for keyfile in keyfiles:
+        owner = account_address(keyfile)
+        if owner is None and len(keyfiles) == 1:
+            owner = options.owner
+        if owner is None:
+            raise SystemExit(f"No address configured for {keyfile}: set config.addresses, or --owner for a single key")
+        wallets[keyfile] = owner
+
+    watcher = SettlementWatcher(load_entries(), wallets)
+    watcher.run()
+    watcher.pool.shutdown()
+
+if __name__ == "__main__":
+    main()
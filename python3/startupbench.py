@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark for the interactive entry points.
+Runs each script in a fresh interpreter and measures the time until it first
+asks for input (or, for monitor.py, until its module has been imported), and
+which heavy dependencies were imported by then.
+
+    python startupbench.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Script -> run name; "__main__" runs the script up to its first prompt, anything else only imports it
+SCRIPTS = {
+    "gamble.py": "__main__",
+    "initprediction.py": "__main__",
+    "monitor.py": "startup",
+}
+
+HEAVY_MODULES = ("pexpect", "requests", "pytz")
+
+PROBE = r"""
+import builtins, json, os, runpy, sys, time
+started = time.perf_counter()
+script, run_name, heavy = sys.argv[1], sys.argv[2], sys.argv[3].split(",")
+
+def report(reason):
+    sys.__stdout__.write("STARTUP " + json.dumps({
+        "seconds": time.perf_counter() - started,
+        "reason": reason,
+        "imported": [name for name in heavy if name in sys.modules],
+    }) + "\n")
+    sys.__stdout__.flush()
+    os._exit(0)
+
+builtins.input = lambda prompt="": report("prompt")
+sys.argv = [script]
+try:
+    runpy.run_path(script, run_name=run_name)
+except BaseException as e:
+    report(type(e).__name__)
+report("imported" if run_name != "__main__" else "finished")
+"""
+
+def measure(script, run_name, cwd):
+    """
+    Start a script once in a fresh interpreter.
+
+    Returns:
+        Dictionary with seconds (including interpreter startup), reason and imported heavy modules
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(path) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path, run_name, ",".join(HEAVY_MODULES)],
+        cwd=cwd, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=120,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"{script} did not report its startup: {result.stderr.strip()[-500:]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time of gamble.py, initprediction.py and monitor.py")
+    parser.add_argument("--runs", type=int, default=5, help="runs per script, the median is reported")
+    parser.add_argument("--cwd", default=".", help="directory the scripts run in (where config and the registry are)")
+    parser.add_argument("scripts", nargs="*", default=list(SCRIPTS), help="scripts to measure")
+    options = parser.parse_args()
+
+    for script in options.scripts:
+        try:
+            runs = [measure(script, SCRIPTS.get(script, "__main__"), options.cwd) for _ in range(options.runs)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"{script:20} failed: {e}")
+            continue
+        seconds = statistics.median(run["seconds"] for run in runs)
+        imported = ", ".join(runs[-1]["imported"]) or "none"
+        print(f"{script:20} {seconds * 1000:8.1f} ms until {runs[-1]['reason']}, heavy imports: {imported}")
+
+if __name__ == "__main__":
+    main()
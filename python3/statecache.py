@@ -0,0 +1,160 @@
+"""
+Contract state cache shared between processes.
+The monitor, gamble, the indexer and the bots all read the same
+/chain/contracts/{address} states. Answers are kept in a SQLite file (WAL mode)
+for a short TTL, and concurrent misses for the same state collapse into one
+upstream request: within a process through an in-flight table, across
+processes through a lease row in the same file.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+STATE_CACHE_FILE = "state-cache.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    fetched REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+class Flight:
+    """An upstream fetch in progress, shared by the callers that missed at the same time"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.error = None
+
+class StateCache:
+    """
+    TTL cache of JSON answers with singleflight fetching.
+
+    Attributes:
+        filename: SQLite file shared by all processes using the cache
+        ttl: Seconds an answer is served from the cache
+        lease_seconds: Seconds another process waits for a lease holder before fetching itself
+        flights: Key -> Flight of the fetches in progress in this process
+    """
+
+    def __init__(self, filename=STATE_CACHE_FILE, ttl=1.0, lease_seconds=10):
+        self.filename = filename
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.local = threading.local()
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def lookup(self, key):
+        """Return the cached body of a key if it is younger than the TTL, else None"""
+        row = self._connection().execute("SELECT body, fetched FROM states WHERE key = ?", (key,)).fetchone()
+        if row is not None and time.time() - row[1] <= self.ttl:
+            return row[0]
+        return None
+
+    def store(self, key, body):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO states (key, body, fetched) VALUES (?, ?, ?)", (key, body, time.time())
+        )
+
+    def acquire_lease(self, key):
+        """Try to become the one process fetching a key; expired leases of crashed processes are taken over"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO leases (key, expires) VALUES (?, ?)", (key, now + self.lease_seconds)
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def release_lease(self, key):
+        self._connection().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def get(self, key, fetch):
+        """
+        Return the JSON value of a key from the cache, or fetch it once for all concurrent callers.
+
+        Args:
+            key: Cache key, e.g. the request path
+            fetch: Function returning the JSON-serializable value on a miss
+
+        Returns:
+            A fresh copy of the value for each caller
+        """
+        try:
+            body = self.lookup(key)
+        except sqlite3.Error as e:
+            print(f"State cache unavailable, fetching directly: {e}")
+            return fetch()
+        if body is not None:
+            return json.loads(body)
+
+        with self.flights_lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return json.loads(flight.body)
+
+        try:
+            flight.body = self._fetch_shared(key, fetch)
+            return json.loads(flight.body)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.done.set()
+            with self.flights_lock:
+                del self.flights[key]
+
+    def _fetch_shared(self, key, fetch):
+        """Fetch a key once across processes: take the lease and fetch, or wait for the lease holder's answer"""
+        deadline = time.time() + self.lease_seconds
+        try:
+            while True:
+                if self.acquire_lease(key):
+                    try:
+                        body = json.dumps(fetch())
+                        self.store(key, body)
+                        return body
+                    finally:
+                        self.release_lease(key)
+                time.sleep(0.02)
+                body = self.lookup(key)
+                if body is not None:
+                    return body
+                if time.time() > deadline:
+                    print(f"Gave up waiting for another process to fetch {key}")
+                    break
+        except sqlite3.Error as e:
+            print(f"State cache unavailable, fetching directly: {e}")
+        return json.dumps(fetch())
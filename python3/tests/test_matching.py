@@ -0,0 +1,87 @@
+"""
+Differential tests of the matching engine replica.
+The cases mirror rust/tests/double-auction/tests.rs (init, submit_bid, submit_ask,
+cancel_order). Those tests target an older contract API, so the expected values
+are worked out from double-auction/src/lib.rs.
+"""
+
+import pytest
+
+from matching import OrderBook, cheap_early, expensive_early, total_price
+
+def ask_book():
+    book = OrderBook(price_numerator=2, price_denominator=5)
+    book.submit_ask("a", 10, 100, 1)
+    book.submit_ask("b", 10, 50, 1)
+    book.submit_ask("c", 9, 30, 1)
+    return book
+
+def test_init():
+    book = OrderBook(price_numerator=1, price_denominator=1)
+    assert book.orders() == []
+    assert book.best_bid() is None and book.best_ask() is None
+
+def test_submit_bid():
+    book = OrderBook(price_numerator=1, price_denominator=1)
+    result = book.submit_bid("sender", 100, 10, 0)
+    assert result.fills == [] and result.token_amount == 0
+    assert result.rest["token_amount"] == 10 and result.currency_locked == total_price(10, 100, 1, 1)
+    assert book.best_bid()["price_per_token"] == 100
+
+def test_submit_ask():
+    book = OrderBook(price_numerator=1, price_denominator=1)
+    result = book.submit_ask("sender", 100, 10, 0)
+    assert result.fills == [] and result.currency_locked == 0
+    assert book.best_ask()["token_amount"] == 10
+
+def test_cancel_order():
+    book = OrderBook(price_numerator=1, price_denominator=1)
+    with pytest.raises(ValueError):
+        book.cancel("sender", 0)
+    book.submit_bid("sender", 100, 10, 0)
+    order, refund = book.cancel("sender", 0)
+    assert order["token_amount"] == 10 and refund == total_price(10, 100, 1, 1)
+    assert book.orders() == []
+
+def test_priority_keys_order_as_the_avl_trees():
+    # Bids by descending price, asks by ascending price, then by order id
+    assert expensive_early(10, 5) < expensive_early(9, 0) < expensive_early(9, 1)
+    assert cheap_early(9, 5) < cheap_early(10, 0) < cheap_early(10, 1)
+
+def test_total_price_rounds_before_scaling():
+    assert total_price(7, 3, 2, 5) == (21 // 5) * 2 == 8
+
+def test_asks_rest_in_price_time_priority():
+    assert [o["owner"] for o in ask_book().orders()] == ["c", "a", "b"]
+
+def test_crossing_bid_fills_partially_at_maker_prices():
+    book = ask_book()
+    estimate = book.submit_bid("t", 10, 80, 7, apply=False)
+    assert [(f["maker"]["owner"], f["amount"]) for f in estimate.fills] == [("c", 30), ("a", 50)]
+    assert estimate.currency_amount == total_price(30, 9, 2, 5) + total_price(50, 10, 2, 5) == 108 + 200
+    assert estimate.rest is None and len(book.orders()) == 3
+
+    result = book.submit_bid("t", 10, 80, 7)
+    assert result.fills == estimate.fills
+    assert [(o["owner"], o["token_amount"]) for o in book.orders()] == [("a", 50), ("b", 50)]
+
+def test_bid_above_the_book_rests_its_remainder():
+    book = ask_book()
+    book.submit_bid("t", 10, 80, 7)
+    result = book.submit_bid("t", 11, 120, 8)
+    assert result.token_amount == 100 and result.rest["token_amount"] == 20
+    assert result.currency_locked == total_price(20, 11, 2, 5) == 88
+    assert book.best_bid()["id"] == 3 and book.best_ask() is None
+
+def test_ask_fills_at_the_bid_price_and_cancel_refunds():
+    book = ask_book()
+    book.submit_bid("t", 10, 80, 7)
+    book.submit_bid("t", 11, 120, 8)
+    result = book.submit_ask("s", 5, 5, 1)
+    assert result.fills[0]["currency"] == total_price(5, 11, 2, 5)
+    order, refund = book.cancel("t", 8)
+    assert order["token_amount"] == 15 and refund == total_price(15, 11, 2, 5)
+    assert book.orders() == []
+    # Cancelling twice fails like the contract panics
+    with pytest.raises(ValueError):
+        book.cancel("t", 8)
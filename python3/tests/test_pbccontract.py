@@ -0,0 +1,55 @@
+import pytest
+
+import pbccontract
+from pbccontract import PBCContract
+
+class Chain:
+    """Account nonce on chain, advanced when a sent transaction is included"""
+
+    def __init__(self, nonce):
+        self.nonce = nonce
+        self.sent = []
+
+class SilentLog:
+    def print(self, *args):
+        pass
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = Chain(5)
+    monkeypatch.setattr(pbccontract, "account_address", lambda keyfile=None: "00acc")
+    monkeypatch.setattr(pbccontract, "account_nonce", lambda address: chain.nonce)
+    monkeypatch.setattr(pbccontract, "_nonce_trackers", {})
+    monkeypatch.setattr(pbccontract, "RESEND_CHECK_SECONDS", 0.3)
+    monkeypatch.setattr(pbccontract.SUBMISSION, "base_delay", 0)
+    monkeypatch.setattr(PBCContract, "log_file", SilentLog())
+    return chain
+
+def test_failed_sends_do_not_leave_the_nonce_ahead(chain, monkeypatch):
+    def failing_send(command):
+        raise Exception("CLI failed")
+    monkeypatch.setattr(PBCContract, "execute", staticmethod(failing_send))
+    with pytest.raises(Exception):
+        PBCContract.carefully_execute("first")
+
+    def included_send(command):
+        chain.sent.append((command, chain.nonce))
+        chain.nonce += 1
+        return f"tx{len(chain.sent)}"
+    monkeypatch.setattr(PBCContract, "execute", staticmethod(included_send))
+    monkeypatch.setattr(pbccontract, "verify_transaction", lambda trans_id, retries=None: False)
+    with pytest.raises(Exception):
+        PBCContract.carefully_execute("second")
+
+    assert chain.sent == [("second", 5)]
+
+def test_resends_while_the_nonce_is_unused(chain, monkeypatch):
+    sends = []
+    def lost_send(command):
+        sends.append(command)
+        return f"tx{len(sends)}"
+    monkeypatch.setattr(PBCContract, "execute", staticmethod(lost_send))
+    monkeypatch.setattr(pbccontract, "verify_transaction", lambda trans_id, retries=None: trans_id == "tx2")
+
+    assert PBCContract.carefully_execute("command") == "tx2"
+    assert sends == ["command", "command"]
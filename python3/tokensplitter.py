@@ -3,11 +3,16 @@ Interface for Token Splitter smart contract.
 Manages creation and settlement of prediction market tokens.
 """
 
-from pbccontract import PBCContract
+from pbccontract import PBCContract, current_keyfile
 from tokenv2 import TokenV2
 from serializedstate import SerializedState
+from deployjournal import DeploymentJournal
 import time
 
+def splitter_journal_key(keyfile, event_symbol, original_address, oracle_address, event_description):
+    """Journal key of a splitter deployment; steps are only resumed by the key that signed them."""
+    return f"splitter:{keyfile}:{event_symbol}:{original_address}:{oracle_address}:{event_description}"
+
 class TokenSplitter(PBCContract):
     """
     Manages splitting of original tokens into YES/NO prediction market pairs.
@@ -45,6 +50,8 @@ class TokenSplitter(PBCContract):
             print(f"Original token address: {original_address}")
             print(f"Oracle address: {oracle_address}")
             
+            # Completed steps are journaled, so a rerun with the same arguments and key resumes where this one failed
+            journal = DeploymentJournal(splitter_journal_key(current_keyfile(), event_symbol, original_address, oracle_address, event_description))
             try:
                 self.event_description = event_description
                 self.event_symbol = event_symbol
@@ -65,16 +72,9 @@ class TokenSplitter(PBCContract):
                     true_token_symbol = original_token.symbol + "|" + event_symbol
                     print(f"Creating TRUE token with name='{true_token_name}', symbol='{true_token_symbol}'")
                     
-                    true_token = TokenV2(
-                        name=true_token_name, 
-                        symbol=true_token_symbol, 
-                        decimals=original_token.decimals, 
-                        supply=original_token.supply
-                    )
-                    self.true_address = true_token.address
+                    self.true_address = journal.step("deploy_true_token", self._deploy_token,
+                        true_token_name, true_token_symbol, original_token.decimals, original_token.supply)
                     print(f"TRUE token deployed at: {self.true_address}")
-                    # Small delay to ensure token is registered on blockchain
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error creating TRUE token: {e}")
                     raise
@@ -85,23 +85,16 @@ class TokenSplitter(PBCContract):
                     false_token_symbol = original_token.symbol + "|!" + event_symbol
                     print(f"Creating FALSE token with name='{false_token_name}', symbol='{false_token_symbol}'")
                     
-                    false_token = TokenV2(
-                        name=false_token_name, 
-                        symbol=false_token_symbol, 
-                        decimals=original_token.decimals, 
-                        supply=original_token.supply
-                    )
-                    self.false_address = false_token.address
+                    self.false_address = journal.step("deploy_false_token", self._deploy_token,
+                        false_token_name, false_token_symbol, original_token.decimals, original_token.supply)
                     print(f"FALSE token deployed at: {self.false_address}")
-                    # Small delay to ensure token is registered on blockchain
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error creating FALSE token: {e}")
                     raise
                 
                 print("Deploying token splitter...")
                 try:
-                    self.deploy([
+                    self.address = journal.step("deploy_splitter", self._deploy_and_wait, [
                         event_description, 
                         event_symbol, 
                         original_address, 
@@ -110,51 +103,48 @@ class TokenSplitter(PBCContract):
                         oracle_address
                     ])
                     print(f"Token splitter deployed at: {self.address}")
-                    # Small delay to ensure contract is registered on blockchain
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error deploying token splitter: {e}")
                     raise
                 
+                true_token = TokenV2(address=self.true_address)
+                false_token = TokenV2(address=self.false_address)
+
                 print('Approving transfer of all "True tokens" to token splitter contract')
                 try:
-                    approval_tx = true_token.approve_relative(self.address, original_token.supply)
+                    approval_tx = journal.step("approve_true", self._then_wait, true_token.approve_relative, self.address, original_token.supply)
                     print(f"TRUE token approval transaction: {approval_tx}")
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error approving TRUE tokens: {e}")
                     raise
                 
                 print("Depositing TRUE tokens to splitter contract")
                 try:
-                    deposit_tx = self.deposit(self.true_address, original_token.supply)
+                    deposit_tx = journal.step("deposit_true", self._then_wait, self.deposit, self.true_address, original_token.supply)
                     print(f"TRUE token deposit transaction: {deposit_tx}")
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error depositing TRUE tokens: {e}")
                     raise
                 
                 print('Approving transfer of all "False tokens" to token splitter contract')
                 try:
-                    approval_tx = false_token.approve_relative(self.address, original_token.supply)
+                    approval_tx = journal.step("approve_false", self._then_wait, false_token.approve_relative, self.address, original_token.supply)
                     print(f"FALSE token approval transaction: {approval_tx}")
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error approving FALSE tokens: {e}")
                     raise
                 
                 print("Depositing FALSE tokens to splitter contract")
                 try:
-                    deposit_tx = self.deposit(self.false_address, original_token.supply)
+                    deposit_tx = journal.step("deposit_false", self._then_wait, self.deposit, self.false_address, original_token.supply)
                     print(f"FALSE token deposit transaction: {deposit_tx}")
-                    time.sleep(2)
                 except Exception as e:
                     print(f"Error depositing FALSE tokens: {e}")
                     raise
                 
                 print("Preparing the token splitter for business...")
                 try:
-                    prepare_tx = self.prepare(original_token.supply)
+                    prepare_tx = journal.step("prepare", self.prepare, original_token.supply)
                     print(f"Token splitter preparation transaction: {prepare_tx}")
                 except Exception as e:
                     print(f"Error preparing token splitter: {e}")
@@ -163,10 +153,18 @@ class TokenSplitter(PBCContract):
                 print("Token splitter setup completed successfully!")
             except Exception as e:
                 print(f"Failed to initialize TokenSplitter: {e}")
+                print(f"Completed steps are kept in {journal.filename}, rerun with the same arguments to resume")
                 raise
         else:
             raise ValueError("Invalid arguments provided to TokenSplitter.")
 
+    @staticmethod
+    def _deploy_token(name, symbol, decimals, supply):
+        token = TokenV2(name=name, symbol=symbol, decimals=decimals, supply=supply)
+        # Small delay to ensure token is registered on blockchain
+        time.sleep(2)
+        return token.address
+
     def deposit(self, token_address, amount):
         print(f"Depositing {amount} tokens from {token_address} to splitter {self.address}")
         try:
@@ -0,0 +1,130 @@
+"""
+Reconstruction of trades (fills) in DoubleAuction contracts.
+Fills are derived from executed submit_bid/submit_ask transactions when those
+are known, and otherwise from the difference between consecutive book snapshots.
+"""
+
+import struct
+from matching import OrderBook, order_key, total_price
+
+SUBMIT_BID = 0x04
+SUBMIT_ASK = 0x05
+CANCEL_LIMIT_ORDER = 0x06
+
+# Candle resolutions in seconds maintained per auction
+CANDLE_RESOLUTIONS = [60, 300, 3600, 86400]
+
+def decode_submit_rpc(rpc):
+    """
+    Decode the RPC of a submit_bid or submit_ask action.
+
+    Args:
+        rpc: Action RPC bytes, starting with the shortname
+
+    Returns:
+        Dictionary with is_bid, price_per_token, token_amount and cancelation_id, or None for other actions
+    """
+    if len(rpc) < 1 or rpc[0] not in (SUBMIT_BID, SUBMIT_ASK):
+        return None
+    if len(rpc) < 29:
+        raise ValueError(f"RPC too short for a submit action ({len(rpc)} bytes)")
+    # RPC arguments are big endian
+    price, high, low, cancelation_id = struct.unpack('>QQQI', rpc[1:29])
+    return {
+        "is_bid": rpc[0] == SUBMIT_BID,
+        "price_per_token": price,
+        "token_amount": (high << 64) | low,
+        "cancelation_id": cancelation_id,
+    }
+
+def decode_cancel_rpc(rpc):
+    """
+    Decode the RPC of a cancel_limit_order action.
+
+    Returns:
+        The cancelation id, or None for other actions
+    """
+    if len(rpc) < 1 or rpc[0] != CANCEL_LIMIT_ORDER:
+        return None
+    if len(rpc) < 5:
+        raise ValueError(f"RPC too short for a cancel action ({len(rpc)} bytes)")
+    return struct.unpack('>I', rpc[1:5])[0]
+
+def fill(auction, maker, amount, taker=None, tx_id=None, timestamp=None, scaling=None, source="transaction"):
+    """Build a fill record for an amount traded against a maker order at the maker's price."""
+    currency_amount = None
+    if scaling is not None:
+        currency_amount = total_price(amount, maker["price_per_token"], *scaling)
+    return {
+        "auction": auction,
+        "maker_order_id": maker["id"],
+        "maker": maker["owner"],
+        "taker": taker,
+        "taker_side": "SELL" if maker["is_bid"] else "BUY",
+        "price_per_token": maker["price_per_token"],
+        "token_amount": amount,
+        "currency_amount": currency_amount,
+        "timestamp": timestamp,
+        "tx_id": tx_id,
+        "source": source,
+    }
+
+def fills_from_transaction(auction, resting_orders, submit, taker=None, tx_id=None, timestamp=None, scaling=None):
+    """
+    Reconstruct the fills of an executed submit_bid/submit_ask against the book it met.
+
+    Args:
+        auction: Auction contract address
+        resting_orders: Orders resting in the auction just before the transaction
+        submit: Decoded submit RPC (see decode_submit_rpc)
+        taker: Sender of the transaction
+        tx_id: Transaction hash
+        timestamp: Execution time of the transaction
+        scaling: Optional (price_numerator, price_denominator) to compute currency amounts
+
+    Returns:
+        List of fill records in matching order
+    """
+    numerator, denominator = scaling if scaling is not None else (1, 1)
+    book = OrderBook(numerator, denominator, orders=resting_orders)
+    matched, _ = book.match(submit["is_bid"], submit["price_per_token"], submit["token_amount"])
+    return [fill(auction, f["maker"], f["amount"], taker, tx_id, timestamp, scaling, "transaction") for f in matched]
+
+def fills_from_snapshots(auction, before, after, timestamp=None, scaling=None):
+    """
+    Infer fills from two consecutive snapshots of an auction's resting orders.
+
+    Matching always consumes a side in priority order, so fills show up as a
+    vanished prefix of that side plus at most one reduced order after it.
+    Orders vanishing further down the book are cancellations. A cancellation of
+    the very best order is indistinguishable from a fill in this fallback.
+
+    Args:
+        auction: Auction contract address
+        before: Resting orders of the earlier snapshot
+        after: Resting orders of the later snapshot
+        timestamp: Time the later snapshot was taken
+        scaling: Optional (price_numerator, price_denominator) to compute currency amounts
+
+    Returns:
+        List of fill records
+    """
+    remaining = {o["id"]: o["token_amount"] for o in after}
+    fills = []
+    for is_bid in (True, False):
+        side = sorted((o for o in before if o["is_bid"] == is_bid), key=order_key)
+        for maker in side:
+            left = remaining.get(maker["id"])
+            if left is None:
+                fills.append(fill(auction, maker, maker["token_amount"], timestamp=timestamp, scaling=scaling, source="snapshot"))
+                continue
+            if left < maker["token_amount"]:
+                fills.append(fill(auction, maker, maker["token_amount"] - left, timestamp=timestamp, scaling=scaling, source="snapshot"))
+            break
+    return fills
+
+def fill_key(record):
+    """Unique key of a fill, so replays and overlapping sources are recorded once."""
+    if record["tx_id"] is not None:
+        return f"{record['tx_id']}:{record['maker_order_id']}"
+    return f"{record['auction']}:{record['maker_order_id']}:{record['token_amount']}:{record['timestamp']}"
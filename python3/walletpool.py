@@ -0,0 +1,124 @@
+"""
+Pool of signing keys, each with its own ordered submission queue.
+Independent work (different markets or auctions) is spread across keys so it
+is submitted in parallel, while work sharing an ordering key always runs on
+the same key in submission order, e.g. an approve followed by its deposit.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+import config
+from pbccontract import signing_key
+
+def configured_keyfiles():
+    """Keyfiles from config.keyfiles, or the single config.keyfile."""
+    return list(getattr(config, "keyfiles", None) or [config.keyfile])
+
+class WalletPool:
+    """
+    Runs work items on per-key worker threads. Every contract transaction sent from
+    a work item is signed with the key of the worker running it.
+
+    Attributes:
+        keyfiles: Signing keys, one worker and queue each
+        assignments: Ordering key -> index of the key its work runs on
+        pending: Number of queued or running work items per key
+    """
+
+    def __init__(self, keyfiles=None):
+        self.keyfiles = keyfiles or configured_keyfiles()
+        self.queues = [queue.Queue() for _ in self.keyfiles]
+        self.assignments = {}
+        self.pending = [0] * len(self.keyfiles)
+        self.lock = threading.Lock()
+        self.workers = [
+            threading.Thread(target=self._work, args=(index,), name=f"wallet-{index}", daemon=True)
+            for index in range(len(self.keyfiles))
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _work(self, index):
+        with signing_key(self.keyfiles[index]):
+            while True:
+                item = self.queues[index].get()
+                if item is None:
+                    return
+                future, function, args, kwargs = item
+                try:
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(function(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    with self.lock:
+                        self.pending[index] -= 1
+
+    def key_index(self, ordering_key=None):
+        """
+        Choose the key for a work item: the key already bound to its ordering key,
+        otherwise the key with the fewest pending items.
+        """
+        with self.lock:
+            if ordering_key is not None and ordering_key in self.assignments:
+                return self.assignments[ordering_key]
+            index = min(range(len(self.keyfiles)), key=lambda i: self.pending[i])
+            if ordering_key is not None:
+                self.assignments[ordering_key] = index
+            return index
+
+    def submit(self, function, *args, ordering_key=None, **kwargs):
+        """
+        Queue a work item.
+
+        Args:
+            function: Work to run, sending its transactions with the chosen key
+            ordering_key: Work with the same ordering key runs on one key, in submission order
+
+        Returns:
+            Future with the result of the work
+        """
+        return self._enqueue(self.key_index(ordering_key), function, args, kwargs)
+
+    def submit_on(self, keyfile, function, *args, **kwargs):
+        """
+        Queue a work item on a given key, e.g. work that spends that wallet's tokens.
+
+        Returns:
+            Future with the result of the work
+        """
+        return self._enqueue(self.keyfiles.index(keyfile), function, args, kwargs)
+
+    def _enqueue(self, index, function, args, kwargs):
+        future = Future()
+        with self.lock:
+            self.pending[index] += 1
+        self.queues[index].put((future, function, args, kwargs))
+        return future
+
+    def submit_sequence(self, steps, ordering_key=None):
+        """
+        Queue dependent steps that must run in order on one key.
+
+        Args:
+            steps: List of (function, args) tuples
+            ordering_key: Optional ordering key the sequence belongs to
+
+        Returns:
+            Future with the list of step results
+        """
+        return self.submit(lambda: [function(*args) for function, args in steps], ordering_key=ordering_key)
+
+    def keyfile_for(self, ordering_key):
+        """The keyfile an ordering key is bound to, binding it now if it is new."""
+        return self.keyfiles[self.key_index(ordering_key)]
+
+    def shutdown(self, wait=True):
+        """Stop the workers after the queued work is done."""
+        for q in self.queues:
+            q.put(None)
+        if wait:
+            for worker in self.workers:
+                worker.join()